@@ -1,7 +1,9 @@
-from fastapi import APIRouter, UploadFile, File
+from fastapi import APIRouter, UploadFile, File, HTTPException
 from app.services.parser import DocumentParser
+from app.services.cache import parse_cache, parse_cache_key
+from app.services.extraction_pool import ExtractionPoolBusy, ExtractionError
+from app.services.uploads import receive_upload, file_extension, UploadRejected
 import os
-import tempfile
 
 router = APIRouter()
 parser = DocumentParser()
@@ -10,15 +12,28 @@ parser = DocumentParser()
 async def upload_document(file: UploadFile = File(...)):
     """Загрузка и парсинг документа через Groq"""
     
-    # Сохрани временно
-    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file.filename.split('.')[-1]}") as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
+    file_type = file_extension(file.filename)
     
+    # Принимаем в память; во временный файл - только если документ больше бюджета
     try:
-        file_type = file.filename.split(".")[-1].lower()
-        result = await parser.parse_document_smart(tmp_path, file_type)
+        received = await receive_upload(file, allowed=("pdf", "docx", "xlsx"))
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    try:
+        # Тот же файл уже парсили - отвечаем из кеша
+        cache_key = parse_cache_key(received["sha256"], "documents_api")
+        cached = parse_cache.get(cache_key)
+        if cached:
+            return cached
+        
+        source = received["stream"] if received["stream"] is not None else received["path"]
+        try:
+            result = await parser.parse_document_smart(source, file_type)
+        except ExtractionPoolBusy as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        except ExtractionError as e:
+            raise HTTPException(status_code=422, detail=f"Document extraction aborted: {e}")
         
         # Форматируй для фронта (как сейчас в preview)
         preview = "\n".join([
@@ -26,12 +41,16 @@ async def upload_document(file: UploadFile = File(...)):
             for p in result["positions"]
         ])
         
-        return {
+        response = {
             "preview": preview,
             "metadata": result.get("metadata", {}),
             "positions": result["positions"],
         }
+        # regex-фоллбэк не кешируем: при следующей загрузке Groq может ответить
+        if response["positions"] and response["metadata"].get("method") != "regex":
+            parse_cache.set(cache_key, response)
+        return response
     finally:
-        # Очистка
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+        # Очистка (временный файл есть только у больших документов)
+        if received["path"] and os.path.exists(received["path"]):
+            os.remove(received["path"])
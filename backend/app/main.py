@@ -8,42 +8,59 @@ import os
 import logging
 import json
 import re
+import asyncio
+import contextlib
+import time
+import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 # ✅ Загружаем .env переменные
 from dotenv import load_dotenv
 load_dotenv()
 
 # ✅ FastAPI
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+from app.services.extraction_pool import extraction_pool, ExtractionError, ExtractionPoolBusy, ExtractionTimeout
+from app.services.cache import parse_cache, parse_cache_key, file_sha256, llm_cache, llm_cache_key, prompt_version
+from app.services.uploads import (
+    save_upload, declared_size_exceeded, extract_zip_entries, file_extension, remove_quietly,
+    UploadRejected, UPLOAD_MAX_MB
+)
+from app.services.upload_store import upload_store, store_upload, retention_loop
+from app.services.request_store import RequestStore
+from app.services.pagination import (
+    page_size, decode_cursor, parse_date, is_descending, set_next_cursor, NEXT_CURSOR_HEADER
+)
 
 # ✅ Для работы с документами
-try:
-    from docx import Document
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
+from app.services.docx_stream import docx_to_text
+from app.services.table_rows import extract_table_positions, format_positions_preview, TABLE_CONFIDENCE
+from app.services.position_engine import extract_positions, REGEX_CONFIDENCE_THRESHOLD
+from app.services.normalize import cache_info as normalize_cache_info
+DOCX_AVAILABLE = True
 
 try:
-    import PyPDF2
+    from app.services.pdf_stream import pdf_to_text, apdf_to_text
     PDF_AVAILABLE = True
 except ImportError:
     PDF_AVAILABLE = False
 
 try:
-    import openpyxl
+    from app.services.xlsx_stream import xlsx_to_text, axlsx_to_text, format_row_compact, XLSX_SHEET_WORKERS
     XLSX_AVAILABLE = True
 except ImportError:
     XLSX_AVAILABLE = False
 
-try:
-    from groq import Groq
-    GROQ_AVAILABLE = True
-except ImportError:
-    GROQ_AVAILABLE = False
+from app.services.llm_client import llm_client, LLM_AVAILABLE as GROQ_AVAILABLE
+from app.services.llm_guard import LLMGuardRejected
+from app.services.llm_chunking import map_reduce_positions, merge_positions
+from app.services.json_stream import JsonArrayStream
+from app.services.prompt_compact import compact_prompt_text, compaction_stats, LLM_COMPACT_PROMPT
 
 # ✅ ЛОГИРОВАНИЕ
 logging.basicConfig(
@@ -54,8 +71,8 @@ logger = logging.getLogger(__name__)
 
 logger.info(f"DOCX: {DOCX_AVAILABLE}, PDF: {PDF_AVAILABLE}, XLSX: {XLSX_AVAILABLE}, GROQ: {GROQ_AVAILABLE}")
 
-# ✅ IN-MEMORY ХРАНИЛИЩЕ (ВМЕСТО БД)
-requests_storage: Dict[int, dict] = {}
+# ✅ IN-MEMORY ХРАНИЛИЩЕ (ВМЕСТО БД): индексы по статусу, дате и источнику; status/parsing_source - через update()
+requests_storage = RequestStore()
 suppliers_storage: List[dict] = []
 next_request_id = 1
 
@@ -87,8 +104,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+@app.middleware("http")
+async def reject_oversize_uploads(request: Request, call_next):
+    """Слишком большую загрузку отбиваем по Content-Length, не принимая тело"""
+    bulk = request.url.path == "/api/v1/user/bulk-upload"
+    max_mb = BULK_MAX_MB if bulk else UPLOAD_MAX_MB
+    if request.method == "POST" and declared_size_exceeded(request.headers.get("content-length"), max_mb * 1024 * 1024):
+        logger.warning(f"UPLOAD TOO LARGE: {request.url.path} ({request.headers.get('content-length')} bytes)")
+        what = "Batch" if bulk else "File"
+        return JSONResponse(status_code=413, content={"detail": f"{what} is larger than {max_mb} MB"})
+    return await call_next(request)
+
 # ✅ ФУНКЦИИ ПАРСИНГА
 
 def extract_text_from_file(file_path: str) -> str:
@@ -103,56 +132,19 @@ def extract_text_from_file(file_path: str) -> str:
     logger.info(f"🔍 EXTRACTING: {ext.upper()}")
     
     try:
-        if ext == "docx" and DOCX_AVAILABLE:
-            doc = Document(file_path)
-            
-            para_count = len(doc.paragraphs)
-            print(f"📄 PARAGRAPHS: {para_count} найдено")
-            logger.info(f"📄 PARAGRAPHS: {para_count} найдено")
-            
-            paragraphs_text = []
-            for i, para in enumerate(doc.paragraphs):
-                para_text = para.text.strip()
-                if para_text:
-                    paragraphs_text.append(para.text)
-                    print(f"  ► [{i}] {para.text[:100]}")
-            
-            text = "\n".join(paragraphs_text)
-            
-            table_count = len(doc.tables)
-            print(f"📊 TABLES: {table_count} найдено")
-            logger.info(f"📊 TABLES: {table_count} найдено")
-            
-            tables_text = []
-            for t_idx, table in enumerate(doc.tables):
-                rows_count = len(table.rows)
-                cols_count = len(table.rows[0].cells) if table.rows else 0
-                print(f"  📋 TABLE #{t_idx}: {rows_count} rows x {cols_count} cols")
-                
-                for r_idx, row in enumerate(table.rows):
-                    for c_idx, cell in enumerate(row.cells):
-                        cell_text = cell.text.strip()
-                        if cell_text:
-                            tables_text.append(cell_text)
-            
-            text = text + "\n" + "\n".join(tables_text)
+        if ext == "docx":
+            # Потоковое чтение word/document.xml: без python-docx и повторов объединённых ячеек
+            text = docx_to_text(file_path, layout="lines")
+            print(f"📄 DOCX: {len(text)} chars (paragraphs + table cells)")
+            logger.info(f"📄 DOCX: {len(text)} chars (paragraphs + table cells)")
             
         elif ext == "pdf" and PDF_AVAILABLE:
-            with open(file_path, 'rb') as f:
-                pdf = PyPDF2.PdfReader(f)
-                for page in pdf.pages:
-                    extracted = page.extract_text()
-                    if extracted:
-                        text += extracted + "\n"
+            # Страницы по одной (генератор pdf_stream), пустые пропускаем
+            text = pdf_to_text(file_path, skip_empty=True)
             
         elif ext == "xlsx" and XLSX_AVAILABLE:
-            wb = openpyxl.load_workbook(file_path)
-            for sheet_name in wb.sheetnames:
-                ws = wb[sheet_name]
-                for row in ws.iter_rows(values_only=True):
-                    row_text = " ".join([str(cell).strip() if cell else "" for cell in row if cell])
-                    if row_text.strip():
-                        text += row_text + "\n"
+            # Read-only режим: строки читаются потоково, память не растёт с размером книги
+            text = xlsx_to_text(file_path, format_row_compact)
             
         elif ext == "txt":
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -168,144 +160,271 @@ def extract_text_from_file(file_path: str) -> str:
     
     return final_text
 
-def parse_text_regex(text: str) -> dict:
-    """РАБОТАЮЩИЙ парсер - строго по структуре таблицы"""
+def extract_document(file_path: str) -> dict:
+    """Позиции прямо из ячеек таблиц (DOCX/XLSX), иначе - текст для парсинга"""
+    ext = file_path.lower().split('.')[-1]
     
-    lines = text.split('\n')
-    items = []
+    if ext in ("docx", "xlsx"):
+        positions = extract_table_positions(file_path, ext)
+        if positions:
+            logger.info(f"📊 TABLE ROWS: {len(positions)} positions from cells")
+            return {"positions": positions, "text": format_positions_preview(positions)}
+    
+    return {"positions": [], "text": extract_text_from_file(file_path)}
+
+async def extract_document_pooled(file_path: str) -> dict:
+    """
+    extract_document из event loop: PDF - диапазонами страниц, XLSX - листами
+    отдельными задачами пула (pdf_stream / xlsx_stream), остальное - одной задачей
+    """
+    ext = file_path.lower().split('.')[-1]
+    if ext == "pdf" and PDF_AVAILABLE:
+        extract = lambda: apdf_to_text(file_path, skip_empty=True)
+    elif ext == "xlsx" and XLSX_AVAILABLE and XLSX_SHEET_WORKERS > 1:
+        positions = await extraction_pool.run(extract_table_positions, file_path, ext)
+        if positions:
+            logger.info(f"📊 TABLE ROWS: {len(positions)} positions from cells")
+            return {"positions": positions, "text": format_positions_preview(positions)}
+        extract = lambda: axlsx_to_text(file_path, format_row_compact)
+    else:
+        return await extraction_pool.run(extract_document, file_path)
+    try:
+        text = await extract()
+    except ExtractionError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ ERROR EXTRACTING: {e}", exc_info=True)
+        text = ""
+    logger.info(f"📄 {ext.upper()}: {len(text)} chars")
+    return {"positions": [], "text": text.strip()}
+
+def parse_text_regex(text: str) -> dict:
+    """Regex парсер - все стратегии position_engine, берём лучший результат"""
     
     print(f"\n{'='*70}")
-    print(f"🔧 PARSING (REGEX): {len(lines)} lines")
+    print(f"🔧 PARSING (REGEX): {text.count(chr(10)) + 1} lines")
     print(f"{'='*70}\n")
-    logger.info(f"🔧 PARSING (REGEX): {len(lines)} lines")
-    
-    table_start = -1
-    for i, line in enumerate(lines):
-        if line.strip() == '№':
-            table_start = i
-            print(f"✅ TABLE STARTS at line {i}")
-            logger.info(f"✅ TABLE STARTS at line {i}")
-            break
-    
-    if table_start == -1:
-        print(f"❌ NO TABLE FOUND")
-        logger.warning("❌ NO TABLE FOUND")
-        return {"positions": [], "confidence": 0, "source": "regex"}
     
-    i = table_start + 1
+    result = extract_positions(text)
+    items = result["positions"]
     
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        if line.isdigit() and len(line) == 1:
-            pos_num = int(line)
-            print(f"\n📍 Position #{pos_num}")
-            logger.info(f"📍 Position #{pos_num}")
-            
-            if i + 3 >= len(lines):
-                print(f"⚠️  Not enough lines for position {pos_num}")
-                break
-            
-            name_raw = lines[i + 1].strip()
-            unit_raw = lines[i + 2].strip()
-            qty_raw = lines[i + 3].strip()
-            
-            print(f"  Name:  {name_raw}")
-            print(f"  Unit:  {unit_raw}")
-            print(f"  Qty:   {qty_raw}")
-            
-            name = name_raw
-            name = re.sub(r'\s+\([^)]*\)', '', name)
-            name = re.sub(r'\s+', ' ', name).strip()
-            
-            unit = unit_raw if unit_raw in ['м', 'м²', 'м³', 'шт', 'кг', 'т', 'л', 'см', 'мм'] else 'шт'
-            
-            qty_match = re.search(r'(\d+)', qty_raw)
-            qty = int(qty_match.group(1)) if qty_match else 1
-            
-            print(f"  → Cleaned: {name} ({qty} {unit})")
-            
-            items.append({
-                'pos': len(items) + 1,
-                'name': name,
-                'qty': qty,
-                'unit': unit
-            })
-            
-            logger.info(f"  ✅ Added: {name} ({qty} {unit})")
-            i += 4
-        else:
-            i += 1
+    if not items:
+        print(f"❌ NO POSITIONS FOUND")
+        logger.warning("❌ NO POSITIONS FOUND")
+        return {"positions": [], "confidence": 0, "source": "regex"}
     
     print(f"\n{'='*70}")
-    print(f"📊 RESULT: {len(items)} items (source: regex)")
-    for item in items:
+    print(f"📊 RESULT: {len(items)} items (source: regex, strategy: {result['strategy']})")
+    for item in items[:20]:
         print(f"  [{item['pos']}] {item['name']} ({item['qty']} {item['unit']})")
+    if len(items) > 20:
+        print(f"  ... и ещё {len(items) - 20}")
+    print(f"⏱️  {result['timings_ms']}")
     print(f"{'='*70}\n")
     
-    logger.info(f"📊 REGEX RESULT: {len(items)} items")
+    logger.info(f"📊 REGEX RESULT: {len(items)} items via {result['strategy']}, structure={result['structure']}")
     
-    confidence = 85 if len(items) > 0 else 0
     return {
         "positions": items,
-        "confidence": confidence,
-        "source": "regex"
+        "confidence": result["structure"]["confidence"],
+        "source": "regex",
+        "strategy": result["strategy"],
     }
 
-def parse_text_with_groq(text: str) -> dict:
+GROQ_MODEL = "llama-3.1-70b-versatile"
+GROQ_SYSTEM_PROMPT = """Ты - парсер закупок. Извлеки позиции товаров.
+Верни ТОЛЬКО JSON:
+[{"pos": 1, "name": "Товар", "unit": "м", "qty": 100}]"""
+GROQ_PROMPT_VERSION = prompt_version(GROQ_SYSTEM_PROMPT)
+
+GROQ_TIMEOUT = 15
+GROQ_STREAM = os.getenv("GROQ_STREAM", "1") == "1"  # позиции по мере генерации (см. json_stream)
+GROQ_PARTIAL_CONFIDENCE = 60  # ответ оборван (таймаут, обрыв соединения) - позиции есть, но не все
+
+def new_llm_progress() -> dict:
+    """Прогресс разбора через GROQ: сюда пишутся позиции по мере генерации"""
+    return {"state": "pending", "chunks_total": 0, "chunks_done": 0, "chunks_dropped": 0, "incomplete_chunks": 0, "positions": []}
+
+def llm_progress_summary(progress: Optional[dict]) -> Optional[dict]:
+    if progress is None:
+        return None
+    summary = {k: v for k, v in progress.items() if k != "positions"}
+    summary["items_received"] = len(progress["positions"])
+    return summary
+
+def _messages(chunk: str) -> list:
+    return [
+        {"role": "system", "content": GROQ_SYSTEM_PROMPT},
+        {"role": "user", "content": chunk}
+    ]
+
+async def _groq_chunk_stream(chunk: str, progress: dict) -> tuple:
+    """
+    Кусок потоком: каждая закрывшаяся позиция сразу уходит в progress.
+    Returns: (позиции, ответ полный - массив закрыт)
+    """
+    parser = JsonArrayStream()
+    items = []
+    
+    async def consume():
+        stream = llm_client.stream_completion(
+            messages=_messages(chunk),
+            model=GROQ_MODEL,
+            temperature=0.1,
+            max_tokens=2048,
+            timeout=GROQ_TIMEOUT
+        )
+        async with contextlib.aclosing(stream):
+            async for delta in stream:
+                for item in parser.feed(delta):
+                    items.append(item)
+                    progress["positions"].append(item)
+    
+    # GROQ_TIMEOUT в клиенте - на каждый кусок потока, здесь - на весь ответ
+    try:
+        await asyncio.wait_for(consume(), timeout=GROQ_TIMEOUT)
+    except asyncio.TimeoutError as e:
+        # Отмену по сроку guard не считает падением - сообщаем сами
+        llm_client.deadline_exceeded(e)
+        raise
+    logger.info(f"✅ GROQ stream finished: {len(items)} items, closed={parser.closed}, malformed={parser.errors}")
+    return items, parser.closed
+
+async def _groq_chunk_positions(chunk: str, progress: Optional[dict] = None) -> list:
+    """Один кусок документа -> позиции (map-шаг, ответ кешируется в llm_cache)"""
+    llm_key = llm_cache_key(chunk, GROQ_MODEL, GROQ_PROMPT_VERSION)
+    cached_items = llm_cache.get(llm_key)
+    if cached_items:
+        logger.info(f"⚡ LLM CACHE HIT: {len(cached_items)} items")
+        if progress is not None:
+            progress["positions"].extend(cached_items)
+        return cached_items
+    
+    if GROQ_STREAM:
+        if progress is None:
+            progress = new_llm_progress()
+        items, complete = await _groq_chunk_stream(chunk, progress)
+        if not complete:
+            # Поток закончился без "]" - упёрлись в max_tokens
+            progress["incomplete_chunks"] += 1
+        elif items:
+            llm_cache.set(llm_key, items)
+        return items
+    
+    response_text = await llm_client.chat_completion(
+        messages=_messages(chunk),
+        model=GROQ_MODEL,
+        temperature=0.1,
+        max_tokens=2048,
+        timeout=GROQ_TIMEOUT
+    )
+    logger.info(f"✅ GROQ response received: {len(response_text)} chars")
+    
+    json_text = response_text
+    if "```json" in response_text:
+        json_text = response_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in response_text:
+        json_text = response_text.split("```")[1].split("```")[0].strip()
+    
+    items = json.loads(json_text)
+    if not isinstance(items, list):
+        return []
+    if progress is not None:
+        progress["positions"].extend(items)
+    if items:
+        llm_cache.set(llm_key, items)
+    return items
+
+async def _regex_fallback(text: str, fallback: Optional[dict]) -> dict:
+    """Regex-результат: уже посчитанный роутером или заново"""
+    if fallback is not None:
+        return fallback
+    return await asyncio.to_thread(parse_text_regex, text)
+
+async def _partial_or_fallback(text: str, fallback: Optional[dict], progress: dict) -> dict:
+    """GROQ оборвался: уже пришедшие позиции не выбрасываем, если их больше, чем у regex"""
+    result = await _regex_fallback(text, fallback)
+    partial = merge_positions([progress["positions"]])
+    if partial and len(partial) > len(result.get("positions", [])):
+        logger.warning(f"⚠️  GROQ PARTIAL: keeping {len(partial)} streamed items")
+        progress["state"] = "partial"
+        return {"positions": partial, "confidence": GROQ_PARTIAL_CONFIDENCE, "source": "groq_partial"}
+    progress["state"] = "failed"
+    return result
+
+async def parse_text_with_groq(
+    text: str,
+    fallback: Optional[dict] = None,
+    progress: Optional[dict] = None,
+    compact: bool = LLM_COMPACT_PROMPT
+) -> dict:
     """
     Парсит текст с GROQ с полным детектированием падений
     Автоматически переходит на regex если GROQ не работает
+    (общий AsyncGroq из llm_client - event loop не блокируется;
+    длинный текст - кусками параллельно, см. llm_chunking;
+    ответ - потоком, позиции копятся в progress по мере генерации,
+    при обрыве остаются как groq_partial, как и при хвосте сверх
+    LLM_CHUNK_MAX_CHUNKS, разобранном локально; в LLM уходит сжатый текст -
+    см. prompt_compact, экономия токенов - в progress["compaction"])
     """
+    if progress is None:
+        progress = new_llm_progress()
+    
     if not text or not text.strip():
         logger.warning("⚠️  Empty text provided")
+        progress["state"] = "skipped"
         return {"positions": [], "confidence": 0, "source": "empty"}
     
     if not GROQ_AVAILABLE or not os.getenv("GROQ_API_KEY"):
         logger.warning("⚠️  GROQ not available, using regex")
-        return parse_text_regex(text)
+        progress["state"] = "skipped"
+        return await _regex_fallback(text, fallback)
     
     try:
         logger.info("🔄 Trying GROQ...")
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        
-        system_prompt = """Ты - парсер закупок. Извлеки позиции товаров.
-Верни ТОЛЬКО JSON:
-[{"pos": 1, "name": "Товар", "unit": "м", "qty": 100}]"""
-        
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"{text[:8000]}"}
-            ],
-            model="llama-3.1-70b-versatile",
-            temperature=0.1,
-            max_tokens=2048,
-            timeout=15
+        progress["state"] = "streaming" if GROQ_STREAM else "running"
+        llm_text = text
+        if compact:
+            compaction = compact_prompt_text(text)
+            progress["compaction"] = {k: v for k, v in compaction.items() if k != "text"}
+            llm_text = compaction["text"]
+        result = await map_reduce_positions(
+            llm_text, lambda chunk: _groq_chunk_positions(chunk, progress), progress=progress
         )
+        items = result["positions"]
         
-        response_text = chat_completion.choices[0].message.content.strip()
-        logger.info(f"✅ GROQ response received: {len(response_text)} chars")
-        
-        json_text = response_text
-        if "```json" in response_text:
-            json_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            json_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        items = json.loads(json_text)
-        
-        if isinstance(items, list) and len(items) > 0:
-            logger.info(f"✅ GROQ SUCCESS: {len(items)} items, confidence=90%")
+        if len(items) > 0 and progress["incomplete_chunks"]:
+            logger.warning(f"⚠️  GROQ PARTIAL: {progress['incomplete_chunks']} of {result['chunks']} chunks cut short")
+            progress["state"] = "partial"
+            return {"positions": items, "confidence": GROQ_PARTIAL_CONFIDENCE, "source": "groq_partial"}
+        elif len(items) > 0 and result["truncated"]:
+            # Хвост документа не влез в LLM_CHUNK_MAX_CHUNKS и разобран локально
+            logger.warning(f"⚠️  GROQ PARTIAL: {result['chunks_dropped']} chunks past the limit parsed locally")
+            progress["state"] = "partial"
+            return {"positions": items, "confidence": GROQ_PARTIAL_CONFIDENCE, "source": "groq_partial"}
+        elif len(items) > 0:
+            logger.info(f"✅ GROQ SUCCESS: {len(items)} items from {result['chunks']} chunks, confidence=90%")
+            progress["state"] = "done"
             return {"positions": items, "confidence": 90, "source": "groq"}
         else:
             logger.warning(f"⚠️  GROQ returned empty list")
-            return parse_text_regex(text)
+            progress["state"] = "failed"
+            return await _regex_fallback(text, fallback)
+    
+    except LLMGuardRejected as e:
+        # Предохранитель открыт / лимит исчерпан - даже не ждём таймаута
+        logger.warning(f"⚡ GROQ SKIPPED: {e}, using regex")
+        progress["state"] = "skipped"
+        return await _regex_fallback(text, fallback)
     
     except Exception as e:
         error_str = str(e).lower()
         
-        if "decommissioned" in error_str or ("model" in error_str and "no longer" in error_str):
+        if isinstance(e, asyncio.TimeoutError):
+            logger.error(f"❌ GROQ TIMEOUT: no complete answer in {GROQ_TIMEOUT}s")
+            logger.warning("⚠️  Request timeout, using regex")
+        elif "decommissioned" in error_str or ("model" in error_str and "no longer" in error_str):
             logger.error(f"❌ GROQ MODEL DECOMMISSIONED: {e}")
             logger.warning("⚠️  Model no longer supported, using regex")
         elif "429" in error_str or "rate" in error_str or "limit" in error_str:
@@ -327,56 +446,450 @@ def parse_text_with_groq(text: str) -> dict:
             logger.error(f"❌ GROQ UNKNOWN ERROR: {e}", exc_info=True)
             logger.warning("⚠️  Unknown error, using regex")
         
-        return parse_text_regex(text)
+        return await _partial_or_fallback(text, fallback, progress)
+
+LLM_EXPECTED_MS = float(os.getenv("LLM_EXPECTED_MS", "3000"))  # оценка до первого реального вызова
+SUBMIT_DEADLINE_MS = float(os.getenv("SUBMIT_DEADLINE_MS", "800"))  # дольше submit не ждёт LLM
+ROUTING_GRACE_MS = float(os.getenv("ROUTING_GRACE_MS", "50"))  # столько ждём локальный разбор, прежде чем звать LLM
+
+ROUTING_STATS = {"local": 0, "llm": 0, "hedged": 0, "upgraded": 0, "saved_ms": 0.0, "llm_ms_ewma": LLM_EXPECTED_MS}
+
+# Фоновые задачи: апгрейды, разборы, пакеты, очистка (ссылки держим, чтобы задачи не собрал GC)
+_background_tasks = set()
+# Из них апгрейды результатов GROQ - для upgrades_in_flight
+_upgrade_tasks = set()
+
+# parse_text_with_groq вернёт это вместо regex-фоллбэка: локальный результат уже считается параллельно
+_NO_LLM_RESULT = {"positions": [], "confidence": 0, "source": "none"}
+
+def _is_confident(result: dict) -> bool:
+    return bool(result.get("positions")) and result.get("confidence", 0) >= REGEX_CONFIDENCE_THRESHOLD
+
+async def _llm_if_needed(text: str, local_task: asyncio.Task, timings: dict, progress: dict) -> Optional[dict]:
+    """
+    LLM-ветка хеджированного разбора. None - LLM не нужен (локальный разбор
+    успел за ROUTING_GRACE_MS и уверен), недоступен или не ответил позициями.
+    """
+    done, _ = await asyncio.wait({local_task}, timeout=ROUTING_GRACE_MS / 1000)
+    if local_task in done and _is_confident(local_task.result()):
+        progress["state"] = "skipped"
+        return None
+    
+    started = time.perf_counter()
+    result = await parse_text_with_groq(text, fallback=_NO_LLM_RESULT, progress=progress)
+    timings["llm_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    if not result.get("source", "").startswith("groq"):
+        return None
+    ROUTING_STATS["llm_ms_ewma"] = 0.8 * ROUTING_STATS["llm_ms_ewma"] + 0.2 * timings["llm_ms"]
+    return {**result, "routing": {"llm_ms": timings["llm_ms"]}}
+
+async def parse_text_hedged(text: str, progress: Optional[dict] = None) -> tuple:
+    """
+    Локальный разбор (position_engine) и GROQ параллельно; ответ - не позже
+    SUBMIT_DEADLINE_MS. GROQ не зовётся, если локальный результат уверен
+    (structural confidence >= REGEX_CONFIDENCE_THRESHOLD).
+    
+    Returns:
+        (результат с result["routing"], задача LLM или None) - если GROQ не
+        успел к дедлайну, отдаём локальный результат, а задача продолжает
+        работать: её ответ - апгрейд результата (см. _apply_llm_upgrade).
+        Позиции GROQ по мере генерации - в progress (см. new_llm_progress).
+    """
+    timings = {}
+    if progress is None:
+        progress = new_llm_progress()
+    
+    async def local_parse() -> dict:
+        started = time.perf_counter()
+        result = await asyncio.to_thread(parse_text_regex, text)
+        timings["local_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+    
+    local_task = asyncio.create_task(local_parse())
+    llm_task = asyncio.create_task(_llm_if_needed(text, local_task, timings, progress))
+    await asyncio.wait({llm_task}, timeout=SUBMIT_DEADLINE_MS / 1000)
+    local = await local_task
+    
+    routing = {
+        "confidence": local.get("confidence", 0),
+        "threshold": REGEX_CONFIDENCE_THRESHOLD,
+        "deadline_ms": SUBMIT_DEADLINE_MS,
+        **timings,
+    }
+    
+    if not llm_task.done():
+        ROUTING_STATS["hedged"] += 1
+        logger.info(f"🧭 ROUTING: hedged - GROQ not ready in {SUBMIT_DEADLINE_MS:.0f} ms, local result now, upgrade later")
+        return {**local, "routing": {**routing, "decision": "hedged", "upgrade": "pending"}}, llm_task
+    
+    llm_result = llm_task.result()
+    if llm_result is not None:
+        ROUTING_STATS["llm"] += 1
+        logger.info(f"🧭 ROUTING: llm ({timings.get('llm_ms')} ms)")
+        return {**llm_result, "routing": {**routing, "decision": "llm"}}, None
+    
+    if _is_confident(local):
+        saved_ms = ROUTING_STATS["llm_ms_ewma"]
+        ROUTING_STATS["local"] += 1
+        ROUTING_STATS["saved_ms"] += saved_ms
+        logger.info(f"🧭 ROUTING: local (confidence={local.get('confidence')}), ~{saved_ms:.0f} ms saved")
+        return {**local, "routing": {**routing, "decision": "local", "saved_ms": round(saved_ms, 1)}}, None
+    
+    ROUTING_STATS["llm"] += 1
+    logger.info("🧭 ROUTING: fallback - GROQ unavailable or failed, local result")
+    return {**local, "routing": {**routing, "decision": "fallback"}}, None
+
+async def _apply_llm_upgrade(request_id: int, version: int, llm_task: asyncio.Task, text: str, cache_key: str):
+    """
+    Ответ GROQ пришёл после дедлайна - обновляем позиции заявки и
+    result_version, если заявку с тех пор не меняли (version - версия на submit)
+    """
+    try:
+        result = await llm_task
+    except Exception as e:
+        logger.error(f"❌ UPGRADE #{request_id} FAILED: {e}")
+        result = None
+    
+    r = requests_storage.get(request_id)
+    if r is None:
+        return
+    routing = r.get("routing") or {}
+    
+    if not result:
+        routing["upgrade"] = "failed"
+        logger.info(f"⬆️  UPGRADE #{request_id}: GROQ gave nothing, keeping local result")
+        return
+    if r["status"] not in ("draft", "submitted") or r["result_version"] != version:
+        routing["upgrade"] = "discarded"
+        logger.info(f"⬆️  UPGRADE #{request_id}: request is {r['status']}, GROQ result discarded")
+        return
+    if result["source"] == "groq_partial" and len(result["positions"]) <= len(r["items"]):
+        routing["upgrade"] = "failed"
+        logger.info(f"⬆️  UPGRADE #{request_id}: partial GROQ answer is not better than local, keeping local")
+        return
+    
+    requests_storage.update(
+        request_id,
+        items=result.get("positions", []),
+        parsing_confidence=result.get("confidence", 0),
+        parsing_source=result.get("source", "groq"),
+        result_version=r["result_version"] + 1
+    )
+    routing.update(upgrade="done", llm_ms=result["routing"]["llm_ms"])
+    ROUTING_STATS["upgraded"] += 1
+    logger.info(f"⬆️  UPGRADE #{request_id}: {len(r['items'])} items from GROQ, version {r['result_version']}")
+    
+    if is_cacheable_result(result):
+        parse_cache.set(cache_key, {"text": text, **result, "routing": routing})
+
+def get_routing_stats() -> dict:
+    routed = ROUTING_STATS["local"] + ROUTING_STATS["llm"] + ROUTING_STATS["hedged"]
+    return {
+        **ROUTING_STATS,
+        "saved_ms": round(ROUTING_STATS["saved_ms"], 1),
+        "llm_ms_ewma": round(ROUTING_STATS["llm_ms_ewma"], 1),
+        "local_rate": round(ROUTING_STATS["local"] / routed, 3) if routed else 0.0,
+        "threshold": REGEX_CONFIDENCE_THRESHOLD,
+        "deadline_ms": SUBMIT_DEADLINE_MS,
+        "upgrades_in_flight": len(_upgrade_tasks),
+    }
+
+def is_cacheable_result(parse_result: dict) -> bool:
+    """
+    Не кешируем пустой результат, оборванный ответ GROQ и regex-результат,
+    который должен был заменить GROQ (упал или ещё не ответил);
+    уверенный локальный - кешируем
+    """
+    if not parse_result.get("positions") or parse_result.get("source") == "groq_partial":
+        return False
+    groq_configured = GROQ_AVAILABLE and bool(os.getenv("GROQ_API_KEY"))
+    routed_local = parse_result.get("routing", {}).get("decision") == "local"
+    return not (parse_result.get("source") == "regex" and not routed_local and groq_configured)
 
 # ✅ API ENDPOINTS
 
+# ✅ РАЗБОР ПРИ ЗАГРУЗКЕ: submit только переводит готовый результат в submitted
+SUBMIT_PARSE_WAIT = float(os.getenv("SUBMIT_PARSE_WAIT", "30"))  # секунд submit ждёт незаконченный разбор
+PARSE_BUSY_RETRIES = int(os.getenv("PARSE_BUSY_RETRIES", "3"))
+# Фоновых разборов одновременно: по умолчанию - ширина пула извлечения
+PARSE_CONCURRENCY = int(os.getenv("PARSE_CONCURRENCY", "0")) or extraction_pool.workers
+
+_parse_semaphore = asyncio.Semaphore(PARSE_CONCURRENCY)
+_parse_tasks = {}  # request_id -> фоновый разбор (submit его дожидается)
+
+async def _background_parse(request_id: int):
+    """parse_state: queued -> running -> done/failed; пул занят (503) - ждём Retry-After и пробуем снова"""
+    async with _parse_semaphore:
+        r = requests_storage.get(request_id)
+        if r is None or r["status"] != "draft":
+            return
+        r["parse_state"] = "running"
+        started = time.perf_counter()
+        for attempt in range(PARSE_BUSY_RETRIES + 1):
+            try:
+                await _parse_request(request_id)
+                r.update(parse_state="done", parse_error=None)
+                break
+            except HTTPException as e:
+                if e.status_code == 503 and attempt < PARSE_BUSY_RETRIES:
+                    await asyncio.sleep(float((e.headers or {}).get("Retry-After", 1)))
+                    continue
+                r.update(parse_state="failed", parse_error=e.detail)
+                break
+            except Exception as e:
+                logger.error(f"❌ BACKGROUND PARSE #{request_id}: {e}", exc_info=True)
+                r.update(parse_state="failed", parse_error=str(e))
+                break
+        r["parse_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"🧵 BACKGROUND PARSE #{request_id}: {r['parse_state']} in {r['parse_ms']} ms")
+
+def _schedule_parse(request_id: int):
+    requests_storage[request_id]["parse_state"] = "queued"
+    task = asyncio.create_task(_background_parse(request_id))
+    _parse_tasks[request_id] = task
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    task.add_done_callback(lambda _: _parse_tasks.pop(request_id, None))
+
+def _create_request(filename: str, saved: dict) -> int:
+    """Черновик заявки на файл из upload_store (saved - результат store_upload/add_file); разбор - сразу в фоне"""
+    global next_request_id
+    
+    request_id = next_request_id
+    next_request_id += 1
+    
+    requests_storage.add({
+        "id": request_id,
+        "filename": filename,
+        "status": "draft",
+        "created_at": datetime.now().isoformat(),
+        "file_path": saved["path"],
+        "upload_ref": saved["ref"],
+        "items": [],
+        "parsing_confidence": 0,
+        "preview": "",
+        "parsing_source": "unknown",
+        "routing": None,
+        "result_version": 0,
+        "llm_progress": None,
+        "sha256": saved["sha256"],
+        "size": saved["size"],
+        "parse_state": None,
+        "parse_error": None,
+        "parse_ms": None
+    })
+    
+    logger.info(f"REQUEST CREATED: #{request_id}")
+    _schedule_parse(request_id)
+    return request_id
+
+UPLOAD_REF_PREFIX = "main:"
+
+def _upload_ref() -> str:
+    """
+    Ссылка заявки на файл в upload_store (id заявки появляется позже файла).
+    Заявки - в памяти, ссылки - в SQLite: открытые ссылки прошлого
+    процесса закрываются на startup
+    """
+    return f"{UPLOAD_REF_PREFIX}{uuid.uuid4().hex}"
+
 @app.post("/api/v1/user/upload-and-create")
 async def upload_and_create(file: UploadFile = File(...)):
     """Загрузить файл"""
-    global next_request_id
     
     try:
         logger.info(f"UPLOAD: {file.filename}")
         
-        upload_dir = Path(os.getcwd()) / "uploads"
-        upload_dir.mkdir(exist_ok=True)
+        # Пишем кусками вне event loop, хеш и размер - на лету; одинаковые файлы хранятся один раз
+        saved = await store_upload(upload_store, file, _upload_ref())
         
-        file_path = upload_dir / f"{datetime.now().timestamp()}_{file.filename}"
+        logger.info(f"FILE SAVED: {saved['path']} ({saved['size']} bytes{', deduplicated' if saved['deduplicated'] else ''})")
         
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        logger.info(f"FILE SAVED: {file_path}")
-        
-        request_id = next_request_id
-        next_request_id += 1
-        
-        requests_storage[request_id] = {
-            "id": request_id,
-            "filename": file.filename,
-            "status": "draft",
-            "created_at": datetime.now().isoformat(),
-            "file_path": str(file_path),
-            "items": [],
-            "parsing_confidence": 0,
-            "preview": "",
-            "parsing_source": "unknown"
-        }
-        
-        logger.info(f"REQUEST CREATED: #{request_id}")
+        request_id = _create_request(file.filename, saved)
         
         return {"success": True, "request_id": request_id, "filename": file.filename}
     
+    except UploadRejected as e:
+        logger.warning(f"UPLOAD REJECTED: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logger.error(f"ERROR UPLOAD: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
+# ✅ ПАКЕТНАЯ ЗАГРУЗКА
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "100"))
+BULK_MAX_MB = int(os.getenv("BULK_MAX_MB", "500"))
+
+batches_storage = {}
+next_batch_id = 1
+
+async def _submit_batch_item(batch: dict, item: dict):
+    """Файл пакета: дожидаемся фонового разбора (параллельно не больше PARSE_CONCURRENCY) и отправляем"""
+    task = _parse_tasks.get(item["request_id"])
+    if task is not None:
+        await asyncio.shield(task)
+    try:
+        result = await submit_request(item["request_id"])
+        item.update(
+            status="done",
+            items_count=result["items_count"],
+            confidence=result["confidence"],
+            source=requests_storage[item["request_id"]]["parsing_source"]
+        )
+    except HTTPException as e:
+        item.update(status="failed", error=e.detail)
+    except Exception as e:
+        logger.error(f"❌ BATCH #{batch['id']} {item['filename']}: {e}")
+        item.update(status="failed", error=str(e))
+    item["parse_ms"] = requests_storage[item["request_id"]].get("parse_ms")
+    
+    if all(i["status"] in ("done", "failed", "rejected") for i in batch["items"]):
+        batch["status"] = "done"
+        batch["finished_at"] = datetime.now().isoformat()
+        batch["wall_ms"] = round((time.perf_counter() - batch["_started"]) * 1000, 1)
+        logger.info(f"📦 BATCH #{batch['id']} DONE in {batch['wall_ms']} ms")
+
+def _batch_view(batch: dict) -> dict:
+    items = []
+    for item in batch["items"]:
+        # Пока файл в очереди, его состояние - состояние фонового разбора заявки
+        if item["status"] == "queued" and requests_storage.get(item["request_id"], {}).get("parse_state") == "running":
+            item = {**item, "status": "running"}
+        items.append(item)
+    counts = {}
+    for item in items:
+        counts[item["status"]] = counts.get(item["status"], 0) + 1
+    finished = sum(counts.get(s, 0) for s in ("done", "failed", "rejected"))
+    return {
+        **{k: v for k, v in batch.items() if not k.startswith("_")},
+        "items": items,
+        "total": len(items),
+        "counts": counts,
+        "progress": round(finished / len(items), 3) if items else 1.0,
+    }
+
+@app.post("/api/v1/user/bulk-upload")
+async def bulk_upload(files: List[UploadFile] = File(...), submit: bool = True):
+    """
+    Пакетная загрузка: несколько файлов и/или ZIP-архивы. Каждый файл -
+    отдельная заявка, разбираемая в фоне сразу после загрузки; с submit -
+    отправляется, как только разобрана. Прогресс -
+    GET /api/v1/user/batches/{batch_id}. Общий размер - не больше BULK_MAX_MB
+    (проверяет reject_oversize_uploads до приёма тела)
+    """
+    global next_batch_id
+    
+    if len(files) > BULK_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_FILES} files per batch")
+    
+    batch_id = next_batch_id
+    next_batch_id += 1
+    items = []
+    
+    def add_item(filename: str, saved: Optional[dict] = None, error: Optional[str] = None):
+        if saved is None:
+            items.append({"filename": filename, "request_id": None, "status": "rejected", "error": error})
+        else:
+            items.append({"filename": filename, "request_id": _create_request(filename, saved),
+                          "status": "queued" if submit else "draft"})
+    
+    for file in files:
+        if file_extension(file.filename) == "zip":
+            # Архив и его записи - во временный каталог хранилища, записи затем забирает upload_store
+            archive_path = await asyncio.to_thread(upload_store.tmp_path, "zip")
+            try:
+                await save_upload(file, archive_path, allowed=("zip",), max_bytes=BULK_MAX_MB * 1024 * 1024)
+                entries = await asyncio.to_thread(
+                    extract_zip_entries, archive_path, archive_path.parent, f"{archive_path.stem}_",
+                    max_entries=BULK_MAX_FILES - len(items)
+                )
+            except UploadRejected as e:
+                logger.warning(f"ARCHIVE REJECTED: {file.filename}: {e.detail}")
+                add_item(file.filename, error=e.detail)
+                continue
+            finally:
+                await asyncio.to_thread(remove_quietly, archive_path)
+            for entry in entries:
+                if "path" in entry:
+                    entry = await asyncio.to_thread(
+                        upload_store.add_file, Path(entry["path"]), entry["sha256"], entry["ext"], entry["size"],
+                        entry["filename"], _upload_ref()
+                    )
+                add_item(f"{file.filename}/{entry['filename']}", entry if "path" in entry else None, entry.get("error"))
+        else:
+            try:
+                add_item(file.filename, await store_upload(upload_store, file, _upload_ref()))
+            except UploadRejected as e:
+                logger.warning(f"UPLOAD REJECTED: {file.filename}: {e.detail}")
+                add_item(file.filename, error=e.detail)
+    
+    batch = {
+        "id": batch_id,
+        "created_at": datetime.now().isoformat(),
+        "status": "running" if submit else "uploaded",
+        "items": items,
+        "_started": time.perf_counter(),
+    }
+    batches_storage[batch_id] = batch
+    logger.info(f"📦 BATCH #{batch_id}: {len(items)} files, {sum(1 for i in items if i['request_id'])} accepted")
+    
+    queued = [item for item in items if item["status"] == "queued"]
+    if not queued and submit:
+        batch["status"] = "done"
+    for item in queued:
+        task = asyncio.create_task(_submit_batch_item(batch, item))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    
+    return {"success": True, "batch_id": batch_id, **_batch_view(batch)}
+
+@app.get("/api/v1/user/batches/{batch_id}")
+async def get_batch(batch_id: int):
+    """Прогресс пакетной загрузки по файлам"""
+    
+    if batch_id not in batches_storage:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return _batch_view(batches_storage[batch_id])
+
+def _page_of_requests(response: Response, status: Optional[str], source: Optional[str],
+                      created_from: Optional[str], created_to: Optional[str],
+                      cursor: Optional[str], limit: Optional[int], descending: bool) -> List[dict]:
+    """Страница заявок по (created_at, id) после курсора; курсор следующей - в X-Next-Cursor"""
+    limit = page_size(limit)
+    date_from = parse_date(created_from, "created_from")
+    date_to = parse_date(created_to, "created_to")
+    records = requests_storage.query(
+        status=status,
+        source=source,
+        created_from=date_from.isoformat() if date_from else None,
+        created_to=date_to.isoformat() if date_to else None,
+        after=decode_cursor(cursor),
+        limit=limit + 1,
+        descending=descending
+    )
+    return set_next_cursor(response, records, limit, requests_storage.key)
+
 @app.get("/api/v1/user/requests")
-async def get_user_requests():
-    """Получить все заявки"""
-    logger.info(f"GET REQUESTS: {len(requests_storage)} total")
+async def get_user_requests(
+    response: Response,
+    status: Optional[str] = None,
+    source: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    order: Optional[str] = None
+):
+    """
+    Заявки постранично, новые первыми (order=asc - старые; limit - до
+    PAGE_SIZE_MAX). Фильтры: status, source, created_from/created_to (ISO,
+    created_to - не включительно); следующая страница - ?cursor= из
+    заголовка X-Next-Cursor (с тем же order)
+    """
+    records = _page_of_requests(
+        response, status, source, created_from, created_to, cursor, limit, is_descending(order, "desc")
+    )
+    logger.info(f"GET REQUESTS: {len(records)} of {len(requests_storage)} total")
     
     return [
         {
@@ -386,9 +899,10 @@ async def get_user_requests():
             "created_at": r["created_at"],
             "items_count": len(r["items"]),
             "confidence": r["parsing_confidence"],
+            "parse_state": r.get("parse_state"),
             "preview": r["preview"][:100] if r["preview"] else ""
         }
-        for r in requests_storage.values()
+        for r in records
     ]
 
 @app.get("/api/v1/user/requests/{request_id}")
@@ -407,15 +921,103 @@ async def get_request_detail(request_id: int):
         "items": r["items"],
         "confidence": r["parsing_confidence"],
         "preview": r["preview"],
-        "parsing_source": r["parsing_source"]
+        "parsing_source": r["parsing_source"],
+        "routing": r["routing"],
+        "result_version": r["result_version"],
+        "parse_state": r.get("parse_state"),
+        "parse_error": r.get("parse_error"),
+        "llm_progress": llm_progress_summary(r["llm_progress"])
     }
 
+@app.get("/api/v1/user/requests/{request_id}/llm-progress")
+async def get_llm_progress(request_id: int):
+    """Позиции GROQ по мере генерации (до апгрейда результата заявки)"""
+    
+    if request_id not in requests_storage:
+        raise HTTPException(status_code=404, detail="Request not found")
+    
+    progress = requests_storage[request_id]["llm_progress"]
+    if progress is None:
+        return {"state": None, "items": []}
+    return {**llm_progress_summary(progress), "items": list(progress["positions"])}
+
+async def _parse_request(request_id: int):
+    """
+    Извлечение и разбор файла заявки; результат пишется в заявку (items,
+    confidence, source, preview, routing), result_version += 1. Статус не
+    меняется - это делает submit. HTTPException - ошибка для клиента.
+    """
+    r = requests_storage[request_id]
+    
+    if not os.path.exists(r["file_path"]):
+        raise HTTPException(status_code=400, detail="File not found")
+    
+    # Тот же файл уже разбирали - отдаём результат из кеша
+    if not r.get("sha256"):
+        r["sha256"] = await asyncio.to_thread(file_sha256, r["file_path"])
+    cache_key = parse_cache_key(r["sha256"], "main")
+    cached = parse_cache.get(cache_key)
+    llm_task = None  # GROQ не успел к дедлайну - ответ придёт апгрейдом
+    
+    if cached:
+        logger.info(f"CACHE HIT: {r['sha256'][:12]} ({cached.get('source')})")
+        text = cached["text"]
+        parse_result = cached
+    else:
+        # Извлечение - в пуле процессов, GROQ - в потоке: event loop не блокируется
+        try:
+            extracted = await extract_document_pooled(r["file_path"])
+        except ExtractionPoolBusy as e:
+            logger.warning(f"EXTRACTION BUSY: {e}")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        except ExtractionTimeout as e:
+            logger.error(f"EXTRACTION ABORTED: {e}")
+            raise HTTPException(status_code=422, detail=f"Document extraction aborted: {e}")
+        text = extracted["text"]
+        logger.info(f"TEXT EXTRACTED: {len(text)} chars")
+        
+        if extracted["positions"]:
+            # Позиции взяты из ячеек таблицы - ни regex, ни GROQ не нужны
+            parse_result = {"positions": extracted["positions"], "confidence": TABLE_CONFIDENCE, "source": "table"}
+        else:
+            r["llm_progress"] = new_llm_progress()
+            parse_result, llm_task = await parse_text_hedged(text, r["llm_progress"])
+        
+        if is_cacheable_result(parse_result):
+            parse_cache.set(cache_key, {"text": text, **parse_result})
+    
+    requests_storage.update(
+        request_id,
+        items=parse_result.get("positions", []),
+        parsing_confidence=parse_result.get("confidence", 0),
+        parsing_source=parse_result.get("source", "unknown"),
+        preview=text[:500],
+        routing={"decision": "cache"} if cached else parse_result.get("routing"),
+        result_version=r.get("result_version", 0) + 1
+    )
+    
+    if llm_task is not None:
+        task = asyncio.create_task(_apply_llm_upgrade(request_id, r["result_version"], llm_task, text, cache_key))
+        _background_tasks.add(task)
+        _upgrade_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        task.add_done_callback(_upgrade_tasks.discard)
+    
+    logger.info(
+        f"REQUEST PARSED: #{request_id} {len(r['items'])} items, "
+        f"confidence={r['parsing_confidence']}%, source={r['parsing_source']}"
+    )
+
 @app.post("/api/v1/user/requests/{request_id}/submit")
 async def submit_request(request_id: int):
-    """Отправить на распознавание"""
+    """
+    Отправить на распознавание. Файл разбирается в фоне сразу после
+    загрузки - здесь результат только переводится в submitted (если разбор
+    ещё идёт - ждём до SUBMIT_PARSE_WAIT секунд, упал - разбираем заново)
+    """
     
     logger.info("=" * 60)
-    logger.info(f"PARSING START: REQUEST #{request_id}")
+    logger.info(f"SUBMIT: REQUEST #{request_id}")
     logger.info("=" * 60)
     
     if request_id not in requests_storage:
@@ -427,31 +1029,39 @@ async def submit_request(request_id: int):
         if r["status"] != "draft":
             raise HTTPException(status_code=400, detail="Can only submit draft requests")
         
-        if not os.path.exists(r["file_path"]):
-            raise HTTPException(status_code=400, detail="File not found")
+        task = _parse_tasks.get(request_id)
+        if task is not None:
+            logger.info(f"WAITING FOR BACKGROUND PARSE: {r['parse_state']}")
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout=SUBMIT_PARSE_WAIT)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=503, detail="Document is still being parsed", headers={"Retry-After": "5"})
         
-        text = extract_text_from_file(r["file_path"])
-        logger.info(f"TEXT EXTRACTED: {len(text)} chars")
-        
-        parse_result = parse_text_with_groq(text)
-        
-        items = parse_result.get("positions", [])
-        confidence = parse_result.get("confidence", 0)
-        source = parse_result.get("source", "unknown")
+        if r.get("parse_state") != "done":
+            # Фоновый разбор упал (или его не было) - разбираем сейчас, ошибку отдаём клиенту
+            logger.info(f"PARSING INLINE: parse_state={r.get('parse_state')}")
+            r["parse_state"] = "running"
+            try:
+                await _parse_request(request_id)
+            except Exception as e:
+                r.update(parse_state="failed", parse_error=getattr(e, "detail", str(e)))
+                raise
+            r.update(parse_state="done", parse_error=None)
         
-        r["status"] = "submitted"
-        r["items"] = items
-        r["parsing_confidence"] = confidence
-        r["parsing_source"] = source
-        r["preview"] = text[:500]
+        requests_storage.update(request_id, status="submitted")
+        items = r["items"]
         
-        logger.info(f"REQUEST UPDATED: {len(items)} items, confidence={confidence}%, source={source}")
+        logger.info(f"REQUEST SUBMITTED: {len(items)} items, confidence={r['parsing_confidence']}%, source={r['parsing_source']}")
         logger.info("=" * 60)
         
         return {
             "success": True,
             "items_count": len(items),
-            "confidence": confidence,
+            "confidence": r["parsing_confidence"],
+            "routing": r["routing"],
+            "result_version": r["result_version"],
+            "upgrade_pending": (r["routing"] or {}).get("upgrade") == "pending",
+            "parse_ms": r.get("parse_ms"),
             "preview": r["preview"],
             "message": f"Found {len(items)} positions"
         }
@@ -492,8 +1102,19 @@ async def search_suppliers(keyword: str = ""):
     }
 
 @app.get("/api/v1/moderator/tasks")
-async def get_moderator_tasks():
-    """Получить список задач на модерацию"""
+async def get_moderator_tasks(
+    response: Response,
+    source: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    order: Optional[str] = None
+):
+    """
+    Задачи на модерацию (отправленные заявки) постранично: очередь - старые
+    первыми (order=desc - новые); фильтры и курсор - как у /user/requests
+    """
     tasks = [
         {
             "id": r["id"],
@@ -505,8 +1126,9 @@ async def get_moderator_tasks():
             "confidence": r["parsing_confidence"],
             "created_at": r["created_at"]
         }
-        for r in requests_storage.values()
-        if r["status"] == "submitted"
+        for r in _page_of_requests(
+            response, "submitted", source, created_from, created_to, cursor, limit, is_descending(order, "asc")
+        )
     ]
     
     logger.info(f"MODERATOR TASKS: {len(tasks)}")
@@ -533,6 +1155,12 @@ async def get_task_detail(task_id: int):
         "preview": r["preview"]
     }
 
+async def _close_upload(request_id: int):
+    """Заявка закрыта - её файл может сжать/удалить фоновая очистка upload_store"""
+    ref = requests_storage[request_id].get("upload_ref")
+    if ref:
+        await asyncio.to_thread(upload_store.close, ref)
+
 @app.post("/api/v1/moderator/tasks/{task_id}/approve")
 async def approve_task(task_id: int):
     """Одобрить задачу"""
@@ -540,7 +1168,8 @@ async def approve_task(task_id: int):
     if task_id not in requests_storage:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    requests_storage[task_id]["status"] = "approved"
+    requests_storage.update(task_id, status="approved")
+    await _close_upload(task_id)
     logger.info(f"TASK APPROVED: #{task_id}")
     
     return {"success": True, "message": f"Task #{task_id} approved"}
@@ -552,11 +1181,27 @@ async def reject_task(task_id: int):
     if task_id not in requests_storage:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    requests_storage[task_id]["status"] = "rejected"
+    requests_storage.update(task_id, status="rejected")
+    await _close_upload(task_id)
     logger.info(f"TASK REJECTED: #{task_id}")
     
     return {"success": True, "message": f"Task #{task_id} rejected"}
 
+@app.get("/api/v1/metrics")
+async def get_metrics():
+    """Счётчики пула извлечения и кешей"""
+    return {
+        "extraction_pool": extraction_pool.get_stats(),
+        "parse_cache": parse_cache.get_stats(),
+        "llm_cache": llm_cache.get_stats(),
+        "normalize": normalize_cache_info(),
+        "llm": llm_client.get_stats(),
+        "routing": get_routing_stats(),
+        "requests": requests_storage.get_stats(),
+        "prompt_compaction": compaction_stats(),
+        "upload_store": upload_store.get_stats(),
+    }
+
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "version": "0.2.0"}
@@ -568,6 +1213,26 @@ async def root():
 @app.on_event("startup")
 async def startup_event():
     init_suppliers()
+    extraction_pool.start()
+    llm_client.start()
+    # Заявки прошлого процесса потеряны вместе с памятью - их ссылки закрываем, файлы уйдут в очистку
+    await asyncio.to_thread(upload_store.close_prefix, UPLOAD_REF_PREFIX)
+    # Фоновая очистка хранилища загрузок: сжатие/удаление файлов закрытых заявок
+    task = asyncio.create_task(retention_loop(upload_store))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    extraction_pool.shutdown()
+    # Недождавшиеся апгрейды отменяем до закрытия клиента - заявки остаются с локальным результатом
+    for task in list(_background_tasks):
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    await llm_client.close()
+    parse_cache.close()
+    llm_cache.close()
+    upload_store.close_db()
 
 if __name__ == "__main__":
     import uvicorn
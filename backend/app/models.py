@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -33,6 +33,12 @@ class Request(Base):
     search_results = relationship("SearchResultFromDB", back_populates="request", cascade="all, delete-orphan")
     parsing_tasks = relationship("ParsingTask", back_populates="request", cascade="all, delete-orphan")
 
+    # Keyset-пагинация списков: WHERE status ... ORDER BY created_at, id
+    __table_args__ = (
+        Index("ix_requests_created_at_id", "created_at", "id"),
+        Index("ix_requests_status_created_at_id", "status", "created_at", "id"),
+    )
+
 
 class RequestItem(Base):
     __tablename__ = "request_items"
@@ -115,6 +121,10 @@ class ParsingTask(Base):
     item = relationship("RequestItem", back_populates="parsing_task")
     parsed_urls = relationship("ParsedURL", back_populates="task", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_parsing_tasks_status_created_at_id", "status", "created_at", "id"),
+    )
+
 
 class ParsedURL(Base):
     __tablename__ = "parsed_urls"
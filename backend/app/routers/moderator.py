@@ -1,7 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Response
+from sqlalchemy.orm import Session, joinedload
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 import json
 import asyncio
 import logging
@@ -19,6 +19,7 @@ from app.models import (
     SearchResultFromDB,
 )
 from app.services.parser import search_suppliers
+from app.services.pagination import page_size, decode_cursor, parse_date, is_descending, keyset_page, set_next_cursor
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -227,11 +228,38 @@ async def _parse_task_patchright(task_id: int, db_path: str = "b2b_platform.db")
 # ================ ENDPOINTS ================
 
 @router.get("/tasks")
-async def list_parsing_tasks(db: Session = Depends(get_db)):
-    """Список всех задач на парсинг (для модератора)"""
-    tasks = db.query(ParsingTask).filter(
-        ParsingTask.status == URLStatus.PENDING
+async def list_parsing_tasks(
+    response: Response,
+    status: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    order: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Задачи на парсинг (для модератора, по умолчанию pending) постранично,
+    очередь - старые первыми (order=asc); курсор - X-Next-Cursor
+    """
+    try:
+        task_status = URLStatus(status) if status else URLStatus.PENDING
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown status: {status}")
+    limit = page_size(limit)
+    date_from = parse_date(created_from, "created_from")
+    date_to = parse_date(created_to, "created_to")
+
+    query = db.query(ParsingTask).filter(ParsingTask.status == task_status)
+    if date_from:
+        query = query.filter(ParsingTask.created_at >= date_from)
+    if date_to:
+        query = query.filter(ParsingTask.created_at < date_to)
+    query = query.options(joinedload(ParsingTask.item))
+    tasks = keyset_page(
+        query, ParsingTask.created_at, ParsingTask.id, decode_cursor(cursor), limit, is_descending(order, "asc")
     ).all()
+    tasks = set_next_cursor(response, tasks, limit, lambda t: (t.created_at, t.id))
 
     return [
         {
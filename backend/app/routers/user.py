@@ -1,11 +1,19 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Response
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional
+import asyncio
 import json
 
 from app.database import get_db
 from app.models import Request, RequestItem, SearchResultFromDB, RequestStatus
 from app.services.document_parser import DocumentParser
+from app.services.extraction_pool import extraction_pool, ExtractionPoolBusy, ExtractionError
+from app.services.table_rows import extract_table_positions
+from app.services.position_engine import extract_positions
+from app.services.cache import parse_cache, parse_cache_key
+from app.services.uploads import read_upload, UploadRejected
+from app.services.upload_store import upload_store
+from app.services.pagination import page_size, decode_cursor, parse_date, is_descending, keyset_page, set_next_cursor
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -86,40 +94,37 @@ async def upload_and_create_request(
     if ext not in [".pdf", ".docx", ".xlsx"]:
         raise HTTPException(status_code=400, detail="Поддерживаются только PDF/DOCX/XLSX")
 
-    data = await file.read()
-    parser = DocumentParser()
-
-    if ext == ".pdf":
-        text = parser.parse_pdf_bytes(data)
-    elif ext == ".docx":
-        text = parser.parse_docx_bytes(data)
-    else:
-        text = parser.parse_xlsx_bytes(data)
-
-    # Парсим items из текста
-    import re
-    items = []
-    for line in text.splitlines():
-        if " | " not in line:
-            continue
-        parts = [p.strip() for p in line.split("|")]
-        if len(parts) < 4:
-            continue
-        if not re.fullmatch(r"\d+", parts[0]):
-            continue
-
-        name = parts[1]
-        unit = parts[2]
-        qty_raw = parts[3].replace(",", ".").strip()
-
-        try:
-            qty = float(qty_raw)
-            if qty.is_integer():
-                qty = int(qty)
-        except:
-            qty = qty_raw
-
-        items.append({"pos": int(parts[0]), "name": name, "unit": unit, "qty": qty})
+    # Читаем кусками: лимит размера, сигнатура и хеш - на лету
+    try:
+        data, file_hash = await read_upload(file, allowed=("pdf", "docx", "xlsx"))
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # Тот же документ уже разбирали - берём позиции из кеша
+    cache_key = parse_cache_key(file_hash, "user_router")
+    cached = parse_cache.get(cache_key)
+    items = cached["positions"] if cached else []
+
+    # Извлечение - в пуле процессов (лимиты CPU/памяти/времени), event loop свободен
+    text = ""
+    try:
+        # DOCX/XLSX: позиции прямо из ячеек таблицы
+        if not items and ext in (".docx", ".xlsx"):
+            items = await extraction_pool.run(extract_table_positions, data, ext)
+
+        if not items:
+            text = await DocumentParser().parse_bytes(data, ext.lstrip("."))
+    except ExtractionPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ExtractionError as e:
+        raise HTTPException(status_code=422, detail=f"Document extraction aborted: {e}")
+
+    # Парсим items из текста (если таблицу не нашли)
+    if text:
+        items = extract_positions(text)["positions"]
+
+    if items and not cached:
+        parse_cache.set(cache_key, {"text": text, "positions": items, "source": "regex" if text else "table"})
 
     # Создаём Request
     request = Request(filename=filename, status=RequestStatus.DRAFT)
@@ -168,6 +173,12 @@ async def upload_and_create_request(
 
     db.commit()
 
+    # Оригинал - в upload_store (по хешу, без дублей), имя файла - метаданные ссылки.
+    # Ссылка - только на сохранённую заявку: упавший commit не оставит висящую ссылку
+    await asyncio.to_thread(
+        upload_store.add_bytes, data, file_hash, ext.lstrip("."), filename, f"db:{request.id}"
+    )
+
     return {
         "status": "success",
         "request_id": request.id,
@@ -178,11 +189,40 @@ async def upload_and_create_request(
 
 
 @router.get("/requests")
-async def list_requests(db: Session = Depends(get_db)):
-    """Список всех Request пользователя (draft + submitted)"""
-    requests = db.query(Request).filter(
-        Request.status.in_([RequestStatus.DRAFT, RequestStatus.SUBMITTED])
+async def list_requests(
+    response: Response,
+    status: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    order: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Request пользователя (draft + submitted) постранично по (created_at, id),
+    по умолчанию новые первыми (order=desc); курсор - X-Next-Cursor
+    """
+    statuses = [RequestStatus.DRAFT, RequestStatus.SUBMITTED]
+    if status:
+        try:
+            statuses = [RequestStatus(status)]
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Unknown status: {status}")
+    limit = page_size(limit)
+    date_from = parse_date(created_from, "created_from")
+    date_to = parse_date(created_to, "created_to")
+
+    query = db.query(Request).filter(Request.status.in_(statuses))
+    if date_from:
+        query = query.filter(Request.created_at >= date_from)
+    if date_to:
+        query = query.filter(Request.created_at < date_to)
+    query = query.options(selectinload(Request.items), selectinload(Request.search_results))
+    requests = keyset_page(
+        query, Request.created_at, Request.id, decode_cursor(cursor), limit, is_descending(order, "desc")
     ).all()
+    requests = set_next_cursor(response, requests, limit, lambda r: (r.created_at, r.id))
 
     return [
         {
@@ -263,5 +303,7 @@ async def delete_request(request_id: int, db: Session = Depends(get_db)):
 
     db.delete(request)
     db.commit()
+    # Последняя ссылка на файл - файл удаляется из upload_store
+    await asyncio.to_thread(upload_store.release, f"db:{request_id}")
 
     return {"status": "success", "deleted_id": request_id}
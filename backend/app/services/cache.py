@@ -0,0 +1,183 @@
+"""
+Cache - персистентный кеш на SQLite с LRU-вытеснением
+
+SqliteLRUCache хранит JSON-значения, ограничен суммарным размером и
+(опционально) временем жизни записи. parse_cache - кеш результатов
+извлечения/парсинга по SHA-256 загруженного файла и версии парсера.
+llm_cache - ответы LLM по нормализованному тексту, модели и версии промпта.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Меняй при любом изменении извлечения/парсинга - старые записи перестанут находиться
+PARSER_VERSION = "2"
+
+PARSE_CACHE_PATH = os.getenv("PARSE_CACHE_PATH", str(Path(os.getcwd()) / "cache" / "parse_cache.sqlite3"))
+PARSE_CACHE_MAX_MB = int(os.getenv("PARSE_CACHE_MAX_MB", "256"))
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", str(Path(os.getcwd()) / "cache" / "llm_cache.sqlite3"))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "128"))
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", str(7 * 24)))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class SqliteLRUCache:
+    """JSON-значения в SQLite: LRU по суммарному размеру + TTL (0 - без TTL)"""
+
+    def __init__(self, path: str, max_bytes: int, ttl: float = 0, name: str = "cache"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.name = name
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expired": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+            self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            self._conn = conn
+            logger.info(f"[Cache:{self.name}] Opened {self.path}: {self._total_bytes} bytes")
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, size, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            value, size, created_at = row
+            now = time.time()
+            if self.ttl and now - created_at > self.ttl:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self.stats["hits"] += 1
+        return json.loads(value)
+
+    def set(self, key: str, value: Any):
+        payload = json.dumps(value, ensure_ascii=False)
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            logger.warning(f"[Cache:{self.name}] Entry {size} bytes exceeds cache size, not stored")
+            return
+
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            old = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, now, now),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self.stats["sets"] += 1
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Удаляет давно не читанные записи, пока кеш больше лимита"""
+        while self._total_bytes > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed_at LIMIT 64").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for key, size in rows:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.stats["evictions"] += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# ================ PARSE CACHE ================
+
+def sha256_bytes(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 файла, читаем кусками"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_cache_key(sha256: str, pipeline: str) -> str:
+    """Ключ: хеш содержимого + версия парсера + пайплайн (у каждого входа свой формат результата)"""
+    return f"{sha256}:{PARSER_VERSION}:{pipeline}"
+
+
+parse_cache = SqliteLRUCache(PARSE_CACHE_PATH, PARSE_CACHE_MAX_MB * 1024 * 1024, name="parse")
+
+
+# ================ LLM CACHE ================
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Пробелы/переводы строк схлопываются - тексты, отличающиеся только ими, дают один ключ"""
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+def prompt_version(*prompt_parts: str) -> str:
+    """Версия промпта - хеш его текста: правка промпта сама делает старые записи недостижимыми"""
+    return hashlib.sha256("\x00".join(prompt_parts).encode("utf-8")).hexdigest()[:12]
+
+
+def llm_cache_key(text: str, model: str, prompt_ver: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{digest}:{model}:{prompt_ver}"
+
+
+llm_cache = SqliteLRUCache(
+    LLM_CACHE_PATH, LLM_CACHE_MAX_MB * 1024 * 1024, ttl=LLM_CACHE_TTL_HOURS * 3600, name="llm"
+)
@@ -4,7 +4,8 @@ Document OCR Parser - распознавание текста из PDF, DOCX, XL
 import logging
 from typing import Dict, List, Optional
 from pathlib import Path
-import re
+
+from app.services.position_engine import extract_positions
 
 logger = logging.getLogger(__name__)
 
@@ -74,13 +75,9 @@ class DocumentParser:
     async def _parse_pdf(self, file_path: str) -> str:
         """Парсим PDF"""
         try:
-            from PyPDF2 import PdfReader
+            from app.services.pdf_stream import pdf_to_text
             
-            text = ""
-            reader = PdfReader(file_path)
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            return pdf_to_text(file_path)
         except ImportError:
             logger.warning("PyPDF2 not installed, returning empty text")
             return ""
@@ -106,14 +103,10 @@ class DocumentParser:
     async def _parse_xlsx(self, file_path: str) -> str:
         """Парсим XLSX"""
         try:
-            import openpyxl
+            from app.services.xlsx_stream import xlsx_to_text, format_row_spaced
             
-            wb = openpyxl.load_workbook(file_path)
-            sheet = wb.active
-            text = ""
-            for row in sheet.iter_rows(values_only=True):
-                text += " ".join([str(cell) if cell else "" for cell in row]) + "\n"
-            return text
+            # Read-only режим, только активный лист - как и раньше
+            return xlsx_to_text(file_path, format_row_spaced, active_only=True)
         except ImportError:
             logger.warning("openpyxl not installed")
             return ""
@@ -132,48 +125,11 @@ class DocumentParser:
     
     def _extract_positions(self, text: str) -> List[Dict]:
         """
-        Извлекаем позиции из текста
-        
-        Ищем паттерны вроде:
-        - "1 Труба жесткая 140 м"
-        - "№1 - Позиция: D160 Кол-во: 140м"
-        - "1. Название позиции 140 м"
+        Извлекаем позиции из текста - все стратегии position_engine,
+        берём лучший результат ("1 Труба жесткая 140 м", "1 | D160 | м | 140",
+        таблица "ячейка на строку" и т.д.)
         """
-        positions = []
-        lines = text.split("\n")
-        
-        pos_number = 0
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            # Ищем строки с числами (номер + название + количество)
-            # Паттерн: ^(\d+)\s+(.+?)\s+(\d+(?:[.,]\d+)?)\s*([а-яA-Zм°%]+)?
-            match = re.match(
-                r'^(\d+)[\.\s]+(.+?)\s+(\d+(?:[.,]\d+)?)\s*([а-яA-Za-z°%/\s]+)?$',
-                line
-            )
-            
-            if match:
-                pos_number = int(match.group(1))
-                name = match.group(2).strip()
-                qty_raw = match.group(3).replace(",", ".")
-                unit = match.group(4).strip() if match.group(4) else "шт"
-                
-                try:
-                    qty = float(qty_raw)
-                except:
-                    qty = qty_raw
-                
-                positions.append({
-                    "pos": pos_number,
-                    "name": name,
-                    "unit": unit,
-                    "qty": qty
-                })
-        
-        return positions
+        return extract_positions(text)["positions"]
     
     def _calculate_confidence(self, positions: List[Dict]) -> float:
         """Рассчитываем уверенность распознавания (0-100)"""
@@ -1,28 +1,94 @@
 import os
 import json
+import asyncio
 import logging
 from typing import Dict, List, Optional
-from docx import Document as DocxDocument
-from PyPDF2 import PdfReader
-from openpyxl import load_workbook
+
+from app.services.cache import llm_cache, llm_cache_key, prompt_version
+from app.services.docx_stream import docx_to_text
+from app.services.extraction_pool import extraction_pool, ExtractionError
+from app.services.llm_chunking import map_reduce_positions
+from app.services.llm_client import llm_client
+from app.services.pdf_stream import pdf_to_text, aiter_pdf_pages
+from app.services.position_engine import extract_positions, REGEX_CONFIDENCE_THRESHOLD
+from app.services.prompt_compact import compact_prompt_text, LLM_COMPACT_PROMPT
+from app.services.xlsx_stream import xlsx_to_text, axlsx_to_text, format_row_spaced
+from app.services.table_rows import extract_table_positions, TABLE_CONFIDENCE
+from app.services.uploads import as_source
 
 logger = logging.getLogger(__name__)
 
+GROQ_MODEL = "llama-3.3-70b-versatile"
+GROQ_CONFIDENCE = 85
+GROQ_TRUNCATED_CONFIDENCE = 60  # хвост сверх LLM_CHUNK_MAX_CHUNKS разобран локально
+GROQ_PROMPT = """Проанализируй этот документ и извлеки список позиций для закупки.
+
+Формат ответа - JSON массив объектов:
+{
+  "positions": [
+    {"pos": 1, "name": "название товара", "unit": "ед.измерения", "qty": количество},
+    ...
+  ]
+}
+
+ВАЖНО:
+- Заполни ТОЛЬКО валидный JSON
+- Укажи реальные номера позиций, названия, единицы измерения (м, шт, кг, л и т.д.) и количество
+- Если позиции на русском - оставь как есть
+- Для unit используй: м, шт, кг, л, м2, м3, комплект, упаковка и т.д.
+
+Текст документа:
+"""
+GROQ_PROMPT_VERSION = prompt_version(GROQ_PROMPT)
+
+
+def extract_text(source, ext: Optional[str] = None) -> str:
+    """Extract text from DOCX, PDF, or XLSX (including tables!)
+
+    source is a file path or in-memory bytes/BytesIO/memoryview (then ext is required).
+    Module-level so it can run in the extraction pool worker processes.
+    """
+    try:
+        if ext is None:
+            ext = source.lower().split(".")[-1]
+        ext = ext.lower().lstrip(".")
+        file_path = as_source(source)
+        
+        if ext == "docx":
+            # Streaming reader: paragraphs, then table rows joined with " | "
+            text = docx_to_text(file_path, layout="piped")
+            logger.info(f"[Extract] DOCX: Extracted {len(text)} chars (paragraphs + tables)")
+            return text
+        
+        elif ext == "pdf":
+            # Page by page in this extraction_pool worker
+            text = pdf_to_text(file_path)
+            logger.info(f"[Extract] PDF: Extracted {len(text)} chars")
+            return text
+        
+        elif ext == "xlsx":
+            # Read-only streaming workbook, one line per row
+            text = xlsx_to_text(file_path, format_row_spaced)
+            logger.info(f"[Extract] XLSX: Extracted {len(text)} chars")
+            return text
+        
+        else:
+            logger.warning(f"[Extract] Unknown format: .{ext}")
+            return ""
+            
+    except Exception as e:
+        logger.error(f"[Extract] ERROR: {e}")
+        return ""
+
 
 class DocumentParser:
     def __init__(self):
-        """Initialize document parser with Groq client"""
+        """Initialize document parser with the shared Groq client (llm_client)"""
         self.groq_api_key = os.getenv("GROQ_API_KEY")
-        self.client = None
+        self.client = llm_client if llm_client.available else None
         
-        if self.groq_api_key:
-            try:
-                from groq import Groq
-                self.client = Groq(api_key=self.groq_api_key)
-                logger.info("[Parser] Groq API Key: ✅ SET")
-            except Exception as e:
-                logger.error(f"[Parser] Failed to init Groq: {e}")
-                logger.info("[Parser] Groq API Key: ❌ NOT SET")
+        if self.client:
+            logger.info("[Parser] Groq API Key: ✅ SET")
         else:
             logger.info("[Parser] Groq API Key: ❌ NOT SET")
 
@@ -32,8 +98,29 @@ class DocumentParser:
         logger.info(f"[Parser] File: {file_path}")
         
         try:
-            # Extract raw text
-            raw_text = self._extract_text(file_path)
+            # Tables first: positions come straight from the cells, no text round trip
+            ext = file_path.lower().split(".")[-1]
+            if ext in ("docx", "xlsx"):
+                positions = await extraction_pool.run(extract_table_positions, file_path, ext)
+                if positions:
+                    logger.info(f"[Parser] ✅ Table rows: {len(positions)} positions")
+                    preview = self._format_preview(positions)
+                    return {
+                        "positions": positions,
+                        "metadata": {"confidence": TABLE_CONFIDENCE, "method": "table"},
+                        "preview": preview,
+                        "raw_text": preview
+                    }
+            
+            # Extract raw text in the extraction pool (isolated process, CPU/memory limits);
+            # PDF arrives page by page, page ranges run as separate pool jobs;
+            # XLSX sheets run as separate pool jobs
+            if ext == "pdf":
+                raw_text = await self._pdf_text(file_path)
+            elif ext == "xlsx":
+                raw_text = await axlsx_to_text(file_path, format_row_spaced)
+            else:
+                raw_text = await extraction_pool.run(extract_text, file_path)
             logger.info(f"[Extract] Reading file: {file_path}")
             logger.info(f"[Parser] Extracted text length: {len(raw_text)} chars")
             logger.info(f"[Parser] First 200 chars:\n{raw_text[:200]}")
@@ -47,24 +134,35 @@ class DocumentParser:
                     "raw_text": raw_text
                 }
             
-            # Try Groq first
+            # Local parsing first; Groq only when the structure is not convincing
+            local = await asyncio.to_thread(self._parse_with_regex, raw_text)
+            local["preview"] = raw_text
+            local["raw_text"] = raw_text
+            local_confidence = local["metadata"]["confidence"]
+            
+            if local["positions"] and local_confidence >= REGEX_CONFIDENCE_THRESHOLD:
+                logger.info(f"[Parser] 🧭 Local result is confident ({local_confidence}), Groq skipped")
+                local["metadata"]["routing"] = "local"
+                return local
+            
             if self.client:
-                logger.info("[Parser] 🚀 Attempting Groq/Llama parsing...")
+                logger.info(f"[Parser] 🚀 Local confidence {local_confidence} < {REGEX_CONFIDENCE_THRESHOLD}, attempting Groq/Llama parsing...")
                 result = await self._parse_with_groq(raw_text)
                 if result["positions"]:
                     logger.info(f"[Parser] ✅ Groq SUCCESS: {len(result['positions'])} positions")
+                    result["metadata"]["routing"] = "llm"
                     return result
                 else:
                     logger.warning("[Parser] ⚠️  Groq returned empty, falling back to regex")
             
             # Fallback to regex
-            logger.info("[Parser] 📋 Using REGEX fallback...")
-            result = self._parse_with_regex(raw_text)
-            logger.info(f"[Parser] Regex found {len(result['positions'])} positions")
-            result["preview"] = raw_text
-            result["raw_text"] = raw_text
-            return result
+            logger.info(f"[Parser] 📋 Using REGEX fallback: {len(local['positions'])} positions")
+            local["metadata"]["routing"] = "fallback"
+            return local
             
+        except ExtractionError:
+            # Очередь полна (503) / лимиты пула (422) - решает роутер, а не пустой результат
+            raise
         except Exception as e:
             logger.error(f"[Parser] FATAL ERROR: {e}")
             import traceback
@@ -76,116 +174,90 @@ class DocumentParser:
                 "raw_text": ""
             }
 
-    def _extract_text(self, file_path: str) -> str:
-        """Extract text from DOCX, PDF, or XLSX (including tables!)"""
-        try:
-            ext = file_path.lower().split(".")[-1]
-            
-            if ext == "docx":
-                doc = DocxDocument(file_path)
-                
-                # Сначала параграфы
-                text = "\n".join([p.text for p in doc.paragraphs])
-                
-                # ПОТОМ ТАБЛИЦЫ! (это было пропущено!)
-                for table in doc.tables:
-                    text += "\n"
-                    for row in table.rows:
-                        row_text = " | ".join([cell.text.strip() for cell in row.cells])
-                        text += "\n" + row_text
-                
-                logger.info(f"[Extract] DOCX: Extracted {len(text)} chars (paragraphs + tables)")
-                return text
-            
-            elif ext == "pdf":
-                reader = PdfReader(file_path)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                logger.info(f"[Extract] PDF: Extracted {len(text)} chars from {len(reader.pages)} pages")
-                return text
-            
-            elif ext == "xlsx":
-                wb = load_workbook(file_path)
-                text = ""
-                for ws in wb.sheetnames:
-                    sheet = wb[ws]
-                    for row in sheet.iter_rows(values_only=True):
-                        text += " ".join([str(cell) if cell else "" for cell in row]) + "\n"
-                logger.info(f"[Extract] XLSX: Extracted {len(text)} chars")
-                return text
-            
-            else:
-                logger.warning(f"[Extract] Unknown format: .{ext}")
-                return ""
-                
-        except Exception as e:
-            logger.error(f"[Extract] ERROR: {e}")
-            return ""
+    async def _pdf_text(self, file_path: str) -> str:
+        """PDF text consumed page by page as ranges finish in the extraction pool"""
+        pages: List[str] = []
+        async for page_text in aiter_pdf_pages(file_path):
+            pages.append(page_text + "\n")
+            if len(pages) == 1:
+                logger.info(f"[Extract] PDF: first page ready ({len(page_text)} chars)")
+        logger.info(f"[Extract] PDF: Extracted {len(pages)} pages")
+        return "".join(pages)
 
-    async def _parse_with_groq(self, text: str) -> Dict:
-        """Parse using Groq Llama 3.3 (latest model)"""
-        try:
-            logger.info("[Groq] Starting Llama 3.3 parsing...")
-            logger.info("[Groq] Sending request to Groq API...")
-            
-            prompt = """Проанализируй этот документ и извлеки список позиций для закупки.
+    async def _extract_text(self, file_path: str) -> str:
+        """Extract text in the extraction pool (CPU/memory/time limits)"""
+        return await extraction_pool.run(extract_text, file_path)
 
-Формат ответа - JSON массив объектов:
-{
-  "positions": [
-    {"pos": 1, "name": "название товара", "unit": "ед.измерения", "qty": количество},
-    ...
-  ]
-}
+    async def parse_bytes(self, data: bytes, ext: str) -> str:
+        """Text of an in-memory document (bytes) in the extraction pool, no temp file"""
+        return await extraction_pool.run(extract_text, bytes(data), ext)
 
-ВАЖНО:
-- Заполни ТОЛЬКО валидный JSON
-- Укажи реальные номера позиций, названия, единицы измерения (м, шт, кг, л и т.д.) и количество
-- Если позиции на русском - оставь как есть
-- Для unit используй: м, шт, кг, л, м2, м3, комплект, упаковка и т.д.
+    async def parse_docx_bytes(self, data) -> str:
+        return await self.parse_bytes(data, "docx")
 
-Текст документа:
-""" + text
+    async def parse_pdf_bytes(self, data) -> str:
+        return await self.parse_bytes(data, "pdf")
 
-            response = self.client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=1024,
+    async def parse_xlsx_bytes(self, data) -> str:
+        return await self.parse_bytes(data, "xlsx")
+
+    async def _groq_chunk_positions(self, chunk: str) -> List[Dict]:
+        """One chunk of the document -> positions (map step, cached in llm_cache)"""
+        llm_key = llm_cache_key(chunk, GROQ_MODEL, GROQ_PROMPT_VERSION)
+        cached_positions = llm_cache.get(llm_key)
+        if cached_positions:
+            logger.info(f"[Groq] Cache hit: {len(cached_positions)} positions")
+            return cached_positions
+        
+        logger.info("[Groq] Sending request to Groq API...")
+        response_text = await self.client.chat_completion(
+            model=GROQ_MODEL,
+            messages=[
+                {
+                    "role": "user",
+                    "content": GROQ_PROMPT + chunk
+                }
+            ],
+            temperature=0.3,
+            max_tokens=2048,
+        )
+        logger.info(f"[Groq] Response: {len(response_text)} chars")
+        
+        # Parse JSON from response
+        json_str = response_text
+        if "```json" in response_text:
+            json_str = response_text.split("```json")[1].split("```")[0]
+        elif "```" in response_text:
+            json_str = response_text.split("```")[1].split("```")[0]
+        
+        data = json.loads(json_str.strip())
+        positions = data.get("positions", [])
+        if positions:
+            llm_cache.set(llm_key, positions)
+        return positions
+
+    async def _parse_with_groq(self, text: str) -> Dict:
+        """Parse using Groq Llama 3.3 (latest model); long texts go in parallel chunks"""
+        try:
+            logger.info("[Groq] Starting Llama 3.3 parsing...")
+            compaction = compact_prompt_text(text) if LLM_COMPACT_PROMPT else None
+            result = await map_reduce_positions(
+                compaction["text"] if compaction else text, self._groq_chunk_positions
             )
+            positions = result["positions"]
+            logger.info(f"[Groq] Parsed {len(positions)} positions from {result['chunks']} chunks")
             
-            logger.info("[Groq] Response received")
-            response_text = response.choices[0].message.content
-            logger.info(f"[Groq] Response: {len(response_text)} chars")
-            
-            # Parse JSON from response
-            json_str = response_text
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[1].split("```")[0]
-            elif "```" in response_text:
-                json_str = response_text.split("```")[1].split("```")[0]
-            
-            data = json.loads(json_str.strip())
-            positions = data.get("positions", [])
-            
-            logger.info(f"[Groq] Parsed {len(positions)} positions")
-            
-            return {
-                "positions": positions,
-                "metadata": {
-                    "confidence": 85,
-                    "method": "groq_llama",
-                    "model": "llama-3.3-70b-versatile"
-                },
-                "preview": self._format_preview(positions),
-                "raw_text": text
-            }
+            groq_result = self._groq_result(positions, text)
+            if result["truncated"]:
+                logger.warning(f"[Groq] {result['chunks_dropped']} chunks past the limit parsed locally")
+                groq_result["metadata"].update(
+                    confidence=GROQ_TRUNCATED_CONFIDENCE,
+                    truncated=True,
+                    chunks_dropped=result["chunks_dropped"],
+                )
+            if compaction:
+                groq_result["metadata"]["compaction"] = {k: v for k, v in compaction.items() if k != "text"}
+            return groq_result
             
         except json.JSONDecodeError as e:
             logger.error(f"[Groq] JSON parse error: {e}")
@@ -205,46 +277,33 @@ class DocumentParser:
             logger.error(traceback.format_exc())
             return {"positions": [], "metadata": {"confidence": 0, "method": "groq_error"}}
 
+    def _groq_result(self, positions: List[Dict], text: str) -> Dict:
+        return {
+            "positions": positions,
+            "metadata": {
+                "confidence": GROQ_CONFIDENCE,
+                "method": "groq_llama",
+                "model": GROQ_MODEL
+            },
+            "preview": self._format_preview(positions),
+            "raw_text": text
+        }
+
     def _parse_with_regex(self, text: str) -> Dict:
-        """Fallback regex parsing"""
-        import re
-        
+        """Fallback regex parsing (all position_engine strategies, best result)"""
         logger.info("[Regex] Starting regex parsing...")
-        lines = text.split("\n")
-        logger.info(f"[Regex] Total lines: {len(lines)}")
-        
-        positions = []
-        
-        for line in lines:
-            # Format: "1 | Название | м | 140"
-            match1 = re.match(r"^(\d+)\s*\|\s*(.*?)\s*\|\s*([а-яА-ЯмшШтТкКлЛ\s]+?)\s*\|\s*(\d+)", line)
-            
-            # Format: "1 Название м 140"
-            match2 = re.match(r"^(\d+)\s+(.*?)\s+([а-яА-ЯмшШтТкКлЛ\s]+?)\s+(\d+)$", line)
-            
-            match = match1 or match2
-            
-            if match:
-                pos_num = int(match.group(1))
-                name = match.group(2).strip()
-                unit = match.group(3).strip()
-                qty = int(match.group(4))
-                
-                if name and unit:
-                    positions.append({
-                        "pos": pos_num,
-                        "name": name,
-                        "unit": unit,
-                        "qty": qty
-                    })
-        
-        logger.info(f"[Regex] Total positions found: {len(positions)}")
+        result = extract_positions(text)
+        positions = result["positions"]
+        logger.info(f"[Regex] Total positions found: {len(positions)} (strategy: {result['strategy']})")
         
         return {
             "positions": positions,
             "metadata": {
-                "confidence": 60,
-                "method": "regex"
+                "confidence": result["structure"]["confidence"],
+                "method": "regex",
+                "strategy": result["strategy"],
+                "structure": result["structure"],
+                "timings_ms": result["timings_ms"],
             },
             "preview": self._format_preview(positions),
             "raw_text": text
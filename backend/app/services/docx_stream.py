@@ -0,0 +1,208 @@
+"""
+DOCX Stream - потоковое чтение DOCX без объектной модели python-docx
+
+Читаем word/document.xml из zip через iterparse и отдаём параграфы и строки
+таблиц в порядке документа. Обработанные элементы сразу удаляются из дерева,
+так что память на строку постоянна, а объединённые ячейки (gridSpan/vMerge)
+отдаются один раз - в отличие от `row.cells`, который перестраивает сетку
+на каждый вызов и повторяет объединённые ячейки.
+"""
+import logging
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from typing import IO, Iterator, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+OFFICE_DOCUMENT_REL = "/officeDocument"
+
+_BODY = W_NS + "body"
+_P = W_NS + "p"
+_R = W_NS + "r"
+_HYPERLINK = W_NS + "hyperlink"
+_TBL = W_NS + "tbl"
+_TR = W_NS + "tr"
+_TC = W_NS + "tc"
+_TC_PR = W_NS + "tcPr"
+_GRID_SPAN = W_NS + "gridSpan"
+_V_MERGE = W_NS + "vMerge"
+_VAL = W_NS + "val"
+_TYPE = W_NS + "type"
+
+# Содержимое run -> текст (как Run.text в python-docx)
+_RUN_CHARS = {
+    W_NS + "tab": "\t",
+    W_NS + "ptab": "\t",
+    W_NS + "cr": "\n",
+    W_NS + "noBreakHyphen": "-",
+}
+_T = W_NS + "t"
+_BR = W_NS + "br"
+
+PARAGRAPH = "paragraph"
+ROW = "row"
+
+# text - текст ячейки; col/span - позиция в сетке таблицы;
+# continued - продолжение вертикально объединённой ячейки (текст пустой)
+DocxCell = namedtuple("DocxCell", ["text", "col", "span", "continued"])
+
+DocxSource = Union[str, IO[bytes]]
+
+
+def _run_text(run: ET.Element) -> str:
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag == _T:
+            parts.append(child.text or "")
+        elif tag == _BR:
+            if child.get(_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag in _RUN_CHARS:
+            parts.append(_RUN_CHARS[tag])
+    return "".join(parts)
+
+
+def _paragraph_text(p: ET.Element) -> str:
+    """Текст параграфа: прямые runs и runs внутри гиперссылок"""
+    parts = []
+    for child in p:
+        if child.tag == _R:
+            parts.append(_run_text(child))
+        elif child.tag == _HYPERLINK:
+            parts.extend(_run_text(r) for r in child if r.tag == _R)
+    return "".join(parts)
+
+
+def _cell_text(tc: ET.Element) -> str:
+    """Текст ячейки: её собственные параграфы, вложенные таблицы не входят"""
+    return "\n".join(_paragraph_text(p) for p in tc if p.tag == _P)
+
+
+def _main_part_name(archive: zipfile.ZipFile) -> str:
+    """Имя основной части документа из _rels/.rels (обычно word/document.xml)"""
+    try:
+        rels = ET.fromstring(archive.read("_rels/.rels"))
+        for rel in rels.iter(REL_NS + "Relationship"):
+            if rel.get("Type", "").endswith(OFFICE_DOCUMENT_REL):
+                return posixpath.normpath(rel.get("Target", "").lstrip("/"))
+    except KeyError:
+        pass
+    return "word/document.xml"
+
+
+def _row_cells(tr: ET.Element, above: dict) -> List[DocxCell]:
+    """Ячейки строки по одной на w:tc; above - текст верхних ячеек по колонкам сетки"""
+    cells = []
+    col = 0
+    for tc in tr:
+        if tc.tag != _TC:
+            continue
+        span = 1
+        continued = False
+        tc_pr = tc.find(_TC_PR)
+        if tc_pr is not None:
+            grid_span = tc_pr.find(_GRID_SPAN)
+            if grid_span is not None:
+                span = int(grid_span.get(_VAL, "1") or 1)
+            v_merge = tc_pr.find(_V_MERGE)
+            if v_merge is not None and v_merge.get(_VAL, "continue") == "continue" and col in above:
+                continued = True
+
+        text = "" if continued else _cell_text(tc)
+        if not continued:
+            above[col] = text
+        cells.append(DocxCell(text, col, span, continued))
+        col += span
+    return cells
+
+
+def iter_docx_blocks(source: DocxSource) -> Iterator[Tuple]:
+    """
+    Итерирует блоки документа в порядке следования.
+
+    Yields:
+        ("paragraph", text) - параграф верхнего уровня (как doc.paragraphs)
+        ("row", table_index, [DocxCell, ...]) - строка таблицы верхнего уровня (как doc.tables)
+    """
+    with zipfile.ZipFile(source) as archive:
+        with archive.open(_main_part_name(archive)) as xml_stream:
+            stack: List[ET.Element] = []
+            table_index = -1
+            above: dict = {}
+
+            for event, elem in ET.iterparse(xml_stream, events=("start", "end")):
+                if event == "start":
+                    stack.append(elem)
+                    if elem.tag == _TBL and len(stack) >= 2 and stack[-2].tag == _BODY:
+                        table_index += 1
+                        above = {}
+                    continue
+
+                stack.pop()
+                parent = stack[-1] if stack else None
+                if parent is None:
+                    continue
+
+                if parent.tag == _BODY:
+                    # Элемент верхнего уровня закрыт: параграф отдаём, остальное уже отдано по строкам
+                    if elem.tag == _P:
+                        yield (PARAGRAPH, _paragraph_text(elem))
+                    elem.clear()
+                    parent.remove(elem)
+                elif (
+                    elem.tag == _TR
+                    and parent.tag == _TBL
+                    and len(stack) >= 2
+                    and stack[-2].tag == _BODY
+                ):
+                    yield (ROW, table_index, _row_cells(elem, above))
+                    elem.clear()
+                    parent.remove(elem)
+
+
+def docx_to_text(source: DocxSource, layout: str = "piped") -> str:
+    """
+    Собирает текст DOCX в одном из исторических форматов.
+
+    layout="lines": непустые параграфы, затем каждая непустая ячейка на своей строке
+                    (формат main.extract_text_from_file)
+    layout="piped": все параграфы, затем строки таблиц через " | "
+                    (формат DocumentParser._extract_text)
+    """
+    paragraphs: List[str] = []
+    table_lines: List[str] = []
+    last_table = -1
+    rows = 0
+
+    for block in iter_docx_blocks(source):
+        if block[0] == PARAGRAPH:
+            if layout == "lines":
+                if block[1].strip():
+                    paragraphs.append(block[1])
+            else:
+                paragraphs.append(block[1])
+            continue
+
+        _, table_index, cells = block
+        rows += 1
+        new_table = table_index != last_table
+        last_table = table_index
+        if layout == "lines":
+            table_lines.extend(c.text.strip() for c in cells if c.text.strip())
+        else:
+            if new_table:
+                table_lines.append("")
+            table_lines.append(" | ".join(c.text.strip() for c in cells))
+
+    logger.info(f"[DocxStream] {len(paragraphs)} paragraphs, {last_table + 1} tables, {rows} rows")
+
+    if layout == "lines":
+        return "\n".join(paragraphs) + "\n" + "\n".join(table_lines)
+    if not table_lines:
+        return "\n".join(paragraphs)
+    return "\n".join(paragraphs) + "\n" + "\n".join(table_lines)
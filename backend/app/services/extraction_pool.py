@@ -0,0 +1,225 @@
+"""
+Extraction Pool - извлечение текста из документов в отдельных процессах
+
+Тяжёлые документы (PDF на сотни страниц, большие DOCX/XLSX) разбираются
+в пуле процессов, чтобы не блокировать event loop uvicorn. На каждую
+задачу действуют лимиты CPU-времени, wall-clock времени и памяти, а
+глубина очереди ограничена: при переполнении сразу отдаём 503.
+"""
+import asyncio
+import logging
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+EXTRACTION_MAX_PENDING = int(os.getenv("EXTRACTION_MAX_PENDING", "32"))  # выполняются + ждут
+EXTRACTION_CPU_LIMIT = int(os.getenv("EXTRACTION_CPU_LIMIT", "60"))  # секунд CPU на задачу
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "120"))  # секунд wall-clock на задачу
+EXTRACTION_MEMORY_LIMIT_MB = int(os.getenv("EXTRACTION_MEMORY_LIMIT_MB", "2048"))
+EXTRACTION_RETRY_AFTER = int(os.getenv("EXTRACTION_RETRY_AFTER", "5"))
+
+
+class ExtractionError(Exception):
+    """Извлечение не удалось по вине пула (упал процесс, превышены лимиты)"""
+
+
+class ExtractionPoolBusy(ExtractionError):
+    """Очередь пула заполнена - клиенту нужно повторить позже"""
+
+    def __init__(self, pending: int, retry_after: int = EXTRACTION_RETRY_AFTER):
+        super().__init__(f"Extraction queue is full ({pending} jobs pending)")
+        self.pending = pending
+        self.retry_after = retry_after
+
+
+class ExtractionTimeout(ExtractionError):
+    """Задача превысила лимит CPU или wall-clock времени"""
+
+
+class _LimitExceeded(BaseException):
+    """
+    Поднимается в воркере по SIGXCPU/SIGALRM.
+
+    Наследуется от BaseException, чтобы не проглатываться `except Exception`
+    внутри экстракторов и дойти до родительского процесса.
+    """
+
+
+# ================ WORKER SIDE ================
+
+def _on_limit_signal(signum, frame):
+    name = "CPU time" if signum == getattr(signal, "SIGXCPU", None) else "wall-clock time"
+    raise _LimitExceeded(f"{name} limit exceeded")
+
+
+def _init_worker(memory_limit_mb: int):
+    """Инициализация процесса-воркера: лимит памяти и обработчики сигналов"""
+    if RESOURCE_AVAILABLE and memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _on_limit_signal)
+    if hasattr(signal, "SIGALRM"):
+        signal.signal(signal.SIGALRM, _on_limit_signal)
+
+
+def _run_job(func: Callable, args: tuple, cpu_limit: int, timeout: float) -> Any:
+    """Выполняет задачу в воркере с лимитами CPU и wall-clock"""
+    cpu_limited = RESOURCE_AVAILABLE and hasattr(signal, "SIGXCPU") and cpu_limit > 0
+    wall_limited = hasattr(signal, "setitimer") and timeout > 0
+
+    if cpu_limited:
+        # RLIMIT_CPU считает суммарное время процесса, поэтому лимит сдвигаем от уже потраченного
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime)
+        prev_soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = used + cpu_limit
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    if wall_limited:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    try:
+        return func(*args)
+    finally:
+        if wall_limited:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        if cpu_limited:
+            resource.setrlimit(resource.RLIMIT_CPU, (prev_soft, hard))
+
+
+# ================ POOL ================
+
+def _describe_args(args: tuple) -> str:
+    """Аргументы задачи для лога: пути как есть, документы в памяти - только тип и размер"""
+    parts = []
+    for arg in args:
+        if isinstance(arg, (bytes, bytearray, memoryview)):
+            parts.append(f"<{type(arg).__name__} {len(arg)} bytes>")
+        elif hasattr(arg, "getbuffer"):
+            parts.append(f"<{type(arg).__name__} {arg.getbuffer().nbytes} bytes>")
+        else:
+            parts.append(repr(arg))
+    return ", ".join(parts)
+
+
+class ExtractionPool:
+    """Ограниченный пул процессов для извлечения текста"""
+
+    def __init__(
+        self,
+        workers: int = EXTRACTION_WORKERS,
+        max_pending: int = EXTRACTION_MAX_PENDING,
+        cpu_limit: int = EXTRACTION_CPU_LIMIT,
+        timeout: float = EXTRACTION_TIMEOUT,
+        memory_limit_mb: int = EXTRACTION_MEMORY_LIMIT_MB,
+    ):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.cpu_limit = cpu_limit
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.stats: Dict[str, int] = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "cancelled": 0,
+            "restarts": 0,
+        }
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.memory_limit_mb,),
+            )
+            logger.info(
+                f"[ExtractionPool] Started: workers={self.workers}, max_pending={self.max_pending}, "
+                f"cpu_limit={self.cpu_limit}s, timeout={self.timeout}s, memory={self.memory_limit_mb}MB"
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("[ExtractionPool] Stopped")
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        # Несколько задач могут упасть на одном сломанном пуле - перезапускаем один раз
+        if self._executor is not broken:
+            return
+        logger.warning("[ExtractionPool] Worker died, restarting pool")
+        self.stats["restarts"] += 1
+        self.shutdown()
+        self.start()
+
+    async def run(self, func: Callable, *args) -> Any:
+        """
+        Выполняет func(*args) в процессе пула.
+
+        func должна быть функцией уровня модуля (pickle по ссылке).
+        Отмена ожидающей корутины снимает задачу из очереди; уже запущенную
+        задачу ограничивают лимиты CPU/времени.
+        """
+        if self._pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            logger.warning(f"[ExtractionPool] Queue full: {self._pending} pending, rejecting")
+            raise ExtractionPoolBusy(self._pending)
+
+        self.start()
+        self._pending += 1
+        self.stats["submitted"] += 1
+        executor = self._executor
+        try:
+            future = executor.submit(_run_job, func, args, self.cpu_limit, self.timeout)
+            result = await asyncio.wrap_future(future)
+            self.stats["completed"] += 1
+            return result
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        except _LimitExceeded as e:
+            self.stats["timeouts"] += 1
+            logger.error(f"[ExtractionPool] Job {getattr(func, '__name__', func)}({_describe_args(args)}): {e}")
+            raise ExtractionTimeout(str(e)) from None
+        except BrokenProcessPool as e:
+            self.stats["failed"] += 1
+            self._restart(executor)
+            raise ExtractionError(f"Extraction worker crashed: {e}") from None
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self._pending -= 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self.stats, "pending": self._pending, "workers": self.workers}
+
+
+# Общий пул на процесс uvicorn
+extraction_pool = ExtractionPool()
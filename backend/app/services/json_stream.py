@@ -0,0 +1,102 @@
+"""
+JSON Stream - инкрементальный разбор JSON-массива объектов из потока LLM
+
+Модель отвечает "[{...}, {...}, ...]" (иногда в ```json ... ```). Вместо
+ожидания всего ответа и json.loads целиком каждый объект отдаётся, как
+только закрылась его фигурная скобка: позиции появляются по мере
+генерации, а при обрыве/таймауте уже разобранные не теряются.
+
+Куски потока режут текст где угодно (посреди строки, escape-
+последовательности, числа) - состояние переносится между feed().
+Сканируются только структурные символы, остальной текст не трогается.
+"""
+import json
+import logging
+import re
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+_STRUCTURAL_RE = re.compile(r'[{}\[\]"\\]')
+
+
+class JsonArrayStream:
+    """feed(кусок) -> объекты массива, закрывшиеся в этом куске; closed - массив закончился"""
+
+    def __init__(self):
+        self.started = False  # встретили "[" - всё до неё (```json, пояснения) пропускается
+        self.closed = False
+        self.emitted = 0
+        self.errors = 0
+        self._depth = 0  # вложенность внутри текущего объекта
+        self._in_string = False
+        self._escape = False  # "\" был последним символом предыдущего куска
+        self._carry = ""  # начало незакрытого объекта из предыдущих кусков
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        if self.closed or not chunk:
+            return items
+
+        skip = 0
+        if self._escape:
+            skip, self._escape = 1, False
+        obj_start = 0 if self._depth else None
+
+        for match in _STRUCTURAL_RE.finditer(chunk):
+            i = match.start()
+            if i < skip:
+                continue
+            ch = match.group()
+
+            if not self.started:
+                if ch == "[":
+                    self.started = True
+                continue
+
+            if self._in_string:
+                if ch == "\\":
+                    skip = i + 2
+                    self._escape = skip > len(chunk)
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+                continue
+
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    obj_start = i
+                elif ch == "]":
+                    self.closed = True
+                    break
+                continue
+
+            if ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    item = self._decode(self._carry + chunk[obj_start:i + 1])
+                    if item is not None:
+                        items.append(item)
+                    self._carry = ""
+                    obj_start = None
+
+        if self._depth and obj_start is not None:
+            self._carry += chunk[obj_start:]
+        return items
+
+    def _decode(self, raw: str):
+        try:
+            item = json.loads(raw)
+        except ValueError:
+            self.errors += 1
+            logger.warning(f"[JsonStream] Malformed object skipped: {raw[:80]!r}")
+            return None
+        if not isinstance(item, dict):
+            return None
+        self.emitted += 1
+        return item
@@ -0,0 +1,236 @@
+"""
+LLM Chunking - разбор длинных документов через LLM по частям (map-reduce)
+
+Вместо обрезки текста (text[:8000], text[:3000]) документ режется по
+границам строк таблицы/абзацев на куски в пределах бюджета токенов,
+куски отправляются параллельно (не больше LLM_CHUNK_CONCURRENCY
+одновременно), а позиции склеиваются и дедуплицируются по номеру и
+наименованию. Время ответа - как у самого медленного куска, а не сумма.
+
+Кусков больше LLM_CHUNK_MAX_CHUNKS - хвост в LLM не уходит: результат
+помечается truncated / chunks_dropped, хвост разбирается локально
+(parse_tail), чтобы позиции в конце документа не пропадали молча.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.services.position_engine import POS_NUMBER_RE, TABLE_HEADER_RE, extract_positions
+
+logger = logging.getLogger(__name__)
+
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "1500"))  # входных токенов на кусок
+LLM_CHUNK_CONCURRENCY = int(os.getenv("LLM_CHUNK_CONCURRENCY", "4"))
+LLM_CHUNK_MAX_CHUNKS = int(os.getenv("LLM_CHUNK_MAX_CHUNKS", "64"))  # защита от гигантских документов: хвост - в parse_tail
+CHARS_PER_TOKEN = 3  # грубая оценка для кириллицы в токенизаторе Llama
+TABLE_HEADER_MAX_CHARS = 300  # шапка таблицы повторяется в каждом куске
+
+_ROW_START_RE = re.compile(r"^\d{1,6}[.)]?\s*(\||\s\D)")
+_SPACES_RE = re.compile(r"\s+")
+
+ChunkCall = Callable[[str], Awaitable[List[Dict]]]
+TailParse = Callable[[str], List[Dict]]  # локальный разбор текста -> позиции (синхронный, идёт в поток)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _starts_row(lines: List[str], i: int) -> bool:
+    """Строка начинает строку таблицы: "12 Труба ..." / "12 | Труба" или номер, за которым текст"""
+    line = lines[i].strip()
+    if _ROW_START_RE.match(line):
+        return True
+    if POS_NUMBER_RE.match(line):
+        following = next((l.strip() for l in lines[i + 1:i + 4] if l.strip()), "")
+        return bool(following) and not following[0].isdigit()
+    return False
+
+
+def _blocks(lines: List[str]) -> List[List[str]]:
+    """Строки -> блоки, которые нельзя резать: строка таблицы или абзац"""
+    blocks: List[List[str]] = []
+    current: List[str] = []
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if current and (not stripped or _starts_row(lines, i)):
+            blocks.append(current)
+            current = []
+        if stripped:
+            current.append(line)
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def _table_header(lines: List[str]) -> str:
+    """
+    Шапка "№ / Наименование / Ед. изм. / Кол-во" - от "№" до первого номера
+    позиции, или строка "№ | Наименование | ..." (сжатый текст, строки через "|")
+    """
+    for i, line in enumerate(lines):
+        if "|" in line and TABLE_HEADER_RE.match(line.split("|", 1)[0].strip()):
+            text = line.strip()
+            return text if len(text) <= TABLE_HEADER_MAX_CHARS else ""
+        if TABLE_HEADER_RE.match(line.strip()):
+            header = []
+            for following in lines[i:]:
+                if POS_NUMBER_RE.match(following.strip()):
+                    break
+                header.append(following)
+            text = "\n".join(header).strip()
+            return text if len(text) <= TABLE_HEADER_MAX_CHARS else ""
+    return ""
+
+
+def split_into_chunks(text: str, max_tokens: int = LLM_CHUNK_TOKENS) -> List[str]:
+    """
+    Режет текст на куски не больше max_tokens по границам строк таблицы
+    и абзацев. Блок длиннее бюджета режется по строкам, строка - по символам.
+    Шапка таблицы (если короткая) повторяется в начале каждого куска после первого.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    lines = text.split("\n")
+    header = _table_header(lines)
+    budget_chars = max(1, max_tokens * CHARS_PER_TOKEN - len(header) - 1)
+
+    pieces: List[str] = []
+    for block in _blocks(lines):
+        block_text = "\n".join(block)
+        if len(block_text) <= budget_chars:
+            pieces.append(block_text)
+            continue
+        for line in block:
+            pieces.extend(line[i:i + budget_chars] for i in range(0, len(line), budget_chars))
+
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for piece in pieces:
+        if current and size + len(piece) + 1 > budget_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+
+    if header:
+        chunks = [chunks[0]] + [
+            chunk if chunk.startswith(header) else f"{header}\n{chunk}" for chunk in chunks[1:]
+        ]
+    return chunks
+
+
+def local_positions(text: str) -> List[Dict]:
+    """parse_tail по умолчанию - локальный разбор position_engine"""
+    return extract_positions(text)["positions"]
+
+
+def _tail_text(text: str, dropped: List[str]) -> str:
+    """Текст неотправленных кусков: шапка таблицы один раз, а не в начале каждого"""
+    header = _table_header(text.split("\n"))
+    if not header:
+        return "\n".join(dropped)
+    bodies = [chunk[len(header):].lstrip("\n") if chunk.startswith(header) else chunk for chunk in dropped]
+    return "\n".join([header] + bodies)
+
+
+def _dedupe_key(position: Dict):
+    name = _SPACES_RE.sub(" ", str(position.get("name", ""))).strip().casefold()
+    return position.get("pos"), name
+
+
+def merge_positions(chunk_results: List[List[Dict]]) -> List[Dict]:
+    """Склеивает позиции кусков по порядку, повторы (номер + наименование) выкидывает"""
+    seen = set()
+    merged: List[Dict] = []
+    for positions in chunk_results:
+        for position in positions or []:
+            if not isinstance(position, dict) or not position.get("name"):
+                continue
+            key = _dedupe_key(position)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(position)
+    return merged
+
+
+async def map_reduce_positions(
+    text: str,
+    call_chunk: ChunkCall,
+    max_tokens: int = LLM_CHUNK_TOKENS,
+    concurrency: int = LLM_CHUNK_CONCURRENCY,
+    max_chunks: int = LLM_CHUNK_MAX_CHUNKS,
+    progress: Optional[Dict] = None,
+    parse_tail: Optional[TailParse] = local_positions,
+) -> Dict:
+    """
+    Позиции документа: call_chunk(кусок) -> список позиций, куски параллельно.
+
+    Падение любого куска отменяет остальные и пробрасывается - вызывающий
+    откатывается на regex целиком, а не отдаёт документ с дырой.
+    progress (если передан) - chunks_total / chunks_done / chunks_dropped
+    по ходу работы.
+
+    Кусков больше max_chunks: первые max_chunks - в LLM, остальные (хвост) -
+    в parse_tail параллельно с ними (None - хвост выбрасывается), позиции
+    хвоста дописываются в конец.
+    Результат в этом случае truncated - не полностью от LLM, вызывающий
+    понижает уверенность.
+
+    Returns:
+        {"positions": [...], "chunks": int, "chunks_dropped": int,
+         "truncated": bool, "elapsed_ms": float}
+    """
+    chunks = split_into_chunks(text, max_tokens)
+    dropped = chunks[max_chunks:]
+    chunks = chunks[:max_chunks]
+    if dropped:
+        logger.warning(
+            f"[LLMChunking] {len(chunks) + len(dropped)} chunks, only first {max_chunks} are sent, "
+            f"{len(dropped)} {'go to local parse' if parse_tail else 'are dropped'}"
+        )
+    if progress is not None:
+        progress.update(chunks_total=len(chunks), chunks_done=0, chunks_dropped=len(dropped))
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.perf_counter()
+
+    async def run(chunk: str) -> List[Dict]:
+        async with semaphore:
+            positions = await call_chunk(chunk)
+        if progress is not None:
+            progress["chunks_done"] += 1
+        return positions
+
+    tasks = [asyncio.create_task(run(chunk)) for chunk in chunks]
+    if dropped and parse_tail is not None:
+        tasks.append(asyncio.create_task(asyncio.to_thread(parse_tail, _tail_text(text, dropped))))
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    positions = merge_positions(results)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(
+        f"[LLMChunking] {len(chunks)} chunks -> {len(positions)} positions "
+        f"({sum(len(r or []) for r in results)} before dedupe) in {elapsed_ms} ms"
+    )
+    return {
+        "positions": positions,
+        "chunks": len(chunks),
+        "chunks_dropped": len(dropped),
+        "truncated": bool(dropped),
+        "elapsed_ms": elapsed_ms,
+    }
+
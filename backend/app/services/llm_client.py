@@ -0,0 +1,196 @@
+"""
+LLM Client - один асинхронный клиент Groq на весь процесс
+
+Раньше клиент создавался на каждый запрос (новое TLS-соединение), а
+синхронный chat.completions.create держал event loop до таймаута. Здесь
+AsyncGroq поверх общего httpx.AsyncClient с пулом keep-alive соединений:
+создаётся на старте приложения, закрывается на остановке, используется
+всеми парсерами.
+"""
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.services.llm_guard import llm_guard
+
+logger = logging.getLogger(__name__)
+
+try:
+    import httpx
+    from groq import AsyncGroq
+    LLM_AVAILABLE = True
+except ImportError:
+    LLM_AVAILABLE = False
+
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None  # свой/тестовый OpenAI-совместимый сервер
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "15"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "0"))  # фоллбэк на regex - наш, ретраи SDK только добавляют задержку
+
+
+class LLMUnavailable(Exception):
+    """Нет SDK или GROQ_API_KEY"""
+
+
+class LLMClientManager:
+    """Общий AsyncGroq + httpx-пул; start() на старте приложения, close() на остановке"""
+
+    def __init__(self):
+        self._client = None
+        self._http = None
+        self.stats: Dict[str, int] = {"requests": 0, "streams": 0, "errors": 0, "deadline_exceeded": 0}
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return os.getenv("GROQ_API_KEY")
+
+    @property
+    def available(self) -> bool:
+        return LLM_AVAILABLE and bool(self.api_key)
+
+    def start(self) -> bool:
+        if self._client is not None:
+            return True
+        if not self.available:
+            logger.info(f"[LLM] Client disabled (sdk={LLM_AVAILABLE}, key={bool(self.api_key)})")
+            return False
+
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        self._client = AsyncGroq(
+            api_key=self.api_key,
+            base_url=LLM_BASE_URL,
+            http_client=self._http,
+            max_retries=LLM_MAX_RETRIES,
+            timeout=LLM_TIMEOUT,
+        )
+        logger.info(
+            f"[LLM] Client started (base_url={LLM_BASE_URL or 'default'}, "
+            f"pool={LLM_MAX_CONNECTIONS}/{LLM_KEEPALIVE_CONNECTIONS} keep-alive)"
+        )
+        return True
+
+    @property
+    def client(self):
+        """AsyncGroq; создаётся лениво, если start() не вызывали (роутеры вне main)"""
+        if self._client is None and not self.start():
+            raise LLMUnavailable("Groq SDK or GROQ_API_KEY not available")
+        return self._client
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.1,
+        max_tokens: int = 2048,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """
+        Текст ответа модели; исключения SDK пробрасываются вызывающему.
+        Через llm_guard: при открытом предохранителе или исчерпанном лимите -
+        LLMGuardRejected сразу, без запроса.
+        """
+        client = self.client
+        await llm_guard.before_call()
+        self.stats["requests"] += 1
+        try:
+            response = await client.chat.completions.create(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout or LLM_TIMEOUT,
+            )
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                self.stats["errors"] += 1
+            llm_guard.on_failure(e)
+            raise
+        llm_guard.on_success()
+        return (response.choices[0].message.content or "").strip()
+
+    async def stream_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float = 0.1,
+        max_tokens: int = 2048,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Ответ модели по кускам (stream=True) - для разбора по мере генерации.
+        timeout здесь - на ожидание каждого куска, общий срок ставит вызывающий
+        и о его срыве сообщает через deadline_exceeded() - отмена по сроку
+        выглядит здесь как CancelledError. Потребитель, бросивший поток, должен
+        закрыть генератор (aclosing) - соединение вернётся в пул, предохранитель
+        не посчитает это падением.
+        """
+        client = self.client
+        await llm_guard.before_call()
+        self.stats["requests"] += 1
+        self.stats["streams"] += 1
+        stream = None
+        try:
+            stream = await client.chat.completions.create(
+                messages=messages,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout or LLM_TIMEOUT,
+                stream=True,
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except BaseException as e:
+            if not isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+                self.stats["errors"] += 1
+            llm_guard.on_failure(e)
+            raise
+        finally:
+            if stream is not None:
+                await stream.close()
+        llm_guard.on_success()
+
+    def deadline_exceeded(self, exc: BaseException):
+        """
+        Общий срок ответа (wait_for вызывающего) истёк: поток отменён, и
+        guard увидел только отмену. Здесь это засчитывается как падение
+        провайдера - зависший Groq размыкает предохранитель.
+        """
+        self.stats["errors"] += 1
+        self.stats["deadline_exceeded"] += 1
+        llm_guard.on_failure(exc)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+            logger.info("[LLM] Client closed")
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "started": self._client is not None,
+            "base_url": LLM_BASE_URL,
+            "guard": llm_guard.get_stats(),
+        }
+
+
+llm_client = LLMClientManager()
@@ -0,0 +1,202 @@
+"""
+LLM Guard - ограничитель частоты и предохранитель (circuit breaker) для Groq
+
+Token bucket держит темп запросов и на 429 ставит паузу по Retry-After.
+Circuit breaker после LLM_BREAKER_FAILURES подряд падений (таймауты, 5xx,
+сеть, 429, auth, снятая модель) размыкается: следующие LLM_BREAKER_COOLDOWN
+секунд запросы сразу получают LLMCircuitOpen и уходят в локальный разбор,
+не ожидая таймаута. Потом пропускается один пробный запрос (half-open):
+успех - цепь замыкается, падение - снова открыта.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", "5"))
+LLM_RATE_BURST = float(os.getenv("LLM_RATE_BURST", "10"))
+LLM_RATE_MAX_WAIT = float(os.getenv("LLM_RATE_MAX_WAIT", "1"))  # дольше ждать токен не будем - сразу в regex
+LLM_RETRY_AFTER_DEFAULT = float(os.getenv("LLM_RETRY_AFTER_DEFAULT", "5"))  # 429 без заголовка
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Статусы, говорящие о проблеме на стороне/пути к провайдеру, а не о конкретном запросе
+_FAILURE_STATUSES = {401, 403, 404, 408, 409, 429}
+
+
+class LLMGuardRejected(Exception):
+    """Запрос к LLM не отправлен; retry_after - через сколько секунд есть смысл пробовать"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMCircuitOpen(LLMGuardRejected):
+    pass
+
+
+class LLMRateLimited(LLMGuardRejected):
+    pass
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_provider_failure(exc: BaseException) -> bool:
+    """Падение, которое считается предохранителем (а не ошибка конкретного запроса, вроде 400)"""
+    if isinstance(exc, (asyncio.CancelledError, GeneratorExit)):
+        return False
+    status = _status_code(exc)
+    if status is None or status >= 500 or status in _FAILURE_STATUSES:
+        return True
+    return "decommissioned" in str(exc).lower()
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity; block_for - пауза после 429"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def block_for(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self, max_wait: float):
+        deadline = time.monotonic() + max_wait
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                wait = self.blocked_until - now
+            else:
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+            if now + wait > deadline:
+                raise LLMRateLimited(f"LLM rate limit: next slot in {wait:.1f}s", retry_after=wait)
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def before_call(self):
+        if self.state == OPEN:
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                raise LLMCircuitOpen(f"LLM circuit open for {remaining:.0f}s more", retry_after=remaining)
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+            logger.info("[LLMGuard] Circuit half-open, letting a probe through")
+        if self.state == HALF_OPEN:
+            if self.probe_in_flight:
+                raise LLMCircuitOpen("LLM circuit half-open, probe in flight", retry_after=1.0)
+            self.probe_in_flight = True
+
+    def on_success(self):
+        if self.state != CLOSED:
+            logger.info("[LLMGuard] Circuit closed")
+        self.state = CLOSED
+        self.failures = 0
+        self.probe_in_flight = False
+
+    def on_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.open()
+
+    def on_abandoned(self):
+        """Вызов отменён (например, соседний кусок упал) - пробу можно повторить"""
+        self.probe_in_flight = False
+
+    def open(self):
+        if self.state != OPEN:
+            logger.warning(f"[LLMGuard] Circuit OPEN after {self.failures} failures, cooldown {self.cooldown:g}s")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+
+
+class LLMGuard:
+    """Token bucket + circuit breaker; before_call / on_success / on_failure вокруг каждого запроса"""
+
+    def __init__(self):
+        self.bucket = TokenBucket(LLM_RATE_PER_SEC, LLM_RATE_BURST)
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+        self.stats: Dict[str, int] = {"rejected_open": 0, "rejected_rate": 0, "failures": 0, "throttled_429": 0}
+
+    async def before_call(self):
+        try:
+            self.breaker.before_call()
+        except LLMCircuitOpen:
+            self.stats["rejected_open"] += 1
+            raise
+        try:
+            await self.bucket.acquire(LLM_RATE_MAX_WAIT)
+        except BaseException as e:
+            self.breaker.on_abandoned()
+            if isinstance(e, LLMRateLimited):
+                self.stats["rejected_rate"] += 1
+            raise
+
+    def on_success(self):
+        self.breaker.on_success()
+
+    def on_failure(self, exc: BaseException):
+        if not is_provider_failure(exc):
+            self.breaker.on_abandoned()
+            return
+        if _status_code(exc) == 429:
+            retry_after = _retry_after(exc) or LLM_RETRY_AFTER_DEFAULT
+            self.bucket.block_for(retry_after)
+            self.stats["throttled_429"] += 1
+            logger.warning(f"[LLMGuard] 429 from provider, pausing for {retry_after:.1f}s")
+        self.stats["failures"] += 1
+        self.breaker.on_failure()
+
+    def get_stats(self) -> Dict:
+        return {
+            **self.stats,
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "tokens": round(self.bucket.tokens, 2),
+        }
+
+
+llm_guard = LLMGuard()
@@ -0,0 +1,145 @@
+"""
+Normalize - единицы измерения и количества
+
+Словарь единиц с синонимами (м2/м²/кв.м -> м², т/тн -> т, компл/комплект
+-> компл) и разбор количеств с учётом русской локали: десятичная запятая,
+разделители тысяч, диапазоны (берём верхнюю границу). Одни и те же токены
+повторяются в каждой строке каждого документа, поэтому результат
+кешируется по токену.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Optional, Union
+
+Number = Union[int, float]
+
+# Каноническая единица -> синонимы (сравнение без регистра, пробелов и конечной точки)
+UNIT_ALIASES: Dict[str, tuple] = {
+    "шт": ("шт", "штук", "штука", "штуки", "pcs", "pc"),
+    "м": ("м", "метр", "метра", "метров", "п.м", "пм", "пог.м", "м.п", "мп", "м.пог"),
+    "м²": ("м²", "м2", "кв.м", "квм", "м.кв", "sqm"),
+    "м³": ("м³", "м3", "куб.м", "кубм", "м.куб"),
+    "см": ("см",),
+    "мм": ("мм",),
+    "кг": ("кг", "килограмм", "кгс"),
+    "г": ("г", "гр", "грамм"),
+    "т": ("т", "тн", "тонн", "тонна", "тонны"),
+    "л": ("л", "литр", "литра", "литров"),
+    "компл": ("компл", "комплект", "комплекта", "комплектов", "к-т", "кт", "компл-т"),
+    "уп": ("уп", "упак", "упаковка", "упаковки", "упаковок"),
+    "пар": ("пар", "пара", "пары"),
+    "рул": ("рул", "рулон", "рулона", "рулонов"),
+    "лист": ("лист", "листа", "листов"),
+    "ед": ("ед", "единица", "единиц"),
+}
+
+DEFAULT_UNIT = "шт"
+
+_SPACE_CHARS_RE = re.compile(r"[\s\u00a0\u202f']+")
+
+
+def _unit_key(raw: str) -> str:
+    return _SPACE_CHARS_RE.sub("", raw.lower().replace("ё", "е")).rstrip(".")
+
+
+_UNIT_LOOKUP: Dict[str, str] = {
+    _unit_key(alias): canonical
+    for canonical, aliases in UNIT_ALIASES.items()
+    for alias in aliases
+}
+
+
+def _alias_pattern(alias: str) -> str:
+    # "кв.м" -> кв\.?\s*м : в тексте бывает "кв. м", "кв м"
+    return r"\.?\s*".join(re.escape(part) for part in re.split(r"[.\s]+", alias) if part)
+
+
+# Regex-альтернатива всех синонимов (длинные первыми) - для построчных шаблонов
+UNIT_PATTERN = "(?:" + "|".join(
+    _alias_pattern(alias)
+    for alias in sorted({a for aliases in UNIT_ALIASES.values() for a in aliases}, key=len, reverse=True)
+) + r")\.?"
+
+
+@lru_cache(maxsize=4096)
+def normalize_unit(raw: Optional[str]) -> Optional[str]:
+    """Каноническая единица для токена ("кв. м." -> "м²") или None, если не из словаря"""
+    if not raw:
+        return None
+    return _UNIT_LOOKUP.get(_unit_key(raw))
+
+
+def is_unit(raw: Optional[str]) -> bool:
+    return normalize_unit(raw) is not None
+
+
+def unit_or_default(raw: Optional[str], default: str = DEFAULT_UNIT) -> str:
+    """Каноническая единица; неизвестная остаётся как в документе, пустая - default"""
+    raw = (raw or "").strip()
+    if not raw:
+        return default
+    return normalize_unit(raw) or raw
+
+
+# ================ КОЛИЧЕСТВА ================
+
+_NUMBER = r"\d(?:[\d\s\u00a0\u202f'.,]*\d)?"
+_NUMBER_RE = re.compile(_NUMBER)
+_THOUSANDS_RE = re.compile(r"^\d{1,3}(?:[\s\u00a0\u202f']\d{3})+(?:[.,]\d+)?$")
+_RANGE_RE = re.compile(rf"(?:от\s*)?({_NUMBER})\s*(?:-|–|—|\.\.\.?|до)\s*({_NUMBER})", re.IGNORECASE)
+
+
+def parse_number(token: str) -> Optional[Number]:
+    """
+    Число в русской/английской записи: "1 234,5", "1.234,5", "1,234.5",
+    "5,8261", "1 000". Одиночная запятая - десятичная; точки/запятые,
+    повторяющиеся несколько раз, - разделители тысяч.
+    """
+    s = _SPACE_CHARS_RE.sub("", token)
+    if not s:
+        return None
+    if "," in s and "." in s:
+        decimal = "," if s.rfind(",") > s.rfind(".") else "."
+        s = s.replace("." if decimal == "," else ",", "").replace(decimal, ".")
+    elif s.count(",") > 1:
+        s = s.replace(",", "")
+    elif s.count(".") > 1:
+        s = s.replace(".", "")
+    else:
+        s = s.replace(",", ".")
+    try:
+        value = float(s)
+    except ValueError:
+        return None
+    return int(value) if value.is_integer() else value
+
+
+@lru_cache(maxsize=65536)
+def parse_quantity(raw: Optional[str]) -> Optional[Number]:
+    """
+    Количество из ячейки/фрагмента: первое число, для диапазона
+    ("10-15", "от 10 до 15") - верхняя граница. None - числа нет.
+    """
+    if not raw:
+        return None
+    match = _RANGE_RE.search(raw)
+    if match:
+        low, high = parse_number(match.group(1)), parse_number(match.group(2))
+        if low is not None and high is not None:
+            return max(low, high)
+    match = _NUMBER_RE.search(raw)
+    if not match:
+        return None
+    # "2 5" - после пробела уже другое число, если это не группы тысяч ("1 234,5")
+    token = match.group(0)
+    if _SPACE_CHARS_RE.search(token) and not _THOUSANDS_RE.match(token):
+        token = _SPACE_CHARS_RE.split(token, 1)[0]
+    return parse_number(token.rstrip(".,"))
+
+
+def cache_info() -> Dict[str, Dict[str, int]]:
+    """Статистика мемоизации - для /metrics"""
+    return {
+        "units": normalize_unit.cache_info()._asdict(),
+        "quantities": parse_quantity.cache_info()._asdict(),
+    }
@@ -0,0 +1,98 @@
+"""
+Pagination - keyset-пагинация списков по (created_at, id)
+
+Курсор - непрозрачная строка (base64 от JSON с ключом последней записи
+страницы); следующая страница - записи строго после этого ключа, так что
+цена страницы не зависит от того, сколько записей до неё. Курсор
+следующей страницы отдаётся в заголовке X-Next-Cursor (тело ответа -
+прежний список); на последней странице заголовка нет. Порядок - order
+(asc/desc), курсор действителен только с тем же order.
+"""
+import base64
+import binascii
+import json
+import os
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Response
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "200"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def page_size(limit: Optional[int]) -> int:
+    """Размер страницы: по умолчанию PAGE_SIZE_DEFAULT, не больше PAGE_SIZE_MAX"""
+    return max(1, min(limit or PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX))
+
+
+def is_descending(order: Optional[str], default: str = "asc") -> bool:
+    """order=asc|desc (пусто - default); другое значение - 400"""
+    order = (order or default).lower()
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="Invalid order: expected asc or desc")
+    return order == "desc"
+
+
+def encode_cursor(created_at, record_id: int) -> str:
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    payload = json.dumps([created_at, record_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Курсор -> (created_at ISO, id); битый курсор - 400"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, record_id = json.loads(raw)
+        datetime.fromisoformat(created_at)
+        return created_at, int(record_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_date(value: Optional[str], name: str) -> Optional[datetime]:
+    """Фильтр по дате (ISO: 2026-01-31 или 2026-01-31T12:00); неверный формат - 400"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: expected ISO date")
+
+
+def keyset_page(query, created_col, id_col, after: Optional[Tuple[str, int]], limit: int, descending: bool = False):
+    """
+    SQLAlchemy: страница строк после ключа (created_at, id) в порядке выдачи,
+    limit + 1 строк (для set_next_cursor)
+    """
+    # Локальный импорт: in-memory main.py пагинирует без SQLAlchemy
+    from sqlalchemy import and_, or_
+
+    if after is not None:
+        created_at, record_id = after
+        created_at = datetime.fromisoformat(created_at)
+        if descending:
+            query = query.filter(or_(created_col < created_at, and_(created_col == created_at, id_col < record_id)))
+        else:
+            query = query.filter(or_(created_col > created_at, and_(created_col == created_at, id_col > record_id)))
+    order = (created_col.desc(), id_col.desc()) if descending else (created_col, id_col)
+    return query.order_by(*order).limit(limit + 1)
+
+
+def set_next_cursor(response: Response, rows: list, limit: int, key) -> list:
+    """
+    rows - выборка на limit + 1 записей: лишняя запись значит, что есть
+    следующая страница; её курсор (ключ последней отданной) - в заголовок.
+    key(row) -> (created_at, id). Возвращает страницу без лишней записи.
+    """
+    if len(rows) <= limit:
+        return rows
+    page = rows[:limit]
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*key(page[-1]))
+    return page
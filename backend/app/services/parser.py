@@ -1,115 +1,140 @@
 import os
 import re
 import json
-from groq import Groq
 from pathlib import Path
 
+from app.services.cache import llm_cache, llm_cache_key, prompt_version
+from app.services.extraction_pool import extraction_pool, ExtractionError
+from app.services.llm_chunking import map_reduce_positions
+from app.services.llm_client import llm_client
+from app.services.position_engine import extract_positions
+from app.services.uploads import as_source
+
+GROQ_MODEL = "llama-3.1-70b-versatile"
+GROQ_PROMPT_TEMPLATE = """Анализируй этот текст из закупочной заявки.
+Извлеки позиции (товары/услуги) в формате JSON.
+
+ОБЯЗАТЕЛЬНО вернуть JSON:
+{{
+  "positions": [
+    {{"pos": 1, "name": "Наименование", "unit": "м", "qty": 140}}
+  ]
+}}
+
+ТЕКСТ:
+{text}
+
+ТОЛЬКО JSON, БЕЗ КОММЕНТАРИЕВ!"""
+GROQ_PROMPT_VERSION = prompt_version(GROQ_PROMPT_TEMPLATE)
+
+
+def extract_text(file_path, file_type: str) -> str:
+    """
+    Извлекает текст из документа (путь или bytes/BytesIO/memoryview).
+    Уровня модуля - выполняется в процессах extraction_pool.
+    """
+    try:
+        file_path = as_source(file_path)
+        if file_type == "docx":
+            from app.services.docx_stream import iter_docx_blocks, PARAGRAPH
+            return "\n".join([b[1] for b in iter_docx_blocks(file_path) if b[0] == PARAGRAPH])
+        
+        elif file_type == "pdf":
+            from app.services.pdf_stream import iter_pdf_pages
+            return "\n".join(iter_pdf_pages(file_path))
+        
+        elif file_type == "xlsx":
+            from app.services.xlsx_stream import xlsx_to_text, format_row_piped
+            return xlsx_to_text(file_path, format_row_piped)
+    except Exception as e:
+        print(f"Extract error: {e}")
+    
+    return ""
+
+
 class DocumentParser:
     def __init__(self):
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+        self.client = llm_client
     
-    async def parse_document_smart(self, file_path: str, file_type: str) -> dict:
-        """Парсит документ с Groq (с fallback на regex)"""
+    async def parse_document_smart(self, file_path, file_type: str) -> dict:
+        """
+        Парсит документ с Groq (с fallback на regex)
+        
+        file_path - путь или сам документ в памяти (bytes/BytesIO)
+        ExtractionError (очередь пула полна, лимиты) - пробрасывается вызывающему
+        """
+        text = ""
         try:
             # Извлеки текст
-            text = self._extract_text(file_path, file_type)
+            text = await self._extract_text(file_path, file_type)
             if not text:
                 return {"positions": [], "metadata": {"confidence": 0, "method": "error"}}
             
             # Парсь через Llama
             return await self.parse_with_groq(text)
+        except ExtractionError:
+            raise
         except Exception as e:
             print(f"Groq error: {e}, falling back to regex")
-            text = self._extract_text(file_path, file_type)
             return self._parse_with_regex(text)
     
-    async def parse_with_groq(self, text: str) -> dict:
-        """Парсинг через Groq Llama 3.1"""
-        prompt = f"""Анализируй этот текст из закупочной заявки.
-Извлеки позиции (товары/услуги) в формате JSON.
-
-ОБЯЗАТЕЛЬНО вернуть JSON:
-{{
-  "positions": [
-    {{"pos": 1, "name": "Наименование", "unit": "м", "qty": 140}}
-  ]
-}}
-
-ТЕКСТ:
-{text[:3000]}
-
-ТОЛЬКО JSON, БЕЗ КОММЕНТАРИЕВ!"""
+    async def _groq_chunk_positions(self, chunk: str) -> list:
+        """Кусок текста -> позиции (кеш в llm_cache)"""
+        llm_key = llm_cache_key(chunk, GROQ_MODEL, GROQ_PROMPT_VERSION)
+        cached = llm_cache.get(llm_key)
+        if cached:
+            return cached
         
+        response_text = await self.client.chat_completion(
+            model=GROQ_MODEL,
+            messages=[{"role": "user", "content": GROQ_PROMPT_TEMPLATE.format(text=chunk)}],
+            temperature=0.1,
+            max_tokens=2048,
+        )
+        positions = self._extract_json(response_text).get("positions") or []
+        if positions:
+            llm_cache.set(llm_key, positions)
+        return positions
+    
+    async def parse_with_groq(self, text: str) -> dict:
+        """Парсинг через Groq Llama 3.1 (длинный текст - кусками параллельно)"""
         try:
-            response = self.client.messages.create(
-                model="llama-3.1-70b-versatile",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1,
-                max_tokens=2048,
-            )
-            
-            result = self._extract_json(response.content)
-            if result.get("positions"):
-                result["metadata"] = {"confidence": 0.92, "method": "groq"}
-                return result
+            result = await map_reduce_positions(text, self._groq_chunk_positions)
+            if result["positions"] and result["truncated"]:
+                # Хвост сверх LLM_CHUNK_MAX_CHUNKS разобран regex - не полный ответ Groq
+                return {
+                    "positions": result["positions"],
+                    "metadata": {
+                        "confidence": 0.6,
+                        "method": "groq",
+                        "chunks": result["chunks"],
+                        "truncated": True,
+                        "chunks_dropped": result["chunks_dropped"],
+                    }
+                }
+            if result["positions"]:
+                return {
+                    "positions": result["positions"],
+                    "metadata": {"confidence": 0.92, "method": "groq", "chunks": result["chunks"]}
+                }
         except Exception as e:
             print(f"Groq parse error: {e}")
         
         # Fallback
         return self._parse_with_regex(text)
     
-    def _extract_text(self, file_path: str, file_type: str) -> str:
-        """Извлекает текст из документа"""
-        try:
-            if file_type == "docx":
-                from docx import Document
-                doc = Document(file_path)
-                return "\n".join([p.text for p in doc.paragraphs])
-            
-            elif file_type == "pdf":
-                import PyPDF2
-                with open(file_path, "rb") as f:
-                    reader = PyPDF2.PdfReader(f)
-                    return "\n".join([page.extract_text() or "" for page in reader.pages])
-            
-            elif file_type == "xlsx":
-                import openpyxl
-                wb = openpyxl.load_workbook(file_path)
-                text = ""
-                for sheet in wb.sheetnames:
-                    ws = wb[sheet]
-                    for row in ws.iter_rows(values_only=True):
-                        text += " | ".join([str(c) if c else "" for c in row]) + "\n"
-                return text
-        except Exception as e:
-            print(f"Extract error: {e}")
-        
-        return ""
+    async def _extract_text(self, file_path, file_type: str) -> str:
+        """Текст документа в extraction_pool (лимиты CPU/памяти/времени, event loop свободен)"""
+        if isinstance(file_path, memoryview):
+            file_path = file_path.tobytes()
+        return await extraction_pool.run(extract_text, file_path, file_type)
     
     def _parse_with_regex(self, text: str) -> dict:
-        """Fallback на regex"""
-        positions = []
-        lines = text.split("\n")
-        
-        for line in lines:
-            # С трубой: "1 | название | ед | кол"
-            match = re.match(r'^(\d+)\s*\|\s*(.*?)\s*\|\s*([а-яА-ЯмШТ]+)\s*\|\s*(\d+)', line)
-            
-            # Без трубы: "1 название м 140"
-            if not match:
-                match = re.match(r'^(\d+)\s+(.*?)\s+([а-яА-ЯмШТ]+)\s+(\d+)$', line)
-            
-            if match:
-                positions.append({
-                    "pos": int(match.group(1)),
-                    "name": match.group(2).strip(),
-                    "unit": match.group(3).strip(),
-                    "qty": int(match.group(4)),
-                })
-        
+        """Fallback на regex (position_engine)"""
+        result = extract_positions(text)
         return {
-            "positions": positions,
-            "metadata": {"confidence": 0.6, "method": "regex"}
+            "positions": result["positions"],
+            "metadata": {"confidence": 0.6, "method": "regex", "strategy": result["strategy"]}
         }
     
     def _extract_json(self, text: str) -> dict:
@@ -0,0 +1,137 @@
+"""
+PDF Stream - извлечение текста PDF по страницам, диапазоны - задачами extraction_pool
+
+Синхронные iter_pdf_pages / pdf_to_text работают в текущем процессе
+(внутри воркера пула) и своих процессов не создают - их не покрыли бы
+лимиты CPU/памяти/времени воркера.
+
+aiter_pdf_pages - для event loop: большой PDF режется на диапазоны
+страниц, каждый диапазон - отдельная задача extraction_pool.run (под
+лимитами пула и с учётом его очереди), в очереди пула одновременно не
+больше workers диапазонов документа. Текст страниц отдаётся по порядку,
+как только готов очередной диапазон - потребитель начинает с первых
+страниц, пока остальные ещё извлекаются. Результат совпадает с
+последовательным режимом.
+"""
+import asyncio
+import io
+import logging
+import os
+from collections import deque
+from typing import IO, AsyncIterator, Iterator, List, Optional, Union
+
+try:
+    from PyPDF2 import PdfReader
+except ImportError:
+    from pypdf import PdfReader
+
+from app.services.extraction_pool import extraction_pool
+
+logger = logging.getLogger(__name__)
+
+PDF_PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", "1"))  # диапазонов документа в пуле одновременно, 1 - одна задача
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_CHUNKS_PER_WORKER = 4  # мельче диапазоны - раньше первая страница, но каждая задача заново открывает файл
+
+PdfSource = Union[str, IO[bytes]]
+PooledPdfSource = Union[str, bytes]  # в задачи пула - путь или bytes (pickle)
+
+
+def _page_text(page) -> str:
+    return page.extract_text() or ""
+
+
+def iter_pdf_pages(source: PdfSource, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    """Текст страниц PDF [start, stop) по порядку, по одной"""
+    reader = PdfReader(source)
+    for page in reader.pages[start:stop]:
+        yield _page_text(page)
+
+
+def pdf_to_text(source: PdfSource, skip_empty: bool = False) -> str:
+    """Текст PDF: страница + "\\n"; skip_empty - пропускать страницы без текста"""
+    return "".join(
+        text + "\n"
+        for text in iter_pdf_pages(source)
+        if text or not skip_empty
+    )
+
+
+# ================ ЗАДАЧИ ПУЛА ================
+# Уровень модуля - чтобы передаваться в extraction_pool по ссылке
+
+def _open_pooled(source: PooledPdfSource) -> PdfSource:
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def pdf_page_count(source: PooledPdfSource) -> int:
+    return len(PdfReader(_open_pooled(source)).pages)
+
+
+def pdf_range_text(source: PooledPdfSource, start: int, stop: Optional[int]) -> List[str]:
+    """Текст страниц [start, stop) - задача для воркера extraction_pool"""
+    return list(iter_pdf_pages(_open_pooled(source), start, stop))
+
+
+def page_ranges(page_count: int, workers: int) -> List[tuple]:
+    chunks = max(1, workers * PDF_CHUNKS_PER_WORKER)
+    size = max(1, -(-page_count // chunks))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+async def aiter_pdf_pages(
+    source: PooledPdfSource,
+    workers: int = PDF_PAGE_WORKERS,
+    pool=extraction_pool,
+) -> AsyncIterator[str]:
+    """
+    Текст страниц PDF по порядку; извлечение - в pool.
+
+    По диапазонам - при workers > 1 и не меньше PDF_PARALLEL_MIN_PAGES
+    страниц; иначе весь документ одной задачей. Ошибки пула
+    (ExtractionPoolBusy, ExtractionTimeout) пробрасываются потребителю.
+    """
+    if isinstance(source, memoryview):
+        source = source.tobytes()
+
+    if workers <= 1:
+        ranges = [(0, None)]
+    else:
+        page_count = await pool.run(pdf_page_count, source)
+        if page_count < PDF_PARALLEL_MIN_PAGES:
+            ranges = [(0, page_count)]
+        else:
+            ranges = page_ranges(page_count, workers)
+            logger.info(f"[PdfStream] {page_count} pages in {len(ranges)} ranges, {workers} at a time")
+
+    remaining = iter(ranges)
+    in_flight: deque = deque()
+
+    def submit():
+        next_range = next(remaining, None)
+        if next_range is not None:
+            in_flight.append(asyncio.ensure_future(pool.run(pdf_range_text, source, *next_range)))
+
+    for _ in range(max(1, workers)):
+        submit()
+    try:
+        while in_flight:
+            pages = await in_flight.popleft()
+            submit()
+            for text in pages:
+                yield text
+    finally:
+        # Потребитель мог остановиться раньше - снимаем оставшиеся диапазоны из очереди пула
+        for task in in_flight:
+            task.cancel()
+
+
+async def apdf_to_text(source: PooledPdfSource, skip_empty: bool = False, workers: int = PDF_PAGE_WORKERS) -> str:
+    """pdf_to_text через aiter_pdf_pages"""
+    parts = []
+    async for text in aiter_pdf_pages(source, workers):
+        if text or not skip_empty:
+            parts.append(text + "\n")
+    return "".join(parts)
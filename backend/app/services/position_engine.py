@@ -0,0 +1,347 @@
+"""
+Position Engine - единый извлекатель позиций из текста
+
+Раньше у каждого входа (main, DocumentParser, parser.py, document-parser,
+routers/user) был свой набор регулярок. Здесь текст один раз режется на
+токены-строки с уже посчитанными признаками, по ним прогоняются все
+стратегии, каждый результат оценивается, и возвращается лучший - вместе
+со временем каждой стратегии.
+
+Стратегии:
+    cell_lines   - ячейка таблицы на строку (DOCX/PDF в формате main.py)
+    piped        - "1 | Название | м | 140" (DocumentParser, parser.py, XLSX)
+    spaced       - "1 Название м 140"
+    trailing_qty - "1. Название 140 м" / "1 Название 140"
+"""
+import logging
+import os
+import re
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from app.services.normalize import UNIT_PATTERN, is_unit, parse_quantity, unit_or_default
+
+logger = logging.getLogger(__name__)
+
+_NUM = r'\d[\d\s\u00a0]*(?:[.,]\d+)?'
+_QTY = rf'{_NUM}(?:\s*[-–—]\s*{_NUM})?'  # число или диапазон
+
+TABLE_HEADER_RE = re.compile(r'^№(\s*п/?п)?\.?$', re.IGNORECASE)
+POS_NUMBER_RE = re.compile(r'^(\d{1,6})\.?$')
+QTY_CELL_RE = re.compile(rf'^{_QTY}\s*[^\d\s]{{0,12}}$')
+SPACED_ROW_RE = re.compile(rf'^(\d{{1,6}})[.)]?\s+(.+?)\s+({UNIT_PATTERN})\s+({_QTY})$', re.IGNORECASE)
+TRAILING_QTY_ROW_RE = re.compile(r'^(\d{1,6})[.)\s]+(.+?)\s+(\d+(?:[.,]\d+)?)\s*([а-яА-Яa-zA-Z°%/²³.\s]+)?$')
+TOTAL_RE = re.compile(r'^(итого|всего)', re.IGNORECASE)
+NAME_PARENS_RE = re.compile(r'\s+\([^)]*\)')
+SPACES_RE = re.compile(r'\s+')
+
+DEFAULT_QTY = 1
+
+# Локальный разбор не хуже этого - LLM не зовём (см. structural_confidence)
+REGEX_CONFIDENCE_THRESHOLD = float(os.getenv("REGEX_CONFIDENCE_THRESHOLD", "80"))
+
+
+class Token(NamedTuple):
+    """Непустая строка текста с признаками, общими для всех стратегий"""
+    text: str
+    num: Optional[int]      # строка - один номер ("12", "12.")
+    is_qty: bool            # похожа на ячейку количества
+    cells: Optional[List[str]]  # непустые ячейки, если строка через "|"
+    numbered: bool          # начинается с цифры - кандидат для spaced/trailing_qty
+
+
+def tokenize(text: str) -> List[Token]:
+    """Один проход по строкам: признаки считаются один раз для всех стратегий"""
+    tokens = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        num_match = POS_NUMBER_RE.match(line)
+        cells = [c.strip() for c in line.split('|')] if '|' in line else None
+        tokens.append(Token(
+            text=line,
+            num=int(num_match.group(1)) if num_match else None,
+            is_qty=bool(QTY_CELL_RE.match(line)),
+            cells=[c for c in cells if c] if cells is not None else None,
+            numbered=line[0].isdigit(),
+        ))
+    return tokens
+
+
+# ================ ПОЗИЦИИ ================
+
+def clean_name(name_raw: str) -> str:
+    name = NAME_PARENS_RE.sub('', name_raw)
+    return SPACES_RE.sub(' ', name).strip()
+
+
+def _position(pos: int, name_raw: str, unit_raw: str, qty_raw: Optional[str]) -> Optional[Dict]:
+    name = clean_name(name_raw)
+    if not name or name.isdigit() or TOTAL_RE.match(name):
+        return None
+    return {'pos': pos, 'name': name, 'unit': unit_or_default(unit_raw), 'qty': parse_quantity(qty_raw)}
+
+
+def _cells_to_position(pos: int, cells: List[str]) -> Optional[Dict]:
+    """
+    Ячейки строки (без номера) -> позиция.
+    Якорь - ед. изм.: до неё наименование, после - кол-во; без ед. изм.
+    наименование - всё до первой числовой ячейки. Лишние ячейки (цена,
+    сумма) после кол-ва игнорируются.
+    """
+    unit_idx = next((j for j in range(1, len(cells)) if is_unit(cells[j])), None)
+
+    if unit_idx is not None:
+        name_cells = cells[:unit_idx]
+        unit_raw = cells[unit_idx]
+        qty_raw = next((c for c in cells[unit_idx + 1:] if QTY_CELL_RE.match(c)), None)
+        # Порядок "кол-во, ед. изм."
+        if qty_raw is None and unit_idx >= 2 and QTY_CELL_RE.match(cells[unit_idx - 1]):
+            qty_raw = cells[unit_idx - 1]
+            name_cells = cells[:unit_idx - 1]
+    else:
+        unit_raw = ''
+        qty_idx = next((j for j in range(1, len(cells)) if QTY_CELL_RE.match(cells[j])), None)
+        name_cells = cells[:qty_idx] if qty_idx is not None else cells
+        qty_raw = cells[qty_idx] if qty_idx is not None else None
+
+    return _position(pos, ' '.join(name_cells), unit_raw, qty_raw)
+
+
+# ================ СТРАТЕГИИ ================
+
+Row = Tuple[int, List[str]]  # (номер позиции, ячейки строки)
+
+
+def cell_tables(tokens: List[Token]) -> List[Tuple[int, List[str], List[Row]]]:
+    """
+    Таблицы "ячейка на строку" после заголовка "№" - конечный автомат, один проход.
+
+    Номер позиции - строка из одного числа; новой строкой таблицы считается
+    только следующий по порядку номер, и только если у текущей строки уже
+    есть кол-во или за номером идёт текст (иначе это число - ячейка).
+    Новая таблица - новый заголовок "№" или сброс нумерации (номер 1 после
+    строки с кол-вом, за ним текст); иначе вторая таблица целиком прилипла
+    бы к последней строке первой.
+
+    Returns:
+        [(индекс токена начала таблицы, ячейки шапки от "№" до первой строки
+        (пусто - таблица со сброса нумерации), [(номер, ячейки строки)])];
+        [] - заголовка нет
+    """
+    tables: List[Tuple[int, List[str], List[Row]]] = []
+
+    def next_is_text(i: int) -> bool:
+        return i + 1 < len(tokens) and not tokens[i + 1].is_qty
+
+    # Состояния: нет таблицы; row_num is None - ищем первую строку; иначе собираем ячейки строки row_num
+    header: Optional[List[str]] = None
+    rows: List[Row] = []
+    row_num = None
+    cells: List[str] = []
+    has_qty = False
+
+    for i, token in enumerate(tokens):
+        if TABLE_HEADER_RE.match(token.text):
+            if row_num is not None:
+                rows.append((row_num, cells))
+            header, rows, row_num = [token.text], [], None
+            tables.append((i, header, rows))
+            continue
+        if header is None:
+            continue
+
+        if token.num is not None:
+            if row_num is None:
+                if next_is_text(i):
+                    row_num, cells, has_qty = token.num, [], False
+                continue
+            if token.num == row_num + 1 and (has_qty or next_is_text(i)):
+                rows.append((row_num, cells))
+                row_num, cells, has_qty = token.num, [], False
+                continue
+            if token.num == 1 and row_num > 1 and has_qty and next_is_text(i):
+                rows.append((row_num, cells))
+                header, rows = [], []
+                tables.append((i, header, rows))
+                row_num, cells, has_qty = 1, [], False
+                continue
+
+        if row_num is not None:
+            has_qty = has_qty or (bool(cells) and token.is_qty)
+            cells.append(token.text)
+        else:
+            header.append(token.text)
+
+    if row_num is not None:
+        rows.append((row_num, cells))
+    return tables
+
+
+def strategy_cell_lines(tokens: List[Token]) -> List[Dict]:
+    """Таблицы "ячейка на строку" после заголовка "№" (строки - см. cell_tables)"""
+    positions = []
+    for _, _, rows in cell_tables(tokens):
+        for row_num, cells in rows:
+            if cells:
+                position = _cells_to_position(row_num, cells)
+                if position:
+                    positions.append(position)
+    return positions
+
+
+def strategy_piped(tokens: List[Token]) -> List[Dict]:
+    """Строки "№ | наименование | ед. изм. | кол-во [| ...]" """
+    positions = []
+    for token in tokens:
+        cells = token.cells
+        if not cells or len(cells) < 3:
+            continue
+        match = POS_NUMBER_RE.match(cells[0])
+        if not match:
+            continue
+        rest = cells[1:]
+        if len(rest) >= 3 and QTY_CELL_RE.match(rest[2]) and not QTY_CELL_RE.match(rest[1]):
+            position = _position(int(match.group(1)), rest[0], rest[1], rest[2])
+        else:
+            position = _cells_to_position(int(match.group(1)), rest)
+        if position:
+            positions.append(position)
+    return positions
+
+
+def strategy_spaced(tokens: List[Token]) -> List[Dict]:
+    """Строки "1 Название м 140" - ед. изм. из словаря перед кол-вом"""
+    positions = []
+    for token in tokens:
+        if not token.numbered or token.cells is not None:
+            continue
+        match = SPACED_ROW_RE.match(token.text)
+        if match:
+            position = _position(int(match.group(1)), match.group(2), match.group(3), match.group(4))
+            if position:
+                positions.append(position)
+    return positions
+
+
+def strategy_trailing_qty(tokens: List[Token]) -> List[Dict]:
+    """Строки "1. Название 140 м" - кол-во и необязательная ед. изм. в конце"""
+    positions = []
+    for token in tokens:
+        if not token.numbered or token.cells is not None or token.num is not None:
+            continue
+        match = TRAILING_QTY_ROW_RE.match(token.text)
+        if match:
+            position = _position(int(match.group(1)), match.group(2), match.group(4) or '', match.group(3))
+            if position:
+                positions.append(position)
+    return positions
+
+
+STRATEGIES: Dict[str, Callable[[List[Token]], List[Dict]]] = {
+    'cell_lines': strategy_cell_lines,
+    'piped': strategy_piped,
+    'spaced': strategy_spaced,
+    'trailing_qty': strategy_trailing_qty,
+}
+
+
+# ================ ВЫБОР ЛУЧШЕГО ================
+
+def quality(positions: List[Dict]) -> float:
+    """
+    Качество результата 0..1: доля позиций с кол-вом и с ед. изм. из
+    словаря, и непрерывность нумерации.
+    """
+    n = len(positions)
+    if not n:
+        return 0.0
+    qty_cov = sum(1 for p in positions if p['qty']) / n
+    unit_cov = sum(1 for p in positions if is_unit(p['unit'])) / n
+    sequence = (
+        sum(1 for a, b in zip(positions, positions[1:]) if b['pos'] == a['pos'] + 1) / (n - 1)
+        if n > 1 else 1.0
+    )
+    return 0.4 + 0.2 * qty_cov + 0.2 * unit_cov + 0.2 * sequence
+
+
+def structural_confidence(positions: List[Dict]) -> Dict:
+    """
+    Уверенность локального разбора 0..100 по структуре результата:
+    непрерывность нумерации, согласованность числа строк с диапазоном
+    номеров (нет пропусков/повторов), покрытие кол-вом и ед. изм.
+
+    Returns:
+        {"confidence": float, "sequence", "row_consistency", "qty_coverage", "unit_coverage"}
+    """
+    n = len(positions)
+    if not n:
+        return {'confidence': 0.0, 'sequence': 0.0, 'row_consistency': 0.0, 'qty_coverage': 0.0, 'unit_coverage': 0.0}
+
+    numbers = [p['pos'] for p in positions if isinstance(p.get('pos'), int)]
+    span = max(numbers) - min(numbers) + 1 if numbers else n
+    components = {
+        'sequence': (
+            sum(1 for a, b in zip(positions, positions[1:]) if b['pos'] == a['pos'] + 1) / (n - 1)
+            if n > 1 else 1.0
+        ),
+        'row_consistency': min(n, span) / max(n, span),
+        'qty_coverage': sum(1 for p in positions if p['qty']) / n,
+        'unit_coverage': sum(1 for p in positions if is_unit(p['unit'])) / n,
+    }
+    confidence = 100 * (
+        0.3 * components['sequence']
+        + 0.25 * components['row_consistency']
+        + 0.25 * components['qty_coverage']
+        + 0.2 * components['unit_coverage']
+    )
+    return {'confidence': round(confidence, 1), **{k: round(v, 3) for k, v in components.items()}}
+
+
+def extract_positions(text: str, strategies: Optional[List[str]] = None) -> Dict:
+    """
+    Прогоняет стратегии по тексту и выбирает лучший результат.
+
+    Оценка кандидата - число позиций * качество, поэтому частичное
+    совпадение "не той" стратегии не перебивает полный разбор.
+
+    Returns:
+        {"positions", "strategy", "score", "quality", "structure": structural_confidence(...),
+         "counts": {стратегия: позиций}, "timings_ms": {"tokenize": ..., стратегия: ...}}
+    """
+    started = time.perf_counter()
+    tokens = tokenize(text or '')
+    timings = {'tokenize': round((time.perf_counter() - started) * 1000, 3)}
+
+    best_name, best_positions, best_score = None, [], 0.0
+    counts = {}
+    for name in strategies or STRATEGIES:
+        started = time.perf_counter()
+        positions = STRATEGIES[name](tokens)
+        timings[name] = round((time.perf_counter() - started) * 1000, 3)
+        counts[name] = len(positions)
+
+        score = len(positions) * quality(positions)
+        if score > best_score:
+            best_name, best_positions, best_score = name, positions, score
+
+    best_quality = quality(best_positions)
+    structure = structural_confidence(best_positions)
+    for position in best_positions:
+        if position['qty'] is None:
+            position['qty'] = DEFAULT_QTY
+
+    logger.info(
+        f"[PositionEngine] {len(best_positions)} positions via {best_name or '-'} "
+        f"(counts={counts}, {sum(timings.values()):.1f} ms)"
+    )
+    return {
+        'positions': best_positions,
+        'strategy': best_name,
+        'score': round(best_score, 2),
+        'quality': round(best_quality, 3),
+        'structure': structure,
+        'counts': counts,
+        'timings_ms': timings,
+    }
@@ -0,0 +1,171 @@
+"""
+Prompt Compact - сжатие текста документа перед отправкой в LLM
+
+Текст из extract_text_from_file - ячейка на строку, с абзацами ТЗ перед
+таблицей, повторами шапки, строкой нумерации столбцов "1 2 3 4",
+колонтитулами страниц. Всё это - входные токены, за которые платим и
+которых ждём. Здесь:
+  - таблица "ячейка на строку" кодируется строками "1|Наименование|м|100"
+    (строки собирает position_engine.cell_tables, как и локальный разбор;
+    каждая таблица документа - отдельно, со своей шапкой);
+  - абзацы вне таблицы (кроме нумерованных строк) и колонтитулы выкидываются;
+  - повторы шапки, подряд идущие одинаковые ячейки и повторяющиеся
+    строки удаляются, пробелы схлопываются.
+Локальный разбор на сжатом тексте находит те же позиции, уверенность не
+ниже (проверка - benchmarks/prompt_compaction.py).
+"""
+import logging
+import os
+import re
+from typing import Dict, List
+
+from app.services.llm_chunking import estimate_tokens
+from app.services.normalize import is_unit
+from app.services.position_engine import QTY_CELL_RE, SPACES_RE, TOTAL_RE, cell_tables, tokenize
+
+logger = logging.getLogger(__name__)
+
+LLM_COMPACT_PROMPT = os.getenv("LLM_COMPACT_PROMPT", "1") == "1"
+BOILERPLATE_MIN_WORDS = int(os.getenv("BOILERPLATE_MIN_WORDS", "12"))  # абзац без цифр длиннее - не строка спецификации
+
+CELL_SEP = "|"
+
+_PAGE_MARKER_RE = re.compile(
+    r"^(?:стр(?:аница)?\.?\s*\d+(?:\s*(?:из|/)\s*\d+)?|page\s+\d+(?:\s*(?:of|/)\s*\d+)?|-+\s*\d+\s*-+)$",
+    re.IGNORECASE,
+)
+_DIGIT_RE = re.compile(r"\d")
+
+COMPACTION_STATS = {"documents": 0, "tokens_before": 0, "tokens_after": 0}
+
+
+def _clean(cell: str) -> str:
+    return SPACES_RE.sub(" ", cell.replace(CELL_SEP, "/")).strip()
+
+
+def _dedupe_adjacent(cells: List[str]) -> List[str]:
+    """Объединённые ячейки (XLSX, старые DOCX) повторяют текст в соседних"""
+    result: List[str] = []
+    for cell in cells:
+        if cell and (not result or cell != result[-1]):
+            result.append(cell)
+    return result
+
+
+def _merge_name_cells(cells: List[str]) -> List[str]:
+    """Строки наименования до первой ед. изм./кол-ва - в одну ячейку (как их склеит _cells_to_position)"""
+    k = next((j for j in range(1, len(cells)) if is_unit(cells[j]) or QTY_CELL_RE.match(cells[j])), len(cells))
+    return [" ".join(cells[:k])] + cells[k:] if k > 1 else cells
+
+
+def _is_boilerplate(line: str) -> bool:
+    if _PAGE_MARKER_RE.match(line):
+        return True
+    return not _DIGIT_RE.search(line) and len(line.split()) >= BOILERPLATE_MIN_WORDS
+
+
+def _drop_header_runs(cells: List[str], header_keys: set) -> List[str]:
+    """Повтор шапки на разрыве страницы/таблицы - 2+ подряд ячеек шапки (одна "ед." - это данные)"""
+    result: List[str] = []
+    run: List[str] = []
+    for cell in cells + [None]:
+        if cell is not None and cell.casefold() in header_keys:
+            run.append(cell)
+            continue
+        if len(run) < 2:
+            result.extend(run)
+        run = []
+        if cell is not None:
+            result.append(cell)
+    return result
+
+
+def _compact_table(header: List[str], rows: List[tuple], header_keys: set) -> List[str]:
+    """Шапка (если есть - у таблицы со сброса нумерации её нет) и строка на позицию"""
+    lines = [CELL_SEP.join(_dedupe_adjacent([_clean(c) for c in header]))] if header else []
+    for i, (num, cells) in enumerate(rows):
+        cells = [_clean(c) for c in cells]
+        if i == len(rows) - 1:
+            # "Итого", подписи и прочее после таблицы прилипают к последней строке
+            end = next((j for j, c in enumerate(cells) if TOTAL_RE.match(c)), len(cells))
+            cells = cells[:end]
+        cells = _dedupe_adjacent(_drop_header_runs(cells, header_keys))
+        lines.append(CELL_SEP.join([str(num)] + _merge_name_cells(cells)))
+    return lines
+
+
+def _compact_line(line: str) -> str:
+    if CELL_SEP not in line:
+        return _clean(line)
+    cells = _dedupe_adjacent([_clean(c) for c in line.split(CELL_SEP)])
+    return CELL_SEP.join(cells)
+
+
+def compact_prompt_text(text: str) -> Dict:
+    """
+    Сжатый текст для LLM и сколько токенов сэкономлено.
+
+    Returns:
+        {"text", "table": таблицы "ячейка на строку" перекодированы, "tables": сколько,
+         "lines_before", "lines_after", "tokens_before", "tokens_after", "reduction": 0..1}
+    """
+    tokens = tokenize(text or "")
+    tables = cell_tables(tokens)
+
+    lines: List[str] = []
+    seen = set()
+    # До шапки первой таблицы - абзацы ТЗ: оставляем только нумерованные строки (позиции списком)
+    table_start = tables[0][0] if tables else len(tokens)
+    for token in tokens[:table_start]:
+        line = _compact_line(token.text)
+        if not line or (tables and not token.numbered) or _is_boilerplate(line):
+            continue
+        # Повторяющиеся строки (шапки/колонтитулы страниц PDF); нумерованные не трогаем
+        if not token.numbered:
+            if line in seen:
+                continue
+            seen.add(line)
+        lines.append(line)
+    header_keys: set = set()
+    previous_header = None
+    for _, header, rows in tables:
+        if header:
+            header_keys = {_clean(cell).casefold() for cell in header}
+        table_lines = _compact_table(header, rows, header_keys)
+        # Та же шапка на разрыве страницы (нумерация продолжается) - второй раз не нужна
+        if header and table_lines[0] == previous_header and rows and rows[0][0] != 1:
+            table_lines = table_lines[1:]
+        elif header:
+            previous_header = table_lines[0]
+        lines.extend(table_lines)
+
+    # Ничего похожего на спецификацию - пусть LLM разбирается с исходным текстом
+    compacted = "\n".join(lines) or (text or "").strip()
+    tokens_before, tokens_after = estimate_tokens(text or ""), estimate_tokens(compacted)
+    stats = {
+        "text": compacted,
+        "table": bool(tables),
+        "tables": len(tables),
+        "lines_before": len(tokens),
+        "lines_after": len(lines),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "reduction": round(1 - tokens_after / tokens_before, 3) if tokens_before else 0.0,
+    }
+    COMPACTION_STATS["documents"] += 1
+    COMPACTION_STATS["tokens_before"] += tokens_before
+    COMPACTION_STATS["tokens_after"] += tokens_after
+    logger.info(
+        f"[PromptCompact] {tokens_before} -> {tokens_after} tokens (-{stats['reduction']:.0%}), "
+        f"{len(tokens)} -> {len(lines)} lines, table={stats['table']}"
+    )
+    return stats
+
+
+def compaction_stats() -> Dict:
+    before = COMPACTION_STATS["tokens_before"]
+    return {
+        **COMPACTION_STATS,
+        "enabled": LLM_COMPACT_PROMPT,
+        "reduction": round(1 - COMPACTION_STATS["tokens_after"] / before, 3) if before else 0.0,
+    }
@@ -0,0 +1,165 @@
+"""
+Request store - in-memory хранилище заявок со вторичными индексами
+
+Заявки - обычные dict, как раньше в requests_storage (чтение - как из
+словаря). Индексы: порядок создания и списки по статусу и по источнику
+разбора; все - отсортированные ключи (created_at, id). Очередь модератора
+и отфильтрованные списки стоят пропорционально результату, а не числу
+всех заявок.
+
+Индексируемые поля (status, parsing_source) меняются только через
+update() - запись и индексы обновляются под одной блокировкой.
+"""
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEXED_FIELDS = ("status", "parsing_source")
+
+Key = Tuple[str, int]  # (created_at ISO, id) - ISO-строки сортируются как время
+
+
+class RequestStore:
+    """Заявки по id + индексы: created (все), status, parsing_source"""
+
+    def __init__(self):
+        self._records: Dict[int, dict] = {}
+        self._created: List[Key] = []
+        self._indexes: Dict[str, Dict[Any, List[Key]]] = {field: {} for field in INDEXED_FIELDS}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def key(record: dict) -> Key:
+        return (record["created_at"], record["id"])
+
+    # ================ СЛОВАРЬ ================
+
+    def __contains__(self, request_id) -> bool:
+        return request_id in self._records
+
+    def __getitem__(self, request_id: int) -> dict:
+        return self._records[request_id]
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._records)
+
+    def get(self, request_id: int, default=None) -> Optional[dict]:
+        return self._records.get(request_id, default)
+
+    def values(self):
+        return self._records.values()
+
+    # ================ ЗАПИСЬ ================
+
+    def add(self, record: dict) -> dict:
+        key = self.key(record)
+        with self._lock:
+            if record["id"] in self._records:
+                raise KeyError(f"Request #{record['id']} already exists")
+            self._records[record["id"]] = record
+            insort(self._created, key)
+            for field in INDEXED_FIELDS:
+                insort(self._indexes[field].setdefault(record.get(field), []), key)
+        return record
+
+    def update(self, request_id: int, **fields) -> dict:
+        """Меняет поля заявки; status/parsing_source переезжают между индексами атомарно"""
+        with self._lock:
+            record = self._records[request_id]
+            key = self.key(record)
+            for field in INDEXED_FIELDS:
+                if field in fields and fields[field] != record.get(field):
+                    self._unindex(field, record.get(field), key)
+                    insort(self._indexes[field].setdefault(fields[field], []), key)
+            record.update(fields)
+        return record
+
+    def remove(self, request_id: int) -> Optional[dict]:
+        with self._lock:
+            record = self._records.pop(request_id, None)
+            if record is None:
+                return None
+            key = self.key(record)
+            del self._created[bisect_left(self._created, key)]
+            for field in INDEXED_FIELDS:
+                self._unindex(field, record.get(field), key)
+        return record
+
+    def _unindex(self, field: str, value, key: Key):
+        keys = self._indexes[field].get(value)
+        if not keys:
+            return
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+        if not keys:
+            del self._indexes[field][value]
+
+    # ================ ВЫБОРКИ ================
+
+    def query(
+        self,
+        status: Optional[str] = None,
+        source: Optional[str] = None,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None,
+        after: Optional[Key] = None,
+        limit: Optional[int] = None,
+        descending: bool = False,
+    ) -> List[dict]:
+        """
+        Заявки по фильтрам в порядке создания (descending - новые первыми).
+        Обходится самый короткий из подходящих индексов, диапазон дат и
+        курсор - бинарным поиском по нему. created_from/created_to - ISO-строки
+        (created_to - не включительно), after - ключ (created_at, id) последней
+        записи предыдущей страницы: следующие идут после него в порядке выдачи.
+        """
+        with self._lock:
+            candidates = [self._created]
+            if status is not None:
+                candidates.append(self._indexes["status"].get(status, []))
+            if source is not None:
+                candidates.append(self._indexes["parsing_source"].get(source, []))
+            keys = min(candidates, key=len)
+
+            start = bisect_left(keys, (created_from, -1)) if created_from else 0
+            end = bisect_left(keys, (created_to, -1)) if created_to else len(keys)
+            if after is not None and descending:
+                end = min(end, bisect_left(keys, tuple(after)))
+            elif after is not None:
+                start = max(start, bisect_right(keys, tuple(after)))
+
+            result = []
+            for i in (range(end - 1, start - 1, -1) if descending else range(start, end)):
+                record = self._records[keys[i][1]]
+                if status is not None and record["status"] != status:
+                    continue
+                if source is not None and record.get("parsing_source") != source:
+                    continue
+                result.append(record)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def count(self, status: Optional[str] = None, source: Optional[str] = None) -> int:
+        if status is not None and source is not None:
+            return len(self.query(status=status, source=source))
+        if status is not None:
+            return len(self._indexes["status"].get(status, []))
+        if source is not None:
+            return len(self._indexes["parsing_source"].get(source, []))
+        return len(self._records)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total": len(self._records),
+                "by_status": {k: len(v) for k, v in self._indexes["status"].items()},
+                "by_source": {k: len(v) for k, v in self._indexes["parsing_source"].items()},
+            }
@@ -0,0 +1,150 @@
+"""
+Table Rows - извлечение позиций прямо из ячеек таблиц DOCX/XLSX
+
+Вместо того чтобы склеивать таблицу в текст и потом искать структуру
+регулярками, определяем роли колонок по строке заголовка
+(№, наименование, ед. изм., кол-во) и берём позиции из ячеек.
+"""
+import logging
+import re
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+
+from app.services.docx_stream import iter_docx_blocks, ROW
+from app.services.normalize import parse_quantity, unit_or_default
+from app.services.position_engine import clean_name
+from app.services.uploads import as_source
+
+logger = logging.getLogger(__name__)
+
+ROLE_POS = "pos"
+ROLE_NAME = "name"
+ROLE_UNIT = "unit"
+ROLE_QTY = "qty"
+
+# Заголовки колонок -> роль (проверяются по порядку, первая подходящая)
+_HEADER_PATTERNS = [
+    (ROLE_POS, re.compile(r"^(№|n|no|#)\s*(п\s*/\s*п)?\.?$|^п\s*/\s*п$|^поз", re.IGNORECASE)),
+    (ROLE_QTY, re.compile(r"кол[-\s.]*во|количеств|^кол\.?$|^объ[её]м", re.IGNORECASE)),
+    (ROLE_UNIT, re.compile(r"^ед\.?(\s*изм)?|единиц", re.IGNORECASE)),
+    (ROLE_NAME, re.compile(r"наименов|номенклат|товар|описан|предмет", re.IGNORECASE)),
+]
+
+_POS_RE = re.compile(r"^\d+\.?$")
+_SPACES_RE = re.compile(r"\s+")
+_TOTAL_RE = re.compile(r"^(итого|всего)", re.IGNORECASE)
+
+TABLE_CONFIDENCE = 95
+
+Source = Union[str, bytes, IO[bytes]]  # bytes - документ в памяти (пул процессов передаёт их pickle-ом)
+
+
+def detect_roles(cells: Dict[int, str]) -> Dict[str, int]:
+    """Роли колонок по строке заголовка: {role: column}"""
+    roles: Dict[str, int] = {}
+    for col in sorted(cells):
+        header = _SPACES_RE.sub(" ", cells[col]).strip()
+        if not header:
+            continue
+        for role, pattern in _HEADER_PATTERNS:
+            if role not in roles and pattern.search(header):
+                roles[role] = col
+                break
+    return roles
+
+
+def _is_header(roles: Dict[str, int]) -> bool:
+    return ROLE_NAME in roles and (ROLE_QTY in roles or ROLE_UNIT in roles)
+
+
+def _row_to_position(cells: Dict[int, str], roles: Dict[str, int], next_pos: int) -> Optional[Dict]:
+    def cell(role: str) -> str:
+        col = roles.get(role)
+        return _SPACES_RE.sub(" ", cells.get(col, "")).strip() if col is not None else ""
+
+    # Наименование - как у текстовых стратегий position_engine (без скобок-примечаний)
+    name = clean_name(cell(ROLE_NAME))
+    # Пустое имя, строка "Итого" или строка нумерации колонок (1 | 2 | 3 | 4)
+    if not name or name.isdigit() or _TOTAL_RE.match(name):
+        return None
+
+    pos_raw = cell(ROLE_POS)
+    qty = parse_quantity(cell(ROLE_QTY)) if ROLE_QTY in roles else None
+
+    # Строка-раздел ("Материалы", объединённая на всю ширину) - без номера и количества
+    if qty is None and not _POS_RE.match(pos_raw):
+        return None
+
+    return {
+        "pos": int(pos_raw.rstrip(".")) if _POS_RE.match(pos_raw) else next_pos,
+        "name": name,
+        "unit": unit_or_default(cell(ROLE_UNIT)),
+        "qty": qty if qty is not None else 1,
+    }
+
+
+def _iter_docx_rows(source: Source) -> Iterator[Tuple[int, Dict[int, str]]]:
+    for block in iter_docx_blocks(source):
+        if block[0] == ROW:
+            _, table_index, cells = block
+            yield table_index, {c.col: c.text for c in cells if not c.continued}
+
+
+def _iter_xlsx_rows(source: Source) -> Iterator[Tuple[str, Dict[int, str]]]:
+    from app.services.xlsx_stream import iter_xlsx_rows
+
+    for sheet, row in iter_xlsx_rows(source):
+        yield sheet, {i: str(v) for i, v in enumerate(row) if v is not None}
+
+
+def iter_table_rows(source: Source, ext: str) -> Iterator[Tuple[object, Dict[int, str]]]:
+    """Строки таблиц как (ключ таблицы, {колонка: текст})"""
+    if ext == "docx":
+        return _iter_docx_rows(source)
+    if ext == "xlsx":
+        return _iter_xlsx_rows(source)
+    return iter(())
+
+
+def extract_table_positions(source: Source, ext: Optional[str] = None) -> List[Dict]:
+    """
+    Позиции из таблиц DOCX/XLSX по ролям колонок.
+
+    Возвращает [] если таблицы с заголовком (наименование + кол-во/ед.) нет -
+    тогда вызывающий код откатывается на текстовый парсинг.
+    """
+    if ext is None:
+        ext = source.lower().rsplit(".", 1)[-1] if isinstance(source, str) else ""
+    ext = ext.lower().lstrip(".")
+    source = as_source(source)
+
+    positions: List[Dict] = []
+    current_table = None
+    roles: Dict[str, int] = {}
+
+    try:
+        for table_key, cells in iter_table_rows(source, ext):
+            if table_key != current_table:
+                current_table = table_key
+                roles = {}
+
+            if not roles:
+                detected = detect_roles(cells)
+                if _is_header(detected):
+                    roles = detected
+                    logger.info(f"[TableRows] Header in table {table_key!r}: {roles}")
+                continue
+
+            position = _row_to_position(cells, roles, len(positions) + 1)
+            if position:
+                positions.append(position)
+    except Exception as e:
+        logger.error(f"[TableRows] ERROR: {e}")
+        return []
+
+    logger.info(f"[TableRows] {ext.upper()}: {len(positions)} positions from table cells")
+    return positions
+
+
+def format_positions_preview(positions: List[Dict]) -> str:
+    """Превью позиций в формате "pos | name | unit | qty" """
+    return "\n".join(f"{p['pos']} | {p['name']} | {p['unit']} | {p['qty']}" for p in positions)
@@ -0,0 +1,363 @@
+"""
+Upload store - хранилище загрузок с адресацией по содержимому
+
+Файл лежит один раз по SHA-256: <root>/ab/cd/<sha256>.<ext> (два уровня
+шардинга - каталоги не разрастаются). Заявки держат ссылки (ref) на файл:
+одинаковые документы не дублируются, оригинальное имя файла - метаданные
+ссылки. Ссылки и счётчики - в SQLite рядом с файлами.
+
+Закрытые заявки (close) отпускают файл: фоновая очистка (retention_pass)
+сжимает gzip-ом файлы без открытых ссылок и удаляет старые закрытые
+ссылки; файл без ссылок удаляется. Новая ссылка на сжатый файл
+распаковывает его обратно - у открытых заявок файл всегда на месте.
+
+Ссылки владельцев, которые живут только в памяти процесса (заявки
+main.py), после рестарта никто не закроет - на старте их закрывает
+close_prefix, иначе их файлы никогда не попадут под очистку.
+"""
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import UploadFile
+
+from app.services.uploads import (
+    save_upload, SUPPORTED_EXTENSIONS, UPLOAD_MAX_BYTES, UPLOAD_CHUNK_SIZE, remove_quietly,
+)
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_STORE_PATH = os.getenv("UPLOAD_STORE_PATH", str(Path(os.getcwd()) / "uploads" / "store"))
+UPLOAD_COMPRESS_AFTER_HOURS = float(os.getenv("UPLOAD_COMPRESS_AFTER_HOURS", "24"))  # после закрытия заявки
+UPLOAD_DELETE_AFTER_DAYS = float(os.getenv("UPLOAD_DELETE_AFTER_DAYS", "30"))  # 0 - закрытые не удаляются
+UPLOAD_RETENTION_INTERVAL = float(os.getenv("UPLOAD_RETENTION_INTERVAL", "3600"))  # секунд между проходами
+
+GZIP_SUFFIX = ".gz"
+
+
+class UploadStore:
+    """Файлы по SHA-256 со счётчиком ссылок; ref - строковый id владельца (заявки)"""
+
+    def __init__(self, root: str, name: str = "uploads"):
+        self.root = Path(root)
+        self.name = name
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            "stored": 0, "deduplicated": 0, "released": 0, "compressed": 0, "deleted": 0, "restored": 0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            (self.root / "tmp").mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.root / "store.sqlite3"), check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                " sha256 TEXT PRIMARY KEY,"
+                " ext TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " refs INTEGER NOT NULL,"
+                " open_refs INTEGER NOT NULL,"
+                " compressed INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS refs ("
+                " ref TEXT PRIMARY KEY,"
+                " sha256 TEXT NOT NULL,"
+                " filename TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " closed_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_refs_closed ON refs (closed_at)")
+            self._conn = conn
+            logger.info(f"[Store:{self.name}] Opened {self.root}")
+        return self._conn
+
+    # ================ ПУТИ ================
+
+    def blob_path(self, sha256: str, ext: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}.{ext}"
+
+    def tmp_path(self, ext: str) -> Path:
+        """Куда писать загрузку до того, как известен её хеш"""
+        self._connect()
+        fd, path = tempfile.mkstemp(suffix=f".{ext}", dir=self.root / "tmp")
+        os.close(fd)
+        return Path(path)
+
+    # ================ ССЫЛКИ ================
+
+    def add_file(self, tmp_path: Path, sha256: str, ext: str, size: int, filename: str, ref: str) -> Dict:
+        """
+        Забирает готовый файл (tmp_path) в хранилище под ссылкой ref
+        (синхронно - вызывать в потоке). Такой файл уже есть - tmp_path
+        удаляется, растёт счётчик ссылок.
+
+        Returns:
+            {"path", "sha256", "size", "ext", "filename", "ref", "deduplicated"}
+        """
+        path = self.blob_path(sha256, ext)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT compressed FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            now = time.time()
+            if row is not None and (path.exists() or row[0]):
+                remove_quietly(tmp_path)
+                if row[0]:
+                    self._decompress(path)
+                conn.execute(
+                    "UPDATE blobs SET refs = refs + 1, open_refs = open_refs + 1, compressed = 0 WHERE sha256 = ?",
+                    (sha256,),
+                )
+                self.stats["deduplicated"] += 1
+                deduplicated = True
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, path)
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO blobs (sha256, ext, size, refs, open_refs, compressed, created_at)"
+                        " VALUES (?, ?, ?, 1, 1, 0, ?)",
+                        (sha256, ext, size, now),
+                    )
+                else:
+                    # Запись есть, а файл пропал с диска: файл вернули, счётчики других владельцев не трогаем
+                    logger.warning(f"[Store:{self.name}] {sha256[:12]}.{ext} was missing on disk, rewritten")
+                    conn.execute(
+                        "UPDATE blobs SET refs = refs + 1, open_refs = open_refs + 1, compressed = 0 WHERE sha256 = ?",
+                        (sha256,),
+                    )
+                self.stats["stored"] += 1
+                deduplicated = False
+            conn.execute(
+                "INSERT INTO refs (ref, sha256, filename, created_at) VALUES (?, ?, ?, ?)",
+                (ref, sha256, filename, now),
+            )
+
+        logger.info(
+            f"[Store:{self.name}] {ref} -> {sha256[:12]}.{ext} ({filename}, {size} bytes"
+            f"{', deduplicated' if deduplicated else ''})"
+        )
+        return {
+            "path": str(path), "sha256": sha256, "size": size, "ext": ext,
+            "filename": filename, "ref": ref, "deduplicated": deduplicated,
+        }
+
+    def add_bytes(self, data: bytes, sha256: str, ext: str, filename: str, ref: str) -> Dict:
+        """То же для загрузки, уже прочитанной в память (синхронно)"""
+        tmp_path = self.tmp_path(ext)
+        try:
+            tmp_path.write_bytes(data)
+        except BaseException:
+            remove_quietly(tmp_path)
+            raise
+        return self.add_file(tmp_path, sha256, ext, len(data), filename, ref)
+
+    def get(self, ref: str) -> Optional[Dict]:
+        """Метаданные ссылки: путь, оригинальное имя, хеш, сжат ли файл"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT r.sha256, r.filename, r.created_at, r.closed_at, b.ext, b.size, b.compressed"
+                " FROM refs r JOIN blobs b ON b.sha256 = r.sha256 WHERE r.ref = ?",
+                (ref,),
+            ).fetchone()
+        if row is None:
+            return None
+        sha256, filename, created_at, closed_at, ext, size, compressed = row
+        return {
+            "ref": ref, "path": str(self.blob_path(sha256, ext)), "sha256": sha256, "filename": filename,
+            "ext": ext, "size": size, "compressed": bool(compressed),
+            "created_at": created_at, "closed_at": closed_at,
+        }
+
+    def close(self, ref: str):
+        """Заявка закрыта - файл ей больше не нужен открытым (очистка может его сжать)"""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT sha256 FROM refs WHERE ref = ? AND closed_at IS NULL", (ref,)).fetchone()
+            if row is None:
+                return
+            conn.execute("UPDATE refs SET closed_at = ? WHERE ref = ?", (time.time(), ref))
+            conn.execute("UPDATE blobs SET open_refs = open_refs - 1 WHERE sha256 = ?", (row[0],))
+
+    def close_prefix(self, prefix: str) -> int:
+        """
+        Закрывает все открытые ссылки, начинающиеся с prefix - владельцы
+        в памяти не пережили рестарт. Дальше файлы чистит retention_pass.
+        """
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT ref, sha256 FROM refs WHERE closed_at IS NULL AND substr(ref, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+            now = time.time()
+            for ref, sha256 in rows:
+                conn.execute("UPDATE refs SET closed_at = ? WHERE ref = ?", (now, ref))
+                conn.execute("UPDATE blobs SET open_refs = open_refs - 1 WHERE sha256 = ?", (sha256,))
+        if rows:
+            logger.info(f"[Store:{self.name}] Closed {len(rows)} orphaned '{prefix}' refs")
+        return len(rows)
+
+    def release(self, ref: str):
+        """Убирает ссылку; последняя ссылка - файл удаляется"""
+        with self._lock:
+            self._release(self._connect(), ref)
+
+    def _release(self, conn: sqlite3.Connection, ref: str):
+        row = conn.execute("SELECT sha256, closed_at FROM refs WHERE ref = ?", (ref,)).fetchone()
+        if row is None:
+            return
+        sha256, closed_at = row
+        conn.execute("DELETE FROM refs WHERE ref = ?", (ref,))
+        conn.execute(
+            "UPDATE blobs SET refs = refs - 1, open_refs = open_refs - ? WHERE sha256 = ?",
+            (0 if closed_at else 1, sha256),
+        )
+        self.stats["released"] += 1
+        blob = conn.execute("SELECT ext, refs, compressed FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        if blob is not None and blob[1] <= 0:
+            path = self.blob_path(sha256, blob[0])
+            remove_quietly(Path(str(path) + GZIP_SUFFIX) if blob[2] else path)
+            conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            self.stats["deleted"] += 1
+
+    # ================ ОЧИСТКА ================
+
+    def _decompress(self, path: Path):
+        gz_path = Path(str(path) + GZIP_SUFFIX)
+        tmp = Path(str(path) + ".part")
+        with gzip.open(gz_path, "rb") as src, open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst, UPLOAD_CHUNK_SIZE)
+        os.replace(tmp, path)
+        remove_quietly(gz_path)
+        self.stats["restored"] += 1
+
+    def _compress(self, sha256: str, ext: str) -> bool:
+        """Сжатие - вне блокировки; подмена файла - под ней, если открытых ссылок так и не появилось"""
+        path = self.blob_path(sha256, ext)
+        gz_path = Path(str(path) + GZIP_SUFFIX)
+        tmp = Path(str(gz_path) + ".part")
+        try:
+            with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst, UPLOAD_CHUNK_SIZE)
+        except OSError as e:
+            logger.warning(f"[Store:{self.name}] Compress {sha256[:12]} failed: {e}")
+            remove_quietly(tmp)
+            return False
+
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT open_refs, compressed FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is None or row[0] > 0 or row[1]:
+                remove_quietly(tmp)
+                return False
+            os.replace(tmp, gz_path)
+            remove_quietly(path)
+            conn.execute("UPDATE blobs SET compressed = 1 WHERE sha256 = ?", (sha256,))
+            self.stats["compressed"] += 1
+        return True
+
+    def retention_pass(
+        self,
+        compress_after: float = UPLOAD_COMPRESS_AFTER_HOURS * 3600,
+        delete_after: float = UPLOAD_DELETE_AFTER_DAYS * 86400,
+    ) -> Dict[str, int]:
+        """
+        Один проход очистки (синхронно - вызывать в потоке): закрытые
+        ссылки старше delete_after удаляются (0 - никогда), файлы без
+        открытых ссылок, закрытые дольше compress_after, сжимаются.
+        """
+        now = time.time()
+        released = compressed = 0
+
+        if delete_after:
+            with self._lock:
+                conn = self._connect()
+                refs = [row[0] for row in conn.execute(
+                    "SELECT ref FROM refs WHERE closed_at IS NOT NULL AND closed_at < ?", (now - delete_after,)
+                )]
+                for ref in refs:
+                    self._release(conn, ref)
+                released = len(refs)
+
+        with self._lock:
+            candidates = self._connect().execute(
+                "SELECT b.sha256, b.ext FROM blobs b"
+                " WHERE b.open_refs <= 0 AND b.compressed = 0 AND b.refs > 0"
+                " AND (SELECT MAX(r.closed_at) FROM refs r WHERE r.sha256 = b.sha256) < ?",
+                (now - compress_after,),
+            ).fetchall()
+        for sha256, ext in candidates:
+            compressed += self._compress(sha256, ext)
+
+        if released or compressed:
+            logger.info(f"[Store:{self.name}] Retention: {released} refs released, {compressed} files compressed")
+        return {"released": released, "compressed": compressed}
+
+    def close_db(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connect()
+            blobs, stored_bytes, compressed = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(compressed), 0) FROM blobs"
+            ).fetchone()
+            refs, referenced_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(b.size), 0) FROM refs r JOIN blobs b ON b.sha256 = r.sha256"
+            ).fetchone()
+        return {
+            **self.stats,
+            "blobs": blobs,
+            "refs": refs,
+            "compressed_blobs": compressed,
+            "bytes": stored_bytes,
+            "bytes_saved_by_dedup": referenced_bytes - stored_bytes,
+        }
+
+
+async def store_upload(
+    store: UploadStore,
+    file: UploadFile,
+    ref: str,
+    allowed: Iterable[str] = SUPPORTED_EXTENSIONS,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+) -> Dict:
+    """Загрузка кусками во временный файл (save_upload) и в хранилище под ссылкой ref"""
+    tmp_path = await asyncio.to_thread(store.tmp_path, (file.filename or "").rsplit(".", 1)[-1].lower() or "bin")
+    try:
+        saved = await save_upload(file, tmp_path, allowed=allowed, max_bytes=max_bytes)
+    except BaseException:
+        await asyncio.to_thread(remove_quietly, tmp_path)
+        raise
+    return await asyncio.to_thread(
+        store.add_file, tmp_path, saved["sha256"], saved["ext"], saved["size"], file.filename or "", ref
+    )
+
+
+async def retention_loop(store: UploadStore, interval: float = UPLOAD_RETENTION_INTERVAL):
+    """Фоновая очистка хранилища раз в interval секунд (запускается на startup)"""
+    while True:
+        try:
+            await asyncio.to_thread(store.retention_pass)
+        except Exception as e:
+            logger.error(f"[Store:{store.name}] Retention failed: {e}")
+        await asyncio.sleep(interval)
+
+
+upload_store = UploadStore(UPLOAD_STORE_PATH)
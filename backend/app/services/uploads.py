@@ -0,0 +1,355 @@
+"""
+Uploads - приём загружаемых файлов кусками
+
+Файл читается фиксированными кусками, пишется на диск в потоке (не в
+event loop), SHA-256 и размер считаются на лету. Неподдерживаемые и
+слишком большие файлы отбиваются как можно раньше: по Content-Length,
+по UploadFile.size и по сигнатуре (magic bytes) первого куска.
+ZIP-архивы (пакетная загрузка) раскладываются по файлам так же кусками,
+с защитой от zip-бомб.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import zipfile
+from zlib import error as zlib_error
+from pathlib import Path, PurePosixPath
+from typing import IO, Dict, Iterable, List, Optional, Tuple, Union
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "50"))
+UPLOAD_MAX_BYTES = UPLOAD_MAX_MB * 1024 * 1024
+MULTIPART_OVERHEAD = 64 * 1024  # заголовки multipart поверх самого файла
+INMEMORY_PARSE_MAX_MB = int(os.getenv("INMEMORY_PARSE_MAX_MB", "16"))  # больше - через временный файл
+
+SUPPORTED_EXTENSIONS = ("pdf", "docx", "xlsx", "txt")
+
+# ZIP: распакованный объём считаем по факту, а не по заголовкам архива
+ZIP_MAX_ENTRIES = int(os.getenv("ZIP_MAX_ENTRIES", "100"))
+ZIP_MAX_TOTAL_MB = int(os.getenv("ZIP_MAX_TOTAL_MB", "500"))
+ZIP_MAX_RATIO = int(os.getenv("ZIP_MAX_RATIO", "100"))  # сжатие сильнее - подозрение на бомбу
+
+# Сигнатуры форматов: DOCX/XLSX - zip-контейнеры
+_MAGIC = {
+    "pdf": (b"%PDF-",),
+    "docx": (b"PK\x03\x04",),
+    "xlsx": (b"PK\x03\x04",),
+    "zip": (b"PK\x03\x04", b"PK\x05\x06"),
+}
+
+
+class UploadRejected(Exception):
+    """Файл отклонён до сохранения; status_code - для HTTPException"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class _ZipBudgetExceeded(UploadRejected):
+    """Общий распакованный объём архива превышен - отклоняется весь архив"""
+
+
+def file_extension(filename: Optional[str]) -> str:
+    return (filename or "").rsplit(".", 1)[-1].lower() if "." in (filename or "") else ""
+
+
+def declared_size_exceeded(content_length: Optional[str], max_bytes: int = UPLOAD_MAX_BYTES) -> bool:
+    """Content-Length запроса больше лимита - можно отказать, не читая тело"""
+    try:
+        return content_length is not None and int(content_length) > max_bytes + MULTIPART_OVERHEAD
+    except ValueError:
+        return False
+
+
+def sniff_matches(head: bytes, ext: str) -> bool:
+    """Первые байты файла соответствуют заявленному расширению"""
+    if ext == "txt":
+        return b"\x00" not in head
+    signatures = _MAGIC.get(ext)
+    return bool(signatures) and any(head.startswith(sig) for sig in signatures)
+
+
+def _check_upload(file: UploadFile, allowed: Iterable[str], max_bytes: int) -> str:
+    ext = file_extension(file.filename)
+    if ext not in allowed:
+        raise UploadRejected(415, f"Unsupported file type: .{ext or '?'} (allowed: {', '.join(allowed)})")
+    declared = getattr(file, "size", None)
+    if declared is not None and declared > max_bytes:
+        raise UploadRejected(413, f"File is larger than {_mb(max_bytes)} MB")
+    return ext
+
+
+async def _iter_chunks(file: UploadFile, ext: str, max_bytes: int, chunk_size: int):
+    """Куски файла с проверкой сигнатуры первого куска и лимита размера"""
+    size = 0
+    first = True
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            if first:
+                raise UploadRejected(400, "Empty file")
+            return
+        if first:
+            if not sniff_matches(chunk[:8], ext):
+                raise UploadRejected(415, f"File content does not look like .{ext}")
+            first = False
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadRejected(413, f"File is larger than {_mb(max_bytes)} MB")
+        yield chunk
+
+
+async def save_upload(
+    file: UploadFile,
+    dest_path: Path,
+    allowed: Iterable[str] = SUPPORTED_EXTENSIONS,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> Dict:
+    """
+    Сохраняет загрузку на диск кусками.
+
+    Returns:
+        {"path": str, "size": int, "sha256": str, "ext": str}
+    """
+    allowed = tuple(allowed)
+    ext = _check_upload(file, allowed, max_bytes)
+    digest = hashlib.sha256()
+    size = 0
+
+    f = await asyncio.to_thread(open, dest_path, "wb")
+    try:
+        async for chunk in _iter_chunks(file, ext, max_bytes, chunk_size):
+            digest.update(chunk)
+            size += len(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(remove_quietly, dest_path)
+        raise
+    await asyncio.to_thread(f.close)
+
+    logger.info(f"[Uploads] Saved {dest_path} ({size} bytes, sha256={digest.hexdigest()[:12]})")
+    return {"path": str(dest_path), "size": size, "sha256": digest.hexdigest(), "ext": ext}
+
+
+async def read_upload(
+    file: UploadFile,
+    allowed: Iterable[str] = SUPPORTED_EXTENSIONS,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> Tuple[bytes, str]:
+    """Читает загрузку в память кусками с теми же проверками; возвращает (данные, sha256)"""
+    allowed = tuple(allowed)
+    ext = _check_upload(file, allowed, max_bytes)
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    async for chunk in _iter_chunks(file, ext, max_bytes, chunk_size):
+        digest.update(chunk)
+        buffer += chunk
+    return bytes(buffer), digest.hexdigest()
+
+
+async def receive_upload(
+    file: UploadFile,
+    allowed: Iterable[str] = SUPPORTED_EXTENSIONS,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    memory_budget: int = INMEMORY_PARSE_MAX_MB * 1024 * 1024,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> Dict:
+    """
+    Принимает загрузку для разбора: в память (BytesIO), а если файл больше
+    memory_budget - дописывает во временный файл, который удаляет вызывающий.
+
+    Returns:
+        {"stream": BytesIO | None, "path": str | None, "size": int, "sha256": str, "ext": str}
+    """
+    allowed = tuple(allowed)
+    ext = _check_upload(file, allowed, max_bytes)
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    spill = None
+    size = 0
+
+    try:
+        async for chunk in _iter_chunks(file, ext, max_bytes, chunk_size):
+            digest.update(chunk)
+            size += len(chunk)
+            if spill is None and size > memory_budget:
+                spill = await asyncio.to_thread(tempfile.NamedTemporaryFile, suffix=f".{ext}", delete=False)
+                await asyncio.to_thread(spill.write, buffer.getbuffer())
+                buffer = None
+                logger.info(f"[Uploads] Over in-memory budget, spilling to {spill.name}")
+            if spill is None:
+                buffer.write(chunk)
+            else:
+                await asyncio.to_thread(spill.write, chunk)
+    except BaseException:
+        if spill is not None:
+            await asyncio.to_thread(spill.close)
+            await asyncio.to_thread(remove_quietly, Path(spill.name))
+        raise
+
+    if spill is not None:
+        await asyncio.to_thread(spill.close)
+        return {"stream": None, "path": spill.name, "size": size, "sha256": digest.hexdigest(), "ext": ext}
+
+    buffer.seek(0)
+    return {"stream": buffer, "path": None, "size": size, "sha256": digest.hexdigest(), "ext": ext}
+
+
+# ================ ZIP ================
+
+def _zip_entry_name(info: zipfile.ZipInfo) -> Optional[str]:
+    """Имя файла без каталогов (никаких ../ при записи); None - служебная запись"""
+    name = PurePosixPath(info.filename.replace("\\", "/")).name
+    if info.is_dir() or not name or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+        return None
+    return name
+
+
+def _copy_zip_entry(zf: zipfile.ZipFile, info: zipfile.ZipInfo, ext: str, dest_path: Path,
+                    max_bytes: int, budget: int, chunk_size: int) -> Dict:
+    """Одна запись архива на диск кусками; UploadRejected - запись отклонена, файл не остаётся"""
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with zf.open(info) as src, open(dest_path, "wb") as dst:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                if size == 0 and not sniff_matches(chunk[:8], ext):
+                    raise UploadRejected(415, f"File content does not look like .{ext}")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(413, f"File is larger than {_mb(max_bytes)} MB")
+                if size > budget:
+                    raise _ZipBudgetExceeded(413, "Archive is larger than allowed when unpacked")
+                digest.update(chunk)
+                dst.write(chunk)
+        if size == 0:
+            raise UploadRejected(400, "Empty file")
+    except BaseException:
+        remove_quietly(dest_path)
+        raise
+    return {"path": str(dest_path), "size": size, "sha256": digest.hexdigest(), "ext": ext}
+
+
+def extract_zip_entries(
+    zip_path: Union[str, Path],
+    dest_dir: Union[str, Path],
+    prefix: str = "",
+    allowed: Iterable[str] = SUPPORTED_EXTENSIONS,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    max_entries: int = ZIP_MAX_ENTRIES,
+    max_total_bytes: int = ZIP_MAX_TOTAL_MB * 1024 * 1024,
+    max_ratio: int = ZIP_MAX_RATIO,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> List[Dict]:
+    """
+    Раскладывает файлы из ZIP в dest_dir кусками (синхронно - вызывать в потоке).
+
+    Защита от zip-бомб: число записей, степень сжатия записи, размер
+    записи и общий распакованный объём - по фактически прочитанным байтам.
+    Вложенные каталоги отбрасываются, неподдерживаемые/зашифрованные
+    записи отклоняются по одной.
+
+    Returns:
+        [{"filename", "path", "size", "sha256", "ext"} | {"filename", "error", "status_code"}]
+    Raises:
+        UploadRejected - архив отклонён целиком (битый, слишком много записей,
+        превышен общий объём); уже разложенные файлы удаляются
+    """
+    allowed = tuple(allowed)
+    dest_dir = Path(dest_dir)
+    results: List[Dict] = []
+    total = 0
+
+    try:
+        zf = zipfile.ZipFile(zip_path)
+    except (zipfile.BadZipFile, OSError):
+        raise UploadRejected(400, "Corrupted ZIP archive")
+
+    with zf:
+        entries = [(info, name) for info in zf.infolist() if (name := _zip_entry_name(info))]
+        if len(entries) > max_entries:
+            raise UploadRejected(413, f"Archive has {len(entries)} files, at most {max_entries} allowed")
+
+        try:
+            for i, (info, name) in enumerate(entries):
+                ext = file_extension(name)
+                rejected = None
+                if ext not in allowed:
+                    rejected = UploadRejected(415, f"Unsupported file type: .{ext or '?'}")
+                elif info.flag_bits & 0x1:
+                    rejected = UploadRejected(415, "Encrypted archive entry")
+                elif info.file_size > max_bytes:
+                    rejected = UploadRejected(413, f"File is larger than {_mb(max_bytes)} MB")
+                elif info.compress_size and info.file_size / info.compress_size > max_ratio:
+                    rejected = UploadRejected(413, "Suspicious compression ratio")
+                if rejected is not None:
+                    results.append({"filename": name, "error": rejected.detail, "status_code": rejected.status_code})
+                    continue
+
+                dest_path = dest_dir / f"{prefix}{i}_{name}"
+                try:
+                    saved = _copy_zip_entry(zf, info, ext, dest_path, max_bytes, max_total_bytes - total, chunk_size)
+                except _ZipBudgetExceeded:
+                    raise
+                except UploadRejected as e:
+                    results.append({"filename": name, "error": e.detail, "status_code": e.status_code})
+                    continue
+                except (zipfile.BadZipFile, zlib_error, EOFError) as e:
+                    results.append({"filename": name, "error": f"Corrupted archive entry: {e}", "status_code": 400})
+                    continue
+                total += saved["size"]
+                results.append({"filename": name, **saved})
+        except BaseException:
+            for entry in results:
+                if "path" in entry:
+                    remove_quietly(Path(entry["path"]))
+            raise
+
+    logger.info(
+        f"[Uploads] ZIP {zip_path}: {sum(1 for r in results if 'path' in r)} files "
+        f"({total} bytes unpacked), {sum(1 for r in results if 'error' in r)} rejected"
+    )
+    return results
+
+
+def as_source(source: Union[str, bytes, bytearray, memoryview, IO[bytes]]) -> Union[str, IO[bytes]]:
+    """
+    Приводит вход парсера к пути или бинарному потоку.
+
+    bytes оборачиваются в BytesIO без копирования (буфер разделяется до
+    первой записи); bytearray/memoryview копируются один раз - zip и PDF
+    читаются с seek. Поток перематывается в начало.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return str(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+
+def _mb(size: int) -> str:
+    return f"{size / (1024 * 1024):g}"
+
+
+def remove_quietly(path: Path):
+    """Удаляет файл; нет файла / ошибка ФС - молча (уборка временных файлов)"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,178 @@
+"""
+XLSX Stream - потоковое чтение XLSX в режиме read-only
+
+openpyxl в обычном режиме создаёт объект на каждую ячейку всей книги; в
+read-only режиме строки читаются из XML по одной, и пиковая память не
+растёт с размером книги. Текст собираем через join.
+
+Синхронные функции работают в текущем процессе (внутри воркера
+extraction_pool) и своих процессов не создают - их не покрыли бы лимиты
+воркера. axlsx_to_text - для event loop: каждый лист - отдельная задача
+extraction_pool.run, в очереди пула одновременно не больше workers листов
+книги; листы склеиваются в исходном порядке, текст совпадает с xlsx_to_text.
+"""
+import asyncio
+import io
+import logging
+import os
+from typing import IO, Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import openpyxl
+
+from app.services.extraction_pool import extraction_pool
+
+logger = logging.getLogger(__name__)
+
+XLSX_MAX_ROWS = int(os.getenv("XLSX_MAX_ROWS", "0"))  # строк на лист, 0 - без лимита
+XLSX_SHEET_WORKERS = int(os.getenv("XLSX_SHEET_WORKERS", "1"))  # листов книги в пуле одновременно, 1 - одна задача
+
+XlsxSource = Union[str, IO[bytes]]
+PooledXlsxSource = Union[str, bytes]  # в задачи пула - путь или bytes (pickle)
+RowFormatter = Callable[[Sequence], Optional[str]]
+
+
+# ================ ФОРМАТЫ СТРОК ================
+# Уровень модуля - чтобы передаваться в extraction_pool по ссылке
+
+def format_row_compact(row: Sequence) -> Optional[str]:
+    """Только непустые ячейки через пробел, пустая строка пропускается (main.py)"""
+    row_text = " ".join([str(cell).strip() for cell in row if cell])
+    return row_text if row_text.strip() else None
+
+
+def format_row_spaced(row: Sequence) -> Optional[str]:
+    """Все ячейки через пробел (DocumentParser)"""
+    return " ".join([str(cell) if cell else "" for cell in row])
+
+
+def format_row_piped(row: Sequence) -> Optional[str]:
+    """Все ячейки через " | " (services/parser.py)"""
+    return " | ".join([str(cell) if cell else "" for cell in row])
+
+
+# ================ ЧТЕНИЕ ================
+
+def _open(source: XlsxSource):
+    return openpyxl.load_workbook(source, read_only=True, data_only=True)
+
+
+def _sheet_names(wb, active_only: bool) -> List[str]:
+    if active_only:
+        return [wb.active.title]
+    return list(wb.sheetnames)
+
+
+def _iter_sheet(ws, max_rows: int) -> Iterator[tuple]:
+    for i, row in enumerate(ws.iter_rows(values_only=True)):
+        if max_rows and i >= max_rows:
+            logger.warning(f"[XlsxStream] Sheet '{ws.title}': row cap {max_rows} reached, rest skipped")
+            break
+        yield row
+
+
+def iter_xlsx_rows(
+    source: XlsxSource,
+    max_rows: int = XLSX_MAX_ROWS,
+    active_only: bool = False,
+) -> Iterator[Tuple[str, tuple]]:
+    """Строки всех листов как (имя листа, значения ячеек)"""
+    wb = _open(source)
+    try:
+        for name in _sheet_names(wb, active_only):
+            for row in _iter_sheet(wb[name], max_rows):
+                yield name, row
+    finally:
+        wb.close()
+
+
+def _sheet_lines(wb, name: str, formatter: RowFormatter, max_rows: int) -> List[str]:
+    lines = []
+    for row in _iter_sheet(wb[name], max_rows):
+        line = formatter(row)
+        if line is not None:
+            lines.append(line)
+    return lines
+
+
+def xlsx_to_text(
+    source: XlsxSource,
+    formatter: RowFormatter = format_row_spaced,
+    max_rows: int = XLSX_MAX_ROWS,
+    active_only: bool = False,
+) -> str:
+    """Текст книги: строка на строку листа, "\\n" после каждой"""
+    wb = _open(source)
+    try:
+        names = _sheet_names(wb, active_only)
+        parts = []
+        for name in names:
+            parts.extend(line + "\n" for line in _sheet_lines(wb, name, formatter, max_rows))
+    finally:
+        wb.close()
+    text = "".join(parts)
+    logger.info(f"[XlsxStream] {len(names)} sheets, {len(text)} chars")
+    return text
+
+
+# ================ ЗАДАЧИ ПУЛА ================
+# Уровень модуля - чтобы передаваться в extraction_pool по ссылке
+
+def _open_pooled(source: PooledXlsxSource) -> XlsxSource:
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def xlsx_sheet_names(source: PooledXlsxSource, active_only: bool = False) -> List[str]:
+    wb = _open(_open_pooled(source))
+    try:
+        return _sheet_names(wb, active_only)
+    finally:
+        wb.close()
+
+
+def xlsx_sheet_text(source: PooledXlsxSource, name: str, formatter: RowFormatter, max_rows: int) -> str:
+    """Текст одного листа - задача для воркера extraction_pool"""
+    wb = _open(_open_pooled(source))
+    try:
+        return "".join(line + "\n" for line in _sheet_lines(wb, name, formatter, max_rows))
+    finally:
+        wb.close()
+
+
+async def axlsx_to_text(
+    source: PooledXlsxSource,
+    formatter: RowFormatter = format_row_spaced,
+    max_rows: int = XLSX_MAX_ROWS,
+    active_only: bool = False,
+    workers: int = XLSX_SHEET_WORKERS,
+    pool=extraction_pool,
+) -> str:
+    """
+    xlsx_to_text в pool: по листам - при workers > 1 и больше одного
+    листа, иначе вся книга одной задачей. Ошибки пула (ExtractionPoolBusy,
+    ExtractionTimeout) пробрасываются вызывающему.
+    """
+    if isinstance(source, memoryview):
+        source = source.tobytes()
+
+    if workers <= 1:
+        return await pool.run(xlsx_to_text, source, formatter, max_rows, active_only)
+    names = await pool.run(xlsx_sheet_names, source, active_only)
+    if len(names) < 2:
+        return await pool.run(xlsx_to_text, source, formatter, max_rows, active_only)
+    logger.info(f"[XlsxStream] {len(names)} sheets as pool jobs, {workers} at a time")
+
+    slots = asyncio.Semaphore(workers)
+
+    async def sheet(name: str) -> str:
+        async with slots:
+            return await pool.run(xlsx_sheet_text, source, name, formatter, max_rows)
+
+    tasks = [asyncio.ensure_future(sheet(name)) for name in names]
+    try:
+        return "".join(await asyncio.gather(*tasks))
+    finally:
+        # Ошибка одного листа - снимаем остальные из очереди пула
+        for task in tasks:
+            task.cancel()
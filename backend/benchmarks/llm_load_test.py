@@ -0,0 +1,121 @@
+"""
+Нагрузочный прогон LLM-разбора против тестового сервера (benchmarks/mock_llm_server.py)
+
+Гоняет parse_text_with_groq (main) или DocumentParser._parse_with_groq с
+заданной параллельностью на уникальных синтетических документах (llm_cache
+не срабатывает) и печатает пропускную способность, перцентили задержки,
+доли источников результата (groq / groq_partial / фоллбэк), состояние
+предохранителя llm_guard и исходы на стороне сервера.
+
+Сценарий сервера можно поменять перед прогоном: --scenario p429=0.2 latency_ms=1500
+Лимиты самого клиента - переменные окружения llm_guard (LLM_RATE_PER_SEC,
+LLM_BREAKER_FAILURES, ...) и llm_client (LLM_MAX_CONNECTIONS, LLM_TIMEOUT).
+
+Запуск (из backend/, сервер уже поднят):
+    python -m benchmarks.mock_llm_server --port 8100 &
+    python -m benchmarks.llm_load_test --requests 200 --concurrency 20 --scenario p429=0.1 p_timeout=0.02
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _scenario(pairs):
+    updates = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition("=")
+        updates[key] = float(value) if key != "distribution" else value
+    return updates
+
+
+async def run(args):
+    import httpx
+
+    from app.main import parse_text_with_groq
+    from app.services.document_parser import DocumentParser
+    from app.services.llm_client import llm_client
+    from app.services.llm_guard import llm_guard
+    from benchmarks.parse_text_regex import build_spec
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=10) as mock:
+        await mock.post("/mock/reset")
+        if args.scenario:
+            await mock.post("/mock/config", json=_scenario(args.scenario))
+
+    llm_client.start()
+    parser = DocumentParser() if args.target == "document_parser" else None
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, sources = [], {}
+
+    async def one(i: int):
+        text = build_spec(args.positions, seed=args.seed + i)
+        async with semaphore:
+            started = time.perf_counter()
+            if parser is None:
+                result = await parse_text_with_groq(text)
+                source = result.get("source", "unknown")
+            else:
+                result = await parser._parse_with_groq(text)
+                source = result["metadata"].get("method") if result["positions"] else "fallback"
+            latencies.append((time.perf_counter() - started) * 1000)
+        sources[source] = sources.get(source, 0) + 1
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+    wall = time.perf_counter() - started
+    await llm_client.close()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=10) as mock:
+        server = (await mock.get("/mock/stats")).json()
+
+    llm_sources = sum(n for s, n in sources.items() if s.startswith("groq"))
+    print(f"target:      {args.target} ({args.requests} requests x {args.positions} positions, concurrency {args.concurrency})")
+    print(f"wall:        {wall:.2f}s, {args.requests / wall:.1f} req/s")
+    print(
+        f"latency ms:  p50={_percentile(latencies, 0.5):.0f} p95={_percentile(latencies, 0.95):.0f} "
+        f"p99={_percentile(latencies, 0.99):.0f} mean={statistics.fmean(latencies):.0f}"
+    )
+    print(f"sources:     {sources}")
+    print(f"fallback:    {1 - llm_sources / args.requests:.1%}")
+    print(f"guard:       {llm_guard.get_stats()}")
+    print(f"client:      {llm_client.stats}")
+    print(f"server:      {server['outcomes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8100")
+    parser.add_argument("--target", choices=["main", "document_parser"], default="main")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--positions", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenario", nargs="*", help="key=value для POST /mock/config")
+    args = parser.parse_args()
+
+    # До импорта app: llm_client читает LLM_BASE_URL при импорте
+    os.environ["LLM_BASE_URL"] = args.base_url
+    os.environ.setdefault("GROQ_API_KEY", "mock")
+    # Пустой llm_cache на прогон - иначе повторный запуск отвечает из кеша
+    os.environ["LLM_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="llm_load_"), "llm_cache.sqlite3")
+    logging.disable(logging.WARNING)
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
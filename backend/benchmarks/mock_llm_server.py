@@ -0,0 +1,241 @@
+"""
+Тестовый OpenAI/Groq-совместимый сервер для нагрузочных прогонов без квоты Groq
+
+POST /openai/v1/chat/completions (путь Groq SDK) и /v1/chat/completions
+(OpenAI): позиции детерминированно выводятся из текста запроса локальным
+разбором (position_engine), ответ - в формате, который просит промпт
+(массив или {"positions": [...]}), с stream=True - SSE по кускам.
+
+Задержки и сбои настраиваются аргументами или на лету (POST /mock/config):
+распределение задержки, доли 429 (с Retry-After), 500, таймаутов (ответ
+позже таймаута клиента), битого JSON и снятой модели (model_decommissioned).
+GET /mock/stats - счётчики исходов, POST /mock/reset - сброс.
+
+Приложение переключается на сервер конфигурацией клиента (llm_client):
+    LLM_BASE_URL=http://127.0.0.1:8100 GROQ_API_KEY=mock uvicorn app.main:app
+
+Запуск (из backend/):
+    python -m benchmarks.mock_llm_server --port 8100 --latency-ms 800 --jitter-ms 400 --p429 0.05
+Нагрузка - benchmarks/llm_load_test.py.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.services.position_engine import extract_positions
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 300.0  # до ответа / первого куска потока
+    jitter_ms: float = 0.0
+    distribution: str = "uniform"  # uniform | exp | lognormal - хвост задержек
+    stream_chunk_ms: float = 20.0  # между кусками SSE
+    stream_chunk_chars: int = 40
+    p429: float = 0.0
+    p500: float = 0.0
+    p_timeout: float = 0.0
+    p_malformed: float = 0.0
+    p_decommissioned: float = 0.0
+    retry_after: float = 2.0
+    timeout_sleep: float = 60.0  # "таймаут" - столько молчим
+    seed: int = 0
+
+
+config = MockConfig()
+rng = random.Random(config.seed)
+stats: Dict[str, int] = {}
+
+app = FastAPI(title="Mock LLM")
+
+
+def _count(outcome: str):
+    stats[outcome] = stats.get(outcome, 0) + 1
+
+
+def _latency() -> float:
+    base = config.latency_ms
+    if config.distribution == "exp":
+        value = base + rng.expovariate(1 / config.jitter_ms) if config.jitter_ms else base
+    elif config.distribution == "lognormal":
+        value = base * rng.lognormvariate(0, config.jitter_ms / base) if base and config.jitter_ms else base
+    else:
+        value = base + rng.uniform(-config.jitter_ms, config.jitter_ms)
+    return max(0.0, value) / 1000
+
+
+def _error(status: int, message: str, error_type: str, code: str, headers: Dict[str, str] = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status,
+        content={"error": {"message": message, "type": error_type, "code": code}},
+        headers=headers,
+    )
+
+
+def _document(messages: List[Dict]) -> str:
+    """Текст документа - последнее сообщение пользователя, после "Текст документа:", если есть"""
+    content = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    marker = "Текст документа:"
+    return content.split(marker, 1)[1] if marker in content else content
+
+
+def _positions(text: str) -> List[Dict]:
+    positions = extract_positions(text)["positions"]
+    if positions:
+        return positions
+    # Ничего не разобралось - по позиции на строку, чтобы ответ всё равно зависел от входа
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    return [{"pos": i, "name": line[:80], "unit": "шт", "qty": 1} for i, line in enumerate(lines[:50], 1)]
+
+
+def _content(messages: List[Dict], malformed: bool) -> str:
+    positions = _positions(_document(messages))
+    prompt = " ".join(m.get("content") or "" for m in messages)
+    payload = {"positions": positions} if '"positions"' in prompt else positions
+    content = "```json\n" + json.dumps(payload, ensure_ascii=False) + "\n```"
+    if malformed:
+        # Оборванный JSON - как при max_tokens или сбое модели
+        content = content[: max(1, len(content) * 2 // 3)]
+    return content
+
+
+def _completion(model: str, content: str) -> Dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(content) // 3, "total_tokens": len(content) // 3},
+    }
+
+
+def _stream_chunk(chunk_id: str, model: str, delta: Dict, finish_reason=None) -> str:
+    chunk = {
+        "id": chunk_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+
+async def _sse(model: str, content: str):
+    chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    yield _stream_chunk(chunk_id, model, {"role": "assistant", "content": ""})
+    size = max(1, config.stream_chunk_chars)
+    for i in range(0, len(content), size):
+        await asyncio.sleep(config.stream_chunk_ms / 1000)
+        yield _stream_chunk(chunk_id, model, {"content": content[i:i + size]})
+    yield _stream_chunk(chunk_id, model, {}, finish_reason="stop")
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/openai/v1/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock")
+    messages = body.get("messages") or []
+
+    # Один бросок на исход: доли складываются, остаток - успех
+    roll = rng.random()
+    outcomes = [
+        ("decommissioned", config.p_decommissioned),
+        ("rate_limited", config.p429),
+        ("server_error", config.p500),
+        ("timeout", config.p_timeout),
+        ("malformed", config.p_malformed),
+    ]
+    outcome = "ok"
+    for name, share in outcomes:
+        if roll < share:
+            outcome = name
+            break
+        roll -= share
+    _count(outcome)
+
+    if outcome == "decommissioned":
+        return _error(
+            400,
+            f"The model `{model}` has been decommissioned and is no longer supported.",
+            "invalid_request_error",
+            "model_decommissioned",
+        )
+    if outcome == "rate_limited":
+        return _error(
+            429,
+            f"Rate limit reached for model `{model}`. Please try again in {config.retry_after:g}s.",
+            "tokens",
+            "rate_limit_exceeded",
+            headers={"retry-after": f"{config.retry_after:g}"},
+        )
+
+    await asyncio.sleep(config.timeout_sleep if outcome == "timeout" else _latency())
+    if outcome == "server_error":
+        return _error(500, "Internal server error", "internal_server_error", "internal_error")
+
+    content = _content(messages, malformed=outcome == "malformed")
+    if body.get("stream"):
+        return StreamingResponse(_sse(model, content), media_type="text/event-stream")
+    return _completion(model, content)
+
+
+@app.get("/mock/stats")
+async def mock_stats():
+    return {"config": asdict(config), "outcomes": stats}
+
+
+@app.post("/mock/config")
+async def mock_config(request: Request):
+    """Поменять сценарий без перезапуска: {"p429": 0.2, "latency_ms": 1500, ...}"""
+    global rng
+    updates = await request.json()
+    known = {f.name: f.type for f in fields(MockConfig)}
+    for key, value in updates.items():
+        if key in known:
+            setattr(config, key, type(getattr(config, key))(value))
+    if "seed" in updates:
+        rng = random.Random(config.seed)
+    return asdict(config)
+
+
+@app.post("/mock/reset")
+async def mock_reset():
+    stats.clear()
+    return {"outcomes": stats}
+
+
+def main():
+    global rng
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    for field in fields(MockConfig):
+        default = getattr(config, field.name)
+        flag = "--" + field.name.replace("_", "-")
+        if field.name == "distribution":
+            parser.add_argument(flag, default=default, choices=["uniform", "exp", "lognormal"])
+        else:
+            parser.add_argument(flag, type=type(default), default=default)
+    args = parser.parse_args()
+
+    for field in fields(MockConfig):
+        setattr(config, field.name, getattr(args, field.name))
+    rng = random.Random(config.seed)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Бенчмарк regex парсера таблицы на синтетических спецификациях
+
+Генерирует текст в формате extract_text_from_file (ячейка - строка) на
+N позиций: многострочные наименования, пропущенные ед. изм., лишние
+ячейки с ценой. Проверяет, что найдены все позиции, и что время на
+позицию не растёт с размером документа (один проход).
+
+Запуск (из backend/):
+    python -m benchmarks.parse_text_regex --positions 10 100 1000 10000 100000
+"""
+import argparse
+import contextlib
+import io
+import logging
+import random
+import time
+
+from app.main import parse_text_regex
+
+NAMES = ["Труба стальная", "Кабель ВВГнг", "Отвод 90°", "Болт М12х80", "Лист г/к", "Задвижка клиновая"]
+UNITS = ["м", "шт", "кг", "т", "м²", "компл."]
+
+
+def build_spec(positions: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = ["ТЕХНИЧЕСКОЕ ЗАДАНИЕ", "Поставка материалов", "№", "Наименование товара", "Ед.", "изм.", "Кол-во"]
+    for pos in range(1, positions + 1):
+        parts.append(str(pos))
+        parts.append(f"{rng.choice(NAMES)} {rng.randint(10, 500)}")
+        if pos % 7 == 0:
+            parts.append("(ГОСТ 8732-78)")  # вторая строка наименования
+        if pos % 11 != 0:
+            parts.append(rng.choice(UNITS))  # иногда ед. изм. нет
+        parts.append(str(rng.randint(1, 5000)))
+        if pos % 5 == 0:
+            parts.append(f"{rng.randint(100, 99999)},00")  # лишняя ячейка - цена
+    parts.append("Итого")
+    return "\n".join(parts) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    args = parser.parse_args()
+
+    for name in ("app.main", "app.services.position_engine"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    print(f"{'positions':>9} | {'lines':>8} | {'found':>8} | {'total':>8} | {'us/pos':>7}")
+    print("-" * 54)
+    for count in args.positions:
+        text = build_spec(count)
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = parse_text_regex(text)
+            elapsed = time.perf_counter() - started
+        found = len(result["positions"])
+        print(
+            f"{count:>9} | {text.count(chr(10)):>8} | {found:>8} | {elapsed:>7.3f}s | "
+            f"{elapsed / count * 1e6:>7.1f}{'' if found == count else '  MISMATCH'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
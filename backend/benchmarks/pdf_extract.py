@@ -0,0 +1,95 @@
+"""
+Бенчмарк извлечения текста PDF: последовательно vs диапазонами страниц в extraction_pool
+
+Из исходного PDF собирает документы на N страниц (страницы повторяются),
+замеряет время до первой страницы и общее время: последовательно в
+текущем процессе (iter_pdf_pages) и диапазонами - задачами ExtractionPool
+(aiter_pdf_pages, под лимитами воркеров). Проверяет, что текст совпадает.
+
+Запуск (из backend/):
+    python -m benchmarks.pdf_extract uploads/<file>.pdf --pages 16 64 256 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.services.extraction_pool import ExtractionPool
+from app.services.pdf_stream import aiter_pdf_pages, iter_pdf_pages, PdfReader
+
+try:
+    from PyPDF2 import PdfWriter
+except ImportError:
+    from pypdf import PdfWriter
+
+
+def build_pdf(source: str, pages: int, out_path: str):
+    reader = PdfReader(source)
+    writer = PdfWriter()
+    for i in range(pages):
+        writer.add_page(reader.pages[i % len(reader.pages)])
+    with open(out_path, "wb") as f:
+        writer.write(f)
+
+
+def measure_sequential(path: str):
+    started = time.perf_counter()
+    first_page = None
+    pages = []
+    for text in iter_pdf_pages(path):
+        if first_page is None:
+            first_page = time.perf_counter() - started
+        pages.append(text)
+    return pages, first_page, time.perf_counter() - started
+
+
+async def measure_pool(path: str, pool: ExtractionPool, workers: int):
+    started = time.perf_counter()
+    first_page = None
+    pages = []
+    async for text in aiter_pdf_pages(path, workers=workers, pool=pool):
+        if first_page is None:
+            first_page = time.perf_counter() - started
+        pages.append(text)
+    return pages, first_page, time.perf_counter() - started
+
+
+async def run_pool(paths: list, workers: int) -> list:
+    pool = ExtractionPool(workers=workers)
+    pool.start()
+    try:
+        # Прогрев: воркеры стартуют и импортируют PdfReader до замеров
+        await pool.run(os.getpid)
+        return [await measure_pool(path, pool, workers) for path in paths]
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", help="исходный PDF с текстовым слоем")
+    parser.add_argument("--pages", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} | {'seq first':>9} | {'seq total':>9} | {'pool first':>10} | {'pool total':>10} | {'speedup':>7} | same")
+    print("-" * 80)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for count in args.pages:
+            path = os.path.join(tmp, f"bench_{count}.pdf")
+            build_pdf(args.pdf, count, path)
+            paths.append(path)
+
+        pooled = asyncio.run(run_pool(paths, args.workers))
+        for count, path, (pool_pages, pool_first, pool_total) in zip(args.pages, paths, pooled):
+            seq_pages, seq_first, seq_total = measure_sequential(path)
+            print(
+                f"{count:>6} | {seq_first:>8.2f}s | {seq_total:>8.2f}s | {pool_first:>9.2f}s | "
+                f"{pool_total:>9.2f}s | {seq_total / pool_total:>6.2f}x | {seq_pages == pool_pages}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Регрессия сжатия текста для LLM (app/services/prompt_compact.py)
+
+На синтетических документах разных форматов считает экономию токенов и
+проверяет, что сжатие ничего не потеряло: локальный разбор (position_engine)
+на сжатом тексте находит те же номера позиций, что и на исходном, и
+structural confidence не ниже (сжатие убирает шум - повторы шапки,
+объединённые ячейки, - поэтому позиции могут стать точнее; сколько
+изменилось - столбец changed). С --llm то же
+сравнение делается ответами GROQ (нужен GROQ_API_KEY или LLM_BASE_URL на
+тестовый сервер) - доля совпавших позиций не ниже --min-overlap.
+
+Код выхода 1 - есть расхождения.
+
+Запуск (из backend/):
+    python -m benchmarks.prompt_compaction --positions 50 500
+    python -m benchmarks.prompt_compaction --positions 50 --llm
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import random
+import sys
+
+from app.services.position_engine import extract_positions
+from app.services.prompt_compact import compact_prompt_text
+from benchmarks.parse_text_regex import NAMES, UNITS, build_spec
+
+BOILERPLATE = [
+    "Поставщик обязуется поставить товар надлежащего качества в соответствии с требованиями настоящего технического задания",
+    "Товар должен быть новым, не бывшим в употреблении, не восстановленным, свободным от прав третьих лиц",
+    "Упаковка должна обеспечивать сохранность товара при транспортировке и хранении на складе заказчика",
+]
+HEADER = ["№", "Наименование товара", "Ед.", "изм.", "Кол-во"]
+
+
+def docx_spec(positions: int, seed: int = 0) -> str:
+    """Ячейка на строку (DOCX): абзацы ТЗ, нумерация столбцов, повтор шапки каждые 40 строк"""
+    lines = build_spec(positions, seed).split("\n")
+    header_end = lines.index("Кол-во") + 1
+    body, result = lines[header_end:], lines[:2] + BOILERPLATE + HEADER + ["1", "2", "3", "4"]
+    row = 0
+    for line in body:
+        if line.isdigit() and int(line) == row + 1 and row and row % 40 == 0:
+            result.extend(HEADER)
+        if line.isdigit() and int(line) == row + 1:
+            row += 1
+        result.append(line)
+    return "\n".join(result)
+
+
+def piped_spec(positions: int, seed: int = 0) -> str:
+    """Строки через " | " (XLSX/DocumentParser): пустые и объединённые ячейки, шапка на каждой странице"""
+    rng = random.Random(seed)
+    header = "№ | Наименование |  | Ед. изм. | Кол-во | "
+    lines = ["ТЕХНИЧЕСКОЕ ЗАДАНИЕ"] + BOILERPLATE
+    for pos in range(1, positions + 1):
+        if pos % 50 == 1:
+            lines += [header, f"Страница {pos // 50 + 1} из {positions // 50 + 1}"]
+        name = f"{rng.choice(NAMES)} {rng.randint(10, 500)}"
+        lines.append(f"{pos} | {name} | {name} |  {rng.choice(UNITS)}  |   {rng.randint(1, 5000)} | ")
+    return "\n".join(lines)
+
+
+def spaced_spec(positions: int, seed: int = 0) -> str:
+    """Строки "1 Название м 140" (PDF): колонтитулы и повтор шапки страниц"""
+    rng = random.Random(seed)
+    lines = ["ТЕХНИЧЕСКОЕ ЗАДАНИЕ"] + BOILERPLATE
+    for pos in range(1, positions + 1):
+        if pos % 30 == 1:
+            lines += ["№ Наименование Ед. изм. Кол-во", f"- {pos // 30 + 1} -"]
+        lines.append(f"{pos}   {rng.choice(NAMES)}  {rng.randint(10, 500)}   {rng.choice(['м', 'шт', 'кг'])}   {rng.randint(1, 5000)}")
+    return "\n".join(lines)
+
+
+FORMATS = {"docx": docx_spec, "piped": piped_spec, "spaced": spaced_spec}
+
+
+def _keys(positions):
+    return [(p["pos"], p["name"], p["unit"], p["qty"]) for p in positions]
+
+
+def _overlap(a, b) -> float:
+    a, b = set(_keys(a)), set(_keys(b))
+    return len(a & b) / max(len(a | b), 1)
+
+
+async def _llm_positions(text: str):
+    from app.main import parse_text_with_groq
+
+    result = await parse_text_with_groq(text, fallback={"positions": [], "source": "none"}, compact=False)
+    return result["positions"] if result.get("source") == "groq" else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--positions", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--llm", action="store_true", help="сравнить и ответы GROQ")
+    parser.add_argument("--min-overlap", type=float, default=0.95)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    failed = False
+
+    print(
+        f"{'format':>7} | {'positions':>9} | {'tokens':>7} | {'compact':>7} | {'saved':>6} | "
+        f"{'local':>8} | {'changed':>7} | {'llm':>6}"
+    )
+    print("-" * 78)
+    for count in args.positions:
+        for name, build in FORMATS.items():
+            text = build(count)
+            compacted = compact_prompt_text(text)
+            before = extract_positions(text)
+            after = extract_positions(compacted["text"])
+            local_ok = (
+                [p["pos"] for p in before["positions"]] == [p["pos"] for p in after["positions"]]
+                and len(after["positions"]) == count
+                and after["structure"]["confidence"] >= before["structure"]["confidence"]
+            )
+            changed = len(set(_keys(before["positions"])) - set(_keys(after["positions"])))
+
+            llm = "-"
+            if args.llm:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    llm_before = asyncio.run(_llm_positions(text))
+                    llm_after = asyncio.run(_llm_positions(compacted["text"]))
+                if llm_before is None or llm_after is None:
+                    llm = "n/a"
+                else:
+                    overlap = _overlap(llm_before, llm_after)
+                    llm = f"{overlap:.2f}"
+                    failed |= overlap < args.min_overlap
+
+            failed |= not local_ok
+            print(
+                f"{name:>7} | {count:>9} | {compacted['tokens_before']:>7} | {compacted['tokens_after']:>7} | "
+                f"{compacted['reduction']:>6.0%} | {'ok' if local_ok else 'MISMATCH':>8} | {changed:>7} | {llm:>6}"
+            )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+Тесты backend: запуск из backend/ - python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+# app.* импортируется из backend/ при любом способе запуска pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Кеши и хранилище загрузок - во временный каталог, не в рабочий
+_tmp = tempfile.mkdtemp(prefix="b2b_tests_")
+os.environ.setdefault("PARSE_CACHE_PATH", os.path.join(_tmp, "parse_cache.sqlite3"))
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(_tmp, "llm_cache.sqlite3"))
+os.environ.setdefault("UPLOAD_STORE_PATH", os.path.join(_tmp, "uploads"))
@@ -0,0 +1,74 @@
+"""Разбор загрузок идёт через extraction_pool; сбои пула - 503/422, а не пустой результат"""
+import asyncio
+import io
+
+import docx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import documents
+from app.services import extraction_pool as pool_module
+from app.services.document_parser import DocumentParser
+from app.services.extraction_pool import ExtractionPoolBusy, ExtractionTimeout
+
+
+def _docx(lines):
+    document = docx.Document()
+    for line in lines:
+        document.add_paragraph(line)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(documents.router)
+    with TestClient(app) as client:
+        yield client
+    pool_module.extraction_pool.shutdown()
+
+
+def _upload(client, data, name="spec.docx"):
+    return client.post("/api/v1/documents/upload", files={"file": (name, data, "application/octet-stream")})
+
+
+def test_documents_upload_extracts_in_pool(client):
+    data = _docx(["1. Труба стальная 57х3,5 - 120 м", "2. Отвод 90° 57 - 14 шт"])
+    submitted = pool_module.extraction_pool.stats["submitted"]
+
+    response = _upload(client, data)
+
+    assert response.status_code == 200
+    assert pool_module.extraction_pool.stats["submitted"] == submitted + 1
+    assert [p["pos"] for p in response.json()["positions"]] == [1, 2]
+
+
+@pytest.mark.parametrize("error, status", [
+    (ExtractionPoolBusy(32), 503),
+    (ExtractionTimeout("CPU time limit exceeded"), 422),
+])
+def test_documents_upload_pool_errors(client, monkeypatch, error, status):
+    async def failing_run(func, *args):
+        raise error
+
+    monkeypatch.setattr(pool_module.extraction_pool, "run", failing_run)
+
+    response = _upload(client, _docx(["1. Болт М12 - 100 шт"]), name=f"{status}.docx")
+
+    assert response.status_code == status
+
+
+def test_parse_document_reraises_extraction_timeout(monkeypatch, tmp_path):
+    path = tmp_path / "spec.docx"
+    path.write_bytes(_docx(["1. Болт М12 - 100 шт"]))
+
+    async def failing_run(func, *args):
+        raise ExtractionTimeout("wall-clock time limit exceeded")
+
+    monkeypatch.setattr(pool_module.extraction_pool, "run", failing_run)
+
+    with pytest.raises(ExtractionTimeout):
+        asyncio.run(DocumentParser().parse_document(str(path)))
@@ -0,0 +1,82 @@
+"""JsonArrayStream: состояние между кусками потока - строки, escape, вложенность"""
+import json
+
+import pytest
+
+from app.services.json_stream import JsonArrayStream
+
+ITEMS = [
+    {"pos": 1, "name": "Труба \"ГОСТ 10704\" 57х3,5", "unit": "м", "qty": 120},
+    {"pos": 2, "name": "Путь C:\\tmp\\} и {скобки] в строке", "unit": "шт", "qty": 2.5},
+    {"pos": 3, "name": "Кран \u00bdʺ", "unit": "шт", "qty": 3, "extra": {"tags": ["a", {"b": "]"}], "n": [1, [2]]}},
+    {"pos": 4, "name": "Конец \\", "unit": "компл", "qty": None},
+]
+PAYLOAD = "```json\n" + json.dumps(ITEMS, ensure_ascii=False, indent=1) + "\n```"
+
+
+def feed_chunks(chunks):
+    stream = JsonArrayStream()
+    items = []
+    for chunk in chunks:
+        items.extend(stream.feed(chunk))
+    return stream, items
+
+
+def test_whole_payload():
+    stream, items = feed_chunks([PAYLOAD])
+
+    assert items == ITEMS
+    assert stream.closed and stream.emitted == 4 and stream.errors == 0
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16])
+def test_fixed_chunk_sizes(size):
+    _, items = feed_chunks(PAYLOAD[i:i + size] for i in range(0, len(PAYLOAD), size))
+
+    assert items == ITEMS
+
+
+def test_every_split_point():
+    """Разрез в любом месте - посреди строки, сразу после "\\", между скобками"""
+    for i in range(len(PAYLOAD) + 1):
+        _, items = feed_chunks([PAYLOAD[:i], PAYLOAD[i:]])
+        assert items == ITEMS, f"split at {i}: {PAYLOAD[max(0, i - 10):i]!r} | {PAYLOAD[i:i + 10]!r}"
+
+
+def test_split_right_after_backslash_before_quote():
+    stream = JsonArrayStream()
+
+    assert stream.feed('[{"name": "a\\') == []
+    assert stream.feed('"}", "qty": 1}') == [{"name": 'a"}', "qty": 1}]
+    assert not stream.closed
+
+
+def test_objects_are_emitted_as_soon_as_closed():
+    stream = JsonArrayStream()
+
+    assert stream.feed('[{"pos": 1}, {"pos"') == [{"pos": 1}]
+    assert stream.feed(': 2}') == [{"pos": 2}]
+    assert stream.feed(']') == [] and stream.closed
+
+
+def test_nothing_after_closing_bracket():
+    stream = JsonArrayStream()
+
+    stream.feed('[{"pos": 1}]')
+
+    assert stream.feed('[{"pos": 2}]') == []
+    assert stream.emitted == 1
+
+
+def test_malformed_object_is_skipped():
+    stream, items = feed_chunks(['[{"pos": 1,}, ', '{"pos": 2}, 7, {"pos": 3}]'])
+
+    assert items == [{"pos": 2}, {"pos": 3}]
+    assert stream.errors == 1 and stream.emitted == 2
+
+
+def test_truncated_stream_keeps_finished_objects():
+    stream, items = feed_chunks(['[{"pos": 1}, {"pos": 2, "name": "обр'])
+
+    assert items == [{"pos": 1}]
+    assert not stream.closed
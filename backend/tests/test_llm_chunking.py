@@ -0,0 +1,46 @@
+"""Хвост сверх LLM_CHUNK_MAX_CHUNKS: помечается truncated и разбирается локально"""
+import asyncio
+
+from app.services.llm_chunking import map_reduce_positions, split_into_chunks
+from app.services.position_engine import extract_positions
+
+HEADER = "№ | Наименование | Ед. изм. | Кол-во"
+TEXT = HEADER + "\n" + "\n".join(f"{i} | Труба стальная {i}x3 | м | {i * 10}" for i in range(1, 41))
+MAX_TOKENS = 100
+
+
+async def fake_llm(chunk: str) -> list:
+    """Вместо Groq - тот же локальный разбор куска"""
+    return extract_positions(chunk)["positions"]
+
+
+def run(**kwargs) -> dict:
+    return asyncio.run(map_reduce_positions(TEXT, fake_llm, max_tokens=MAX_TOKENS, **kwargs))
+
+
+def test_all_chunks_sent_is_not_truncated():
+    result = run()
+
+    assert result["truncated"] is False
+    assert result["chunks_dropped"] == 0
+    assert [p["pos"] for p in result["positions"]] == list(range(1, 41))
+
+
+def test_tail_past_limit_is_parsed_locally():
+    total = len(split_into_chunks(TEXT, MAX_TOKENS))
+    progress = {}
+
+    result = run(max_chunks=2, progress=progress)
+
+    assert result["truncated"] is True
+    assert result["chunks"] == 2
+    assert result["chunks_dropped"] == total - 2
+    assert progress["chunks_dropped"] == total - 2
+    assert [p["pos"] for p in result["positions"]] == list(range(1, 41))
+
+
+def test_tail_without_parse_tail_is_dropped_but_flagged():
+    result = run(max_chunks=2, parse_tail=None)
+
+    assert result["truncated"] is True
+    assert len(result["positions"]) < 40
@@ -0,0 +1,72 @@
+"""Срыв общего срока потокового ответа Groq засчитывается предохранителю"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import app.main as main
+from app.services import llm_guard as guard_module
+from app.services.llm_client import llm_client
+
+
+class HangingStream:
+    """Поток, который так и не присылает ни одного куска"""
+
+    closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(3600)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def hanging_groq(monkeypatch):
+    streams = []
+
+    async def create(**kwargs):
+        streams.append(HangingStream())
+        return streams[-1]
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm_client, "_client", fake)
+    monkeypatch.setattr(main, "GROQ_TIMEOUT", 0.05)
+    guard = guard_module.llm_guard
+    monkeypatch.setattr(guard, "breaker", guard_module.CircuitBreaker(3, 30))
+    monkeypatch.setattr(guard, "bucket", guard_module.TokenBucket(1000, 1000))
+    return streams
+
+
+def test_stream_timeouts_open_breaker(hanging_groq):
+    async def run():
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await main._groq_chunk_stream("1. Труба 10 м", main.new_llm_progress())
+        with pytest.raises(guard_module.LLMCircuitOpen):
+            await main._groq_chunk_stream("1. Труба 10 м", main.new_llm_progress())
+
+    asyncio.run(run())
+
+    assert guard_module.llm_guard.breaker.state == guard_module.OPEN
+    assert len(hanging_groq) == 3
+    assert all(stream.closed for stream in hanging_groq)
+
+
+def test_client_abort_is_not_a_failure(hanging_groq):
+    """Отмена самим клиентом (не по сроку) предохранитель не трогает"""
+    async def run():
+        task = asyncio.create_task(main._groq_chunk_stream("1. Труба 10 м", main.new_llm_progress()))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    for _ in range(4):
+        asyncio.run(run())
+
+    assert guard_module.llm_guard.breaker.state == guard_module.CLOSED
+    assert guard_module.llm_guard.breaker.failures == 0
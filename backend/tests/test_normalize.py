@@ -0,0 +1,66 @@
+"""Единицы и количества: русская запись чисел, диапазоны, синонимы единиц"""
+import pytest
+
+from app.services.normalize import normalize_unit, parse_number, parse_quantity, unit_or_default
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("12", 12),
+    ("5,8261", 5.8261),
+    ("0,5 т", 0.5),
+    ("1 234,5", 1234.5),
+    ("1 000", 1000),
+    ("1.234,5", 1234.5),
+    ("1,234.5", 1234.5),
+    ("1.234.567", 1234567),
+    ("2,0", 2),
+    ("120.", 120),
+])
+def test_decimal_comma_and_thousands(raw, expected):
+    assert parse_quantity(raw) == expected
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("10-15", 15),
+    ("10 – 15 шт", 15),
+    ("от 10 до 15", 15),
+    ("2,5...3,5", 3.5),
+    ("1 000-1 500", 1500),
+    ("15-10", 15),
+])
+def test_range_takes_upper_bound(raw, expected):
+    assert parse_quantity(raw) == expected
+
+
+def test_spaced_numbers_are_not_thousands():
+    assert parse_quantity("2 5") == 2
+    assert parse_quantity("12 345") == 12345
+
+
+@pytest.mark.parametrize("raw", [None, "", "шт", "по месту"])
+def test_no_number(raw):
+    assert parse_quantity(raw) is None
+
+
+def test_parse_number_rejects_garbage():
+    assert parse_number("") is None
+    assert parse_number(",") is None
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("м2", "м²"),
+    ("кв. м.", "м²"),
+    ("Куб.м", "м³"),
+    ("тн", "т"),
+    ("к-т", "компл"),
+    ("п.м", "м"),
+    ("ящик", None),
+])
+def test_unit_synonyms(raw, expected):
+    assert normalize_unit(raw) == expected
+
+
+def test_unknown_unit_is_kept_empty_is_default():
+    assert unit_or_default(" ящик ") == "ящик"
+    assert unit_or_default("") == "шт"
+    assert unit_or_default(None, default="ед") == "ед"
@@ -0,0 +1,108 @@
+"""Курсоры и постраничные списки main.py (/user/requests, /moderator/tasks)"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.services.pagination import (
+    decode_cursor, encode_cursor, is_descending, page_size, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, NEXT_CURSOR_HEADER,
+)
+from app.services.request_store import RequestStore
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 12, 30, 15, 123456)
+
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at.isoformat(), 42)
+    assert decode_cursor(encode_cursor("2026-03-01T12:30:15", 7)) == ("2026-03-01T12:30:15", 7)
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", ["zzz", "!!!", encode_cursor("not a date", 1)])
+def test_invalid_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor)
+    assert e.value.status_code == 400
+
+
+def test_page_size_and_order():
+    assert page_size(None) == PAGE_SIZE_DEFAULT
+    assert page_size(10 ** 6) == PAGE_SIZE_MAX
+    assert page_size(-5) == 1
+    assert is_descending(None, "desc") and not is_descending(None, "asc")
+    with pytest.raises(HTTPException):
+        is_descending("sideways")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = RequestStore()
+    base = datetime(2026, 1, 1)
+    for i in range(1, 12):
+        store.add({
+            "id": i,
+            "filename": f"f{i}.docx",
+            "status": "submitted" if i % 2 else "draft",
+            # Пары с одинаковым created_at - граница страницы может прийтись между ними
+            "created_at": (base + timedelta(hours=i // 2)).isoformat(),
+            "items": [],
+            "parsing_confidence": 0,
+            "preview": "",
+            "parsing_source": "regex",
+            "parse_state": "done",
+        })
+    monkeypatch.setattr(main, "requests_storage", store)
+    return TestClient(main.app)
+
+
+def _all_pages(client, path, **params):
+    pages, cursor = [], None
+    while True:
+        response = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append([r["id"] for r in response.json()])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return pages
+
+
+def test_user_requests_newest_first_by_default(client):
+    pages = _all_pages(client, "/api/v1/user/requests", limit=4)
+
+    assert pages == [[11, 10, 9, 8], [7, 6, 5, 4], [3, 2, 1]]
+
+
+def test_user_requests_ascending(client):
+    pages = _all_pages(client, "/api/v1/user/requests", limit=3, order="asc")
+
+    assert [i for page in pages for i in page] == list(range(1, 12))
+    assert [len(page) for page in pages] == [3, 3, 3, 2]
+
+
+def test_exact_page_boundary_has_no_empty_tail(client):
+    """11 записей по 11: одна страница и без курсора (лишняя запись не запрошена зря)"""
+    response = client.get("/api/v1/user/requests", params={"limit": 11})
+
+    assert len(response.json()) == 11
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_moderator_tasks_queue_oldest_first(client):
+    pages = _all_pages(client, "/api/v1/moderator/tasks", limit=2)
+
+    assert pages == [[1, 3], [5, 7], [9, 11]]
+
+
+def test_filters_and_bad_params(client):
+    response = client.get(
+        "/api/v1/user/requests",
+        params={"status": "draft", "created_from": "2026-01-01T02:00", "created_to": "2026-01-01T05:00"},
+    )
+    assert [r["id"] for r in response.json()] == [8, 6, 4]
+
+    assert client.get("/api/v1/user/requests", params={"cursor": "zzz"}).status_code == 400
+    assert client.get("/api/v1/user/requests", params={"created_from": "yesterday"}).status_code == 400
+    assert client.get("/api/v1/user/requests", params={"order": "up"}).status_code == 400
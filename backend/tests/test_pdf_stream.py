@@ -0,0 +1,145 @@
+"""PDF диапазонами страниц - отдельными задачами extraction_pool, страницы по порядку"""
+import asyncio
+
+import pytest
+
+from app.services import pdf_stream
+from app.services.document_parser import DocumentParser
+from app.services.extraction_pool import ExtractionPool, ExtractionPoolBusy, extraction_pool
+from app.services.pdf_stream import aiter_pdf_pages, apdf_to_text, iter_pdf_pages, pdf_range_text
+
+PAGES = [f"Page {i}" for i in range(1, 41)]
+
+
+def make_pdf(texts) -> bytes:
+    """Минимальный PDF: страница на строку текста (Helvetica)"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in texts:
+        stream = f"BT /F1 12 Tf 20 100 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] /Contents {len(objects)} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> >> >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+class RecordingPool:
+    """Пул в текущем процессе: запоминает задачи и сколько их было в очереди одновременно"""
+
+    def __init__(self):
+        self.jobs = []
+        self.pending = 0
+        self.max_pending = 0
+
+    async def run(self, func, *args):
+        self.jobs.append((func.__name__, args[1:]))
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        try:
+            await asyncio.sleep(0)
+            return func(*args)
+        finally:
+            self.pending -= 1
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "spec.pdf"
+    path.write_bytes(make_pdf(PAGES))
+    return str(path)
+
+
+async def collect(source, **kwargs):
+    return [text async for text in aiter_pdf_pages(source, **kwargs)]
+
+
+def test_ranges_are_separate_jobs_in_page_order(pdf_path):
+    pool = RecordingPool()
+
+    pages = asyncio.run(collect(pdf_path, workers=2, pool=pool))
+
+    assert pages == PAGES == list(iter_pdf_pages(pdf_path))
+    ranges = [args for name, args in pool.jobs if name == "pdf_range_text"]
+    assert len(ranges) == 2 * pdf_stream.PDF_CHUNKS_PER_WORKER
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(PAGES)
+    assert pool.max_pending <= 2
+
+
+def test_small_document_is_one_job(pdf_path, monkeypatch):
+    monkeypatch.setattr(pdf_stream, "PDF_PARALLEL_MIN_PAGES", len(PAGES) + 1)
+    pool = RecordingPool()
+
+    assert asyncio.run(collect(pdf_path, workers=4, pool=pool)) == PAGES
+    assert [name for name, _ in pool.jobs] == ["pdf_page_count", "pdf_range_text"]
+
+
+def test_bytes_source_in_real_pool():
+    pool = ExtractionPool(workers=2)
+    try:
+        pages = asyncio.run(collect(make_pdf(PAGES), workers=2, pool=pool))
+    finally:
+        pool.shutdown()
+
+    assert pages == PAGES
+    assert pool.stats["submitted"] == 1 + 2 * pdf_stream.PDF_CHUNKS_PER_WORKER
+    assert pool.stats["completed"] == pool.stats["submitted"]
+
+
+def test_early_stop_cancels_remaining_ranges(pdf_path):
+    pool = RecordingPool()
+
+    async def first_page():
+        async for text in aiter_pdf_pages(pdf_path, workers=2, pool=pool):
+            return text
+
+    assert asyncio.run(first_page()) == "Page 1"
+    assert len([name for name, _ in pool.jobs if name == "pdf_range_text"]) < 2 * pdf_stream.PDF_CHUNKS_PER_WORKER
+
+
+def test_pool_errors_reach_consumer(pdf_path):
+    class BusyPool:
+        async def run(self, func, *args):
+            raise ExtractionPoolBusy(32)
+
+    with pytest.raises(ExtractionPoolBusy):
+        asyncio.run(collect(pdf_path, workers=2, pool=BusyPool()))
+
+
+def test_range_text_matches_sequential_slice(pdf_path):
+    assert pdf_range_text(pdf_path, 5, 9) == PAGES[5:9]
+
+
+def test_apdf_to_text_skips_empty_pages(tmp_path):
+    path = tmp_path / "gaps.pdf"
+    path.write_bytes(make_pdf(["Page 1", "", "Page 3"]))
+
+    try:
+        text = asyncio.run(apdf_to_text(str(path), skip_empty=True))
+    finally:
+        extraction_pool.shutdown()
+
+    assert text == "Page 1\nPage 3\n"
+
+
+def test_parse_document_reads_pdf_through_page_ranges(pdf_path, monkeypatch):
+    pool = RecordingPool()
+    monkeypatch.setattr(pdf_stream.extraction_pool, "run", pool.run)
+
+    result = asyncio.run(DocumentParser().parse_document(pdf_path))
+
+    assert result["raw_text"] == "".join(page + "\n" for page in PAGES)
+    assert [name for name, _ in pool.jobs] == ["pdf_range_text"]
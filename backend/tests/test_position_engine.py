@@ -0,0 +1,117 @@
+"""Стратегии position_engine, выбор лучшего результата и structural_confidence"""
+import pytest
+
+from app.services.position_engine import (
+    DEFAULT_QTY,
+    REGEX_CONFIDENCE_THRESHOLD,
+    extract_positions,
+    strategy_piped,
+    strategy_spaced,
+    strategy_trailing_qty,
+    structural_confidence,
+    tokenize,
+)
+
+
+def lines(*rows):
+    return "\n".join(rows) + "\n"
+
+
+def short(positions):
+    return [(p["pos"], p["name"], p["unit"], p["qty"]) for p in positions]
+
+
+def test_piped_rows_ignore_price_columns():
+    tokens = tokenize(lines(
+        "№ | Наименование | Ед. изм. | Кол-во | Цена",
+        "1 | Труба стальная 57х3,5 | м | 120 | 500,00",
+        "2 | Кабель ВВГ 3х2,5 | 1 500 | м",
+        "3 | Итого | | 1 620",
+    ))
+
+    assert short(strategy_piped(tokens)) == [
+        (1, "Труба стальная 57х3,5", "м", 120),
+        (2, "Кабель ВВГ 3х2,5", "м", 1500),
+    ]
+
+
+def test_spaced_rows_need_unit_from_dictionary():
+    tokens = tokenize(lines("1 Труба стальная м 120", "2. Отвод 90° кв. м 2,5", "3 Заглушка ящик 4"))
+
+    assert short(strategy_spaced(tokens)) == [
+        (1, "Труба стальная", "м", 120),
+        (2, "Отвод 90°", "м²", 2.5),
+    ]
+
+
+def test_trailing_qty_with_optional_unit():
+    tokens = tokenize(lines("1. Отвод 90 14 шт", "2) Фланец (ГОСТ 12820) 8", "3"))
+
+    assert short(strategy_trailing_qty(tokens)) == [
+        (1, "Отвод 90", "шт", 14),
+        (2, "Фланец", "шт", 8),
+    ]
+
+
+def test_best_strategy_wins_and_missing_qty_gets_default():
+    result = extract_positions(lines(
+        "Спецификация",
+        "1 | Труба стальная | м | 120",
+        "2 | Монтаж узла | компл |",
+        "3 | Кран шаровый | шт | 3",
+    ))
+
+    assert result["strategy"] == "piped"
+    assert result["counts"]["piped"] == 3
+    assert [p["qty"] for p in result["positions"]] == [120, DEFAULT_QTY, 3]
+    assert set(result["timings_ms"]) == {"tokenize", "cell_lines", "piped", "spaced", "trailing_qty"}
+
+
+def test_no_positions():
+    result = extract_positions("Техническое задание на поставку")
+
+    assert result["positions"] == [] and result["strategy"] is None
+    assert result["structure"]["confidence"] == 0.0
+
+
+def test_strategies_can_be_restricted():
+    text = lines("1 Труба стальная м 120", "2 Отвод шт 14")
+
+    assert extract_positions(text, strategies=["piped"])["positions"] == []
+    assert extract_positions(text, strategies=["spaced"])["strategy"] == "spaced"
+
+
+def position(pos, qty=1, unit="шт"):
+    return {"pos": pos, "name": f"Позиция {pos}", "unit": unit, "qty": qty}
+
+
+def test_structural_confidence_complete_table():
+    structure = structural_confidence([position(i) for i in range(1, 11)])
+
+    assert structure["confidence"] == 100.0
+    assert structure["confidence"] >= REGEX_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("numbers, sequence, row_consistency", [
+    ([1, 2, 5], 0.5, 0.6),       # пропуск номеров
+    ([1, 1, 2], 0.5, 0.667),     # повтор номера
+    ([3, 2, 1], 0.0, 1.0),       # обратный порядок
+    ([7], 1.0, 1.0),
+])
+def test_structural_confidence_numbering(numbers, sequence, row_consistency):
+    structure = structural_confidence([position(n) for n in numbers])
+
+    assert structure["sequence"] == sequence
+    assert structure["row_consistency"] == row_consistency
+    assert structure["qty_coverage"] == structure["unit_coverage"] == 1.0
+
+
+def test_structural_confidence_coverage():
+    positions = [position(1), position(2, qty=None), position(3, unit="ящик"), position(4, qty=None, unit="")]
+
+    structure = structural_confidence(positions)
+
+    assert structure["qty_coverage"] == 0.5
+    assert structure["unit_coverage"] == 0.5
+    assert structure["confidence"] == 100 * (0.3 + 0.25 + 0.25 * 0.5 + 0.2 * 0.5)
+    assert structure["confidence"] < REGEX_CONFIDENCE_THRESHOLD
@@ -0,0 +1,64 @@
+"""Сжатие текста для LLM: каждая таблица "ячейка на строку" - отдельно"""
+from app.services.position_engine import cell_tables, strategy_cell_lines, tokenize
+from app.services.prompt_compact import compact_prompt_text
+
+HEADER = ["№", "Наименование", "Ед. изм.", "Кол-во"]
+
+
+def cells(*rows):
+    """Строки таблицы -> текст "ячейка на строку" (как из DOCX/PDF)"""
+    return [cell for row in rows for cell in row]
+
+
+def text(*parts):
+    return "\n".join(line for part in parts for line in part) + "\n"
+
+
+FIRST = cells(HEADER, ["1", "Труба стальная 57х3,5", "м", "120"], ["2", "Отвод 90°", "шт", "14"])
+SECOND = cells(["1", "Кран шаровый", "шт", "3"], ["2", "Задвижка", "шт", "2"])
+
+
+def test_second_table_with_header_is_not_glued_to_last_row():
+    result = compact_prompt_text(text(["Техническое задание"], FIRST, HEADER, SECOND, ["Итого"]))
+
+    assert result["tables"] == 2
+    assert result["text"].split("\n") == [
+        "№|Наименование|Ед. изм.|Кол-во",
+        "1|Труба стальная 57х3,5|м|120",
+        "2|Отвод 90°|шт|14",
+        "№|Наименование|Ед. изм.|Кол-во",
+        "1|Кран шаровый|шт|3",
+        "2|Задвижка|шт|2",
+    ]
+
+
+def test_numbering_reset_starts_new_table():
+    tokens = tokenize(text(FIRST, SECOND))
+
+    tables = cell_tables(tokens)
+
+    assert [header for _, header, _ in tables] == [HEADER, []]
+    assert [[num for num, _ in rows] for _, _, rows in tables] == [[1, 2], [1, 2]]
+    assert compact_prompt_text(text(FIRST, SECOND))["text"].split("\n")[3:] == [
+        "1|Кран шаровый|шт|3",
+        "2|Задвижка|шт|2",
+    ]
+    assert [p["name"] for p in strategy_cell_lines(tokens)] == [
+        "Труба стальная 57х3,5", "Отвод 90°", "Кран шаровый", "Задвижка",
+    ]
+
+
+def test_header_repeated_on_page_break_is_dropped():
+    continued = cells(["3", "Фланец", "шт", "8"])
+
+    lines = compact_prompt_text(text(FIRST, HEADER, continued))["text"].split("\n")
+
+    assert lines.count("№|Наименование|Ед. изм.|Кол-во") == 1
+    assert lines[-1] == "3|Фланец|шт|8"
+
+
+def test_quantity_one_is_a_cell_not_a_reset():
+    tokens = tokenize(text(cells(HEADER, ["1", "Болт М12", "шт", "5"], ["2", "Шайба", "кг", "1"])))
+
+    assert [p["qty"] for p in strategy_cell_lines(tokens)] == [5, 1]
+    assert len(cell_tables(tokens)) == 1
@@ -0,0 +1,160 @@
+"""Индексы RequestStore и выборки query()"""
+import pytest
+
+from app.services.request_store import RequestStore
+
+
+def _record(request_id, created_at, status="draft", source="regex"):
+    return {"id": request_id, "created_at": created_at, "status": status, "parsing_source": source}
+
+
+@pytest.fixture
+def store():
+    store = RequestStore()
+    # Вставка не по порядку, две заявки с одинаковым created_at
+    for request_id, created_at, status, source in [
+        (3, "2026-01-02T00:00:00", "submitted", "table"),
+        (1, "2026-01-01T00:00:00", "draft", "regex"),
+        (5, "2026-01-03T00:00:00", "submitted", "groq"),
+        (2, "2026-01-02T00:00:00", "draft", "table"),
+        (4, "2026-01-02T12:00:00", "approved", "regex"),
+    ]:
+        store.add(_record(request_id, created_at, status, source))
+    return store
+
+
+def _ids(records):
+    return [r["id"] for r in records]
+
+
+def test_query_orders_by_created_at_then_id(store):
+    assert _ids(store.query()) == [1, 2, 3, 4, 5]
+    assert _ids(store.query(descending=True)) == [5, 4, 3, 2, 1]
+
+
+def test_query_filters(store):
+    assert _ids(store.query(status="submitted")) == [3, 5]
+    assert _ids(store.query(source="table")) == [2, 3]
+    assert _ids(store.query(status="draft", source="table")) == [2]
+    assert _ids(store.query(status="missing")) == []
+    assert _ids(store.query(created_from="2026-01-02", created_to="2026-01-03")) == [2, 3, 4]
+    assert _ids(store.query(created_from="2026-01-02T12:00:00", descending=True)) == [5, 4]
+
+
+def test_update_moves_record_between_indexes(store):
+    store.update(1, status="submitted", parsing_source="groq")
+
+    assert _ids(store.query(status="submitted")) == [1, 3, 5]
+    assert _ids(store.query(status="draft")) == [2]
+    assert _ids(store.query(source="groq")) == [1, 5]
+    assert store.count(status="draft") == 1
+    assert store.get_stats()["by_status"] == {"draft": 1, "submitted": 3, "approved": 1}
+
+
+def test_remove_drops_record_from_all_indexes(store):
+    store.remove(3)
+
+    assert 3 not in store
+    assert _ids(store.query()) == [1, 2, 4, 5]
+    assert _ids(store.query(status="submitted")) == [5]
+    assert _ids(store.query(source="table")) == [2]
+
+
+def test_add_rejects_duplicate_id(store):
+    with pytest.raises(KeyError):
+        store.add(_record(1, "2026-02-01T00:00:00"))
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 10])
+def test_keyset_pages_cover_everything_once(store, limit, descending):
+    """Страницы по after = ключ последней записи: без пропусков и повторов, в том числе на равных created_at"""
+    pages, after = [], None
+    while True:
+        page = store.query(after=after, limit=limit, descending=descending)
+        if not page:
+            break
+        pages.append(_ids(page))
+        after = store.key(page[-1])
+
+    expected = [5, 4, 3, 2, 1] if descending else [1, 2, 3, 4, 5]
+    assert [i for page in pages for i in page] == expected
+    assert all(len(page) <= limit for page in pages)
+
+
+def test_keyset_page_with_filter_and_date_range(store):
+    first = store.query(status="submitted", limit=1, descending=True)
+    second = store.query(status="submitted", after=store.key(first[-1]), limit=1, descending=True)
+
+    assert _ids(first) == [5]
+    assert _ids(second) == [3]
+    assert store.query(status="submitted", after=store.key(second[-1]), limit=1, descending=True) == []
+    assert _ids(store.query(created_from="2026-01-02", after=("2026-01-02T00:00:00", 2))) == [3, 4, 5]
+
+
+def _assert_indexes_match_scan(store):
+    """Каждый индекс совпадает с полным перебором записей"""
+    records = sorted(store.values(), key=store.key)
+    statuses = {r["status"] for r in records}
+    sources = {r.get("parsing_source") for r in records}
+
+    assert _ids(store.query()) == _ids(records)
+    for status in statuses:
+        expected = [r["id"] for r in records if r["status"] == status]
+        assert _ids(store.query(status=status)) == expected
+        assert store.count(status=status) == len(expected)
+    for source in sources - {None}:
+        assert _ids(store.query(source=source)) == [r["id"] for r in records if r.get("parsing_source") == source]
+    stats = store.get_stats()
+    assert stats["by_status"] == {s: sum(1 for r in records if r["status"] == s) for s in statuses}
+    assert stats["by_source"] == {s: sum(1 for r in records if r.get("parsing_source") == s) for s in sources}
+
+
+def test_status_lifecycle_keeps_indexes_consistent(store):
+    store.update(1, status="submitted")
+    store.update(2, status="submitted", parsing_source="groq")
+    store.update(3, status="approved")
+    store.update(5, status="rejected")
+    store.update(1, status="approved")
+    _assert_indexes_match_scan(store)
+
+    assert "draft" not in store.get_stats()["by_status"]
+    assert store.query(status="draft") == [] and store.count(status="draft") == 0
+    assert _ids(store.query(status="approved")) == [1, 3, 4]
+
+
+def test_same_value_and_plain_fields_do_not_touch_indexes(store):
+    store.update(3, status="submitted", parsing_source="table")
+    store.update(3, positions=[{"pos": 1}], parse_state="done")
+
+    assert _ids(store.query(status="submitted")) == [3, 5]
+    assert store[3]["parse_state"] == "done"
+    _assert_indexes_match_scan(store)
+
+
+def test_record_without_source_is_indexed_under_none():
+    store = RequestStore()
+    store.add({"id": 1, "created_at": "2026-01-01T00:00:00", "status": "draft"})
+
+    store.update(1, parsing_source="regex")
+
+    assert _ids(store.query(source="regex")) == [1]
+    assert store.get_stats()["by_source"] == {"regex": 1}
+
+
+def test_keyset_pages_while_statuses_change(store):
+    """Запись, ушедшая из статуса между страницами, не появляется; курсор не ломается"""
+    first = store.query(status="submitted", limit=1)
+    store.update(5, status="approved")
+    store.update(1, status="submitted")
+
+    assert _ids(first) == [3]
+    assert store.query(status="submitted", after=store.key(first[-1]), limit=1) == []
+    assert _ids(store.query(status="approved", after=("2026-01-02T00:00:00", 3))) == [4, 5]
+
+
+def test_update_unknown_id_leaves_indexes_intact(store):
+    with pytest.raises(KeyError):
+        store.update(99, status="approved")
+
+    _assert_indexes_match_scan(store)
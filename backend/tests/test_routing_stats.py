@@ -0,0 +1,21 @@
+"""upgrades_in_flight считает только апгрейды GROQ, а не все фоновые задачи"""
+import asyncio
+
+import app.main as main
+
+
+def test_upgrades_in_flight_ignores_other_background_tasks():
+    async def scenario():
+        other = asyncio.create_task(asyncio.sleep(3600))
+        upgrade = asyncio.create_task(asyncio.sleep(3600))
+        main._background_tasks.update({other, upgrade})
+        main._upgrade_tasks.add(upgrade)
+        try:
+            return main.get_routing_stats()["upgrades_in_flight"]
+        finally:
+            for task in (other, upgrade):
+                task.cancel()
+                main._background_tasks.discard(task)
+            main._upgrade_tasks.discard(upgrade)
+
+    assert asyncio.run(scenario()) == 1
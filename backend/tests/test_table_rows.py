@@ -0,0 +1,14 @@
+"""Позиции из ячеек таблицы: наименование нормализуется как в position_engine"""
+from app.services.position_engine import clean_name
+from app.services.table_rows import _row_to_position
+
+ROLES = {"pos": 0, "name": 1, "unit": 2, "qty": 3}
+
+
+def test_name_is_cleaned_like_text_strategies():
+    raw = "Труба  (ГОСТ 10704-91) стальная"
+    position = _row_to_position({0: "1", 1: raw, 2: "м", 3: "10"}, ROLES, 1)
+
+    assert position == {"pos": 1, "name": clean_name(raw), "unit": "м", "qty": 10}
+    assert position["name"] == "Труба стальная"
+
@@ -0,0 +1,105 @@
+"""Хранилище загрузок: счётчики ссылок, дедупликация, очистка"""
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+from app.services.upload_store import GZIP_SUFFIX, UploadStore
+
+DATA = b"PK\x03\x04 fake docx body"
+SHA = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UploadStore(str(tmp_path / "store"), name="test")
+    yield store
+    store.close_db()
+
+
+def add(store, ref, data=DATA):
+    return store.add_bytes(data, hashlib.sha256(data).hexdigest(), "docx", f"{ref}.docx", ref)
+
+
+def counts(store, sha256=SHA):
+    return store._connect().execute("SELECT refs, open_refs FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+
+
+def test_same_content_is_stored_once(store):
+    first = add(store, "db:1")
+    second = add(store, "db:2")
+
+    assert not first["deduplicated"] and second["deduplicated"]
+    assert first["path"] == second["path"]
+    assert counts(store) == (2, 2)
+    assert store.get("db:2")["filename"] == "db:2.docx"
+    assert store.get_stats()["bytes_saved_by_dedup"] == len(DATA)
+
+
+def test_last_release_deletes_file(store):
+    path = Path(add(store, "db:1")["path"])
+    add(store, "db:2")
+
+    store.release("db:1")
+    assert path.exists() and counts(store) == (1, 1)
+
+    store.release("db:2")
+    assert not path.exists() and counts(store) is None
+
+
+def test_missing_file_is_rewritten_without_resetting_counts(store):
+    path = Path(add(store, "db:1")["path"])
+    add(store, "db:2")
+    os.remove(path)
+
+    add(store, "db:3")
+
+    assert path.read_bytes() == DATA
+    assert counts(store) == (3, 3)
+    store.release("db:1")
+    store.release("db:2")
+    assert path.exists() and counts(store) == (1, 1)
+
+
+def test_closed_blob_is_compressed_and_restored_by_new_ref(store):
+    path = Path(add(store, "db:1")["path"])
+    store.close("db:1")
+    assert counts(store) == (1, 0)
+
+    assert store.retention_pass(compress_after=-1, delete_after=0) == {"released": 0, "compressed": 1}
+    assert not path.exists() and Path(str(path) + GZIP_SUFFIX).exists()
+
+    add(store, "db:2")
+    assert path.read_bytes() == DATA
+    assert counts(store) == (2, 1)
+
+
+def test_open_ref_blocks_compression(store):
+    path = Path(add(store, "db:1")["path"])
+    add(store, "db:2")
+    store.close("db:1")
+
+    assert store.retention_pass(compress_after=-1, delete_after=0)["compressed"] == 0
+    assert path.exists()
+
+
+def test_old_closed_refs_are_released(store):
+    path = Path(add(store, "db:1")["path"])
+    store.close("db:1")
+
+    assert store.retention_pass(compress_after=-1, delete_after=-1)["released"] == 1
+    assert store.get("db:1") is None
+    assert not path.exists() and not Path(str(path) + GZIP_SUFFIX).exists()
+
+
+def test_close_prefix_closes_only_matching_open_refs(store):
+    add(store, "main:a")
+    add(store, "main:b")
+    add(store, "db:1", data=b"other")
+
+    assert store.close_prefix("main:") == 2
+    assert store.close_prefix("main:") == 0
+    assert counts(store) == (2, 0)
+    assert store.get("db:1")["closed_at"] is None
+    assert store.retention_pass(compress_after=-1, delete_after=0)["compressed"] == 1
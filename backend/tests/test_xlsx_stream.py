@@ -0,0 +1,121 @@
+"""XLSX по листам - отдельными задачами extraction_pool, листы по порядку"""
+import asyncio
+import io
+
+import openpyxl
+import pytest
+
+from app.services.document_parser import DocumentParser
+from app.services.extraction_pool import ExtractionPool, ExtractionPoolBusy
+from app.services import xlsx_stream
+from app.services.xlsx_stream import axlsx_to_text, format_row_compact, xlsx_sheet_text, xlsx_to_text
+
+SHEETS = {
+    f"Лист{n}": [["Наименование", "Кол-во"]] + [[f"Позиция {n}.{i}", i] for i in range(1, 6)]
+    for n in range(1, 5)
+}
+
+
+def make_xlsx(sheets) -> bytes:
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    for name, rows in sheets.items():
+        ws = wb.create_sheet(name)
+        for row in rows:
+            ws.append(row)
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+class RecordingPool:
+    """Пул в текущем процессе: запоминает задачи и сколько их было в очереди одновременно"""
+
+    def __init__(self):
+        self.jobs = []
+        self.pending = 0
+        self.max_pending = 0
+
+    async def run(self, func, *args):
+        self.jobs.append((func.__name__, args[1:]))
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        try:
+            await asyncio.sleep(0)
+            return func(*args)
+        finally:
+            self.pending -= 1
+
+
+@pytest.fixture
+def xlsx_path(tmp_path):
+    path = tmp_path / "spec.xlsx"
+    path.write_bytes(make_xlsx(SHEETS))
+    return str(path)
+
+
+def test_sheets_are_separate_jobs_in_sheet_order(xlsx_path):
+    pool = RecordingPool()
+
+    text = asyncio.run(axlsx_to_text(xlsx_path, format_row_compact, workers=2, pool=pool))
+
+    assert text == xlsx_to_text(xlsx_path, format_row_compact)
+    assert [args[0] for name, args in pool.jobs if name == "xlsx_sheet_text"] == list(SHEETS)
+    assert pool.max_pending <= 2
+
+
+def test_one_worker_is_one_job(xlsx_path):
+    pool = RecordingPool()
+
+    text = asyncio.run(axlsx_to_text(xlsx_path, workers=1, pool=pool))
+
+    assert text == xlsx_to_text(xlsx_path)
+    assert [name for name, _ in pool.jobs] == ["xlsx_to_text"]
+
+
+def test_single_sheet_is_one_job(tmp_path):
+    path = tmp_path / "one.xlsx"
+    path.write_bytes(make_xlsx({"Лист1": SHEETS["Лист1"]}))
+    pool = RecordingPool()
+
+    asyncio.run(axlsx_to_text(str(path), workers=4, pool=pool))
+
+    assert [name for name, _ in pool.jobs] == ["xlsx_sheet_names", "xlsx_to_text"]
+
+
+def test_bytes_source_in_real_pool():
+    data = make_xlsx(SHEETS)
+    pool = ExtractionPool(workers=2)
+    try:
+        text = asyncio.run(axlsx_to_text(data, workers=2, pool=pool))
+    finally:
+        pool.shutdown()
+
+    assert text == xlsx_to_text(io.BytesIO(data))
+    assert pool.stats["submitted"] == 1 + len(SHEETS)
+
+
+def test_row_cap_applies_per_sheet_job(xlsx_path):
+    assert xlsx_sheet_text(xlsx_path, "Лист2", format_row_compact, 2) == "Наименование Кол-во\nПозиция 2.1 1\n"
+
+
+def test_pool_errors_reach_caller(xlsx_path):
+    class BusyPool:
+        async def run(self, func, *args):
+            raise ExtractionPoolBusy(32)
+
+    with pytest.raises(ExtractionPoolBusy):
+        asyncio.run(axlsx_to_text(xlsx_path, workers=2, pool=BusyPool()))
+
+
+def test_parse_document_reads_xlsx_through_pool(tmp_path, monkeypatch):
+    # Без колонки единиц table_rows позиций не даёт - текст идёт в парсер
+    path = tmp_path / "notes.xlsx"
+    path.write_bytes(make_xlsx({"A": [["Примечание к заявке на поставку"]], "B": [["Доставка до склада"]]}))
+    pool = RecordingPool()
+    monkeypatch.setattr(xlsx_stream.extraction_pool, "run", pool.run)
+
+    result = asyncio.run(DocumentParser().parse_document(str(path)))
+
+    assert result["raw_text"] == "Примечание к заявке на поставку\nДоставка до склада\n"
+    assert [name for name, _ in pool.jobs] == ["extract_table_positions", "xlsx_to_text"]
@@ -37,6 +37,9 @@ export default function App() {
   const [cabinet, setCabinet] = useState<'user' | 'moderator'>('user');
   const [requests, setRequests] = useState<Request[]>([]);
   const [tasks, setTasks] = useState<Task[]>([]);
+  // Курсоры следующих страниц (заголовок X-Next-Cursor); null - страниц больше нет
+  const [requestsCursor, setRequestsCursor] = useState<string | null>(null);
+  const [tasksCursor, setTasksCursor] = useState<string | null>(null);
   const [selectedRequest, setSelectedRequest] = useState<Request | null>(null);
   const [selectedTask, setSelectedTask] = useState<any>(null);
   const [expandedPositions, setExpandedPositions] = useState<Set<number>>(new Set());
@@ -77,11 +80,14 @@ export default function App() {
     }
   };
 
-  const fetchUserRequests = async () => {
+  // Заявки отдаются страницами, новые первыми; cursor - дозагрузка следующей
+  const fetchUserRequests = async (cursor?: string) => {
     try {
-      const response = await fetch(`${API_URL}/user/requests`);
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${API_URL}/user/requests${query}`);
       const data = await response.json();
-      setRequests(data);
+      setRequests(prev => (cursor ? [...prev, ...data] : data));
+      setRequestsCursor(response.headers.get('X-Next-Cursor'));
     } catch (error) {
       console.error('Fetch error:', error);
     }
@@ -149,11 +155,14 @@ export default function App() {
 
   // ============ MODERATOR CABINET ============
 
-  const fetchModeratorTasks = async () => {
+  // Очередь отдаётся страницами, старые первыми; cursor - дозагрузка следующей
+  const fetchModeratorTasks = async (cursor?: string) => {
     try {
-      const response = await fetch(`${API_URL}/moderator/tasks`);
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${API_URL}/moderator/tasks${query}`);
       const data = await response.json();
-      setTasks(data);
+      setTasks(prev => (cursor ? [...prev, ...data] : data));
+      setTasksCursor(response.headers.get('X-Next-Cursor'));
     } catch (error) {
       console.error('Fetch tasks error:', error);
     }
@@ -332,6 +341,14 @@ export default function App() {
                           </div>
                         </div>
                       ))}
+                      {requestsCursor && (
+                        <button
+                          onClick={() => fetchUserRequests(requestsCursor)}
+                          style={loadMoreButtonStyle}
+                        >
+                          Показать ещё
+                        </button>
+                      )}
                     </div>
                   )}
                 </div>
@@ -541,6 +558,14 @@ export default function App() {
                         </div>
                       </div>
                     ))}
+                    {tasksCursor && (
+                      <button
+                        onClick={() => fetchModeratorTasks(tasksCursor)}
+                        style={loadMoreButtonStyle}
+                      >
+                        Показать ещё
+                      </button>
+                    )}
                   </div>
                 )}
               </div>
@@ -653,3 +678,13 @@ export default function App() {
     </div>
   );
 }
+
+const loadMoreButtonStyle: React.CSSProperties = {
+  padding: '10px',
+  backgroundColor: '#f3f4f6',
+  border: '1px solid #e0e0e0',
+  borderRadius: '8px',
+  cursor: 'pointer',
+  color: '#333',
+  fontWeight: '600',
+};
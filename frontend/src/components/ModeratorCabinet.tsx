@@ -1,10 +1,13 @@
-import React, { useState, useEffect } from 'react'
-import { getParsingTasks, parseTask, getTaskStatus } from '../services/api'
+import React, { useState, useEffect, useRef } from 'react'
+import { getParsingTasksPage, mergeFirstPage, parseTask, getTaskStatus } from '../services/api'
 import { useAppStore } from '../stores/useAppStore'
 import { ParsingTask } from '../types'
 
 export default function ModeratorCabinet() {
   const [tasks, setTasks] = useState<ParsingTask[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  // Страниц дозагружено кнопкой "Показать ещё" (ref - loadTasks вызывается из setInterval)
+  const extraPages = useRef(0)
   const [loading, setLoading] = useState(false)
   const [selectedMethod, setSelectedMethod] = useState<'background_task' | 'celery' | 'patchright'>('background_task')
   const [statusMap, setStatusMap] = useState<Record<number, any>>({})
@@ -16,11 +19,38 @@ export default function ModeratorCabinet() {
     return () => clearInterval(interval)
   }, [])
 
+  // Очередь - старые первыми; первая страница обновляется, дозагруженные сохраняются
   const loadTasks = async () => {
     try {
-      const data = await getParsingTasks()
-      setTasks(data)
-      
+      const first = await getParsingTasksPage()
+      setTasks(prev => mergeFirstPage(prev, first, false, t => t.task_id))
+      if (!first.nextCursor) {
+        setNextCursor(null)
+        extraPages.current = 0
+      } else if (extraPages.current === 0) {
+        setNextCursor(first.nextCursor)
+      }
+      await loadStatuses(first.items)
+    } catch (err) {
+      setError('Ошибка загрузки задач')
+    }
+  }
+
+  const loadMore = async () => {
+    if (!nextCursor) return
+    try {
+      const page = await getParsingTasksPage({ cursor: nextCursor })
+      setTasks(prev => [...prev, ...page.items.filter(t => !prev.some(p => p.task_id === t.task_id))])
+      setNextCursor(page.nextCursor)
+      extraPages.current += 1
+      await loadStatuses(page.items)
+    } catch (err) {
+      setError('Ошибка загрузки задач')
+    }
+  }
+
+  const loadStatuses = async (data: ParsingTask[]) => {
+    try {
       // Загружаем статусы
       for (const task of data) {
         if (task.status === 'pending') {
@@ -121,6 +151,11 @@ export default function ModeratorCabinet() {
               })}
             </tbody>
           </table>
+          {nextCursor && (
+            <button onClick={loadMore} className="btn" style={{ marginTop: '12px' }}>
+              Показать ещё
+            </button>
+          )}
         </div>
       )}
     </div>
@@ -1,39 +1,103 @@
-import React, { useState, useEffect } from 'react'
-import { uploadDocument, getRequests, submitRequest, deleteRequest } from '../services/api'
+import React, { useState, useEffect, useRef } from 'react'
+import { uploadDocument, uploadDocuments, getBatch, getRequestsPage, mergeFirstPage, submitRequest, deleteRequest } from '../services/api'
 import { useAppStore } from '../stores/useAppStore'
-import { Request } from '../types'
+import { Batch, Request } from '../types'
 
 export default function UserCabinet() {
   const [requests, setRequests] = useState<Request[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  // Страниц дозагружено кнопкой "Показать ещё" (ref - loadRequests вызывается из setInterval)
+  const extraPages = useRef(0)
   const [loading, setLoading] = useState(false)
-  const [file, setFile] = useState<File | null>(null)
+  const [files, setFiles] = useState<File[]>([])
+  // Последний пакет (несколько файлов / ZIP) и таймер опроса его прогресса
+  const [batch, setBatch] = useState<Batch | null>(null)
+  const batchTimer = useRef<number | null>(null)
   const { setError, setSuccess } = useAppStore()
 
   useEffect(() => {
     loadRequests()
     const interval = setInterval(loadRequests, 5000)
-    return () => clearInterval(interval)
+    return () => {
+      clearInterval(interval)
+      stopBatchPolling()
+    }
   }, [])
 
+  // Первая страница (новые заявки); уже дозагруженные старые страницы не сбрасываются
   const loadRequests = async () => {
     try {
-      const data = await getRequests()
-      setRequests(data)
+      const first = await getRequestsPage()
+      setRequests(prev => mergeFirstPage(prev, first, true, r => r.id))
+      if (!first.nextCursor) {
+        // Всё поместилось на первую страницу
+        setNextCursor(null)
+        extraPages.current = 0
+      } else if (extraPages.current === 0) {
+        setNextCursor(first.nextCursor)
+      }
+    } catch (err) {
+      setError('Ошибка загрузки заявок')
+    }
+  }
+
+  const loadMore = async () => {
+    if (!nextCursor) return
+    try {
+      const page = await getRequestsPage({ cursor: nextCursor })
+      setRequests(prev => [...prev, ...page.items.filter(r => !prev.some(p => p.id === r.id))])
+      setNextCursor(page.nextCursor)
+      extraPages.current += 1
     } catch (err) {
       setError('Ошибка загрузки заявок')
     }
   }
 
+  const stopBatchPolling = () => {
+    if (batchTimer.current !== null) {
+      clearInterval(batchTimer.current)
+      batchTimer.current = null
+    }
+  }
+
+  // Файлы пакета разбираются в фоне - опрашиваем прогресс, пока пакет не завершится
+  const watchBatch = (id: number) => {
+    stopBatchPolling()
+    batchTimer.current = window.setInterval(async () => {
+      try {
+        const current = await getBatch(id)
+        setBatch(current)
+        if (current.status !== 'running') {
+          stopBatchPolling()
+          setSuccess(`✅ Пакет #${id} обработан: ${current.counts.done || 0} из ${current.total} файлов`)
+          await loadRequests()
+        }
+      } catch (err) {
+        stopBatchPolling()
+        setError('Ошибка получения статуса пакета')
+      }
+    }, 2000)
+  }
+
   const handleUpload = async () => {
-    if (!file) {
+    if (files.length === 0) {
       setError('Выберите файл')
       return
     }
     try {
       setLoading(true)
-      const result = await uploadDocument(file)
-      setSuccess(`✅ Заявка #${result.request_id} создана (${result.items} позиций)`)
-      setFile(null)
+      if (files.length === 1 && !files[0].name.toLowerCase().endsWith('.zip')) {
+        const result = await uploadDocument(files[0])
+        setSuccess(`✅ Заявка #${result.request_id} создана (${result.items} позиций)`)
+      } else {
+        // Несколько файлов или ZIP - одним пакетом
+        const started = await uploadDocuments(files)
+        setBatch(started)
+        const rejected = started.counts.rejected || 0
+        setSuccess(`📦 Пакет #${started.id}: принято ${started.total - rejected} из ${started.total} файлов`)
+        if (started.status === 'running') watchBatch(started.id)
+      }
+      setFiles([])
       await loadRequests()
     } catch (err) {
       setError('Ошибка загрузки файла')
@@ -70,25 +134,47 @@ export default function UserCabinet() {
       <div className="card" style={styles.uploadCard}>
         <h3 style={{ marginBottom: '12px' }}>Загрузить документ</h3>
         <p style={{ fontSize: '12px', color: '#6b7280', marginBottom: '12px' }}>
-          Поддерживаемые форматы: PDF, DOCX, XLSX
+          Поддерживаемые форматы: PDF, DOCX, XLSX; несколько файлов или ZIP - пакетом
         </p>
         <input
           type="file"
-          accept=".pdf,.docx,.xlsx"
-          onChange={(e) => setFile(e.target.files?.[0] || null)}
+          accept=".pdf,.docx,.xlsx,.zip"
+          multiple
+          onChange={(e) => setFiles(Array.from(e.target.files || []))}
           style={styles.fileInput}
         />
-        {file && <p style={{ fontSize: '12px', color: '#059669', marginBottom: '12px' }}>✅ {file.name}</p>}
+        {files.length > 0 && (
+          <p style={{ fontSize: '12px', color: '#059669', marginBottom: '12px' }}>
+            ✅ {files.map(f => f.name).join(', ')}
+          </p>
+        )}
         <button
           onClick={handleUpload}
-          disabled={loading || !file}
+          disabled={loading || files.length === 0}
           style={{
             ...styles.button,
-            opacity: loading || !file ? 0.6 : 1,
+            opacity: loading || files.length === 0 ? 0.6 : 1,
           }}
         >
           {loading ? '⏳ Загрузка...' : '📤 Загрузить'}
         </button>
+        {batch && (
+          <div style={styles.batch}>
+            <p style={{ marginBottom: '6px' }}>
+              📦 Пакет #{batch.id}: {Math.round(batch.progress * 100)}%
+              {batch.status === 'running' ? ' ⏳' : ' ✅'}
+            </p>
+            <ul style={styles.batchList}>
+              {batch.items.map((item, i) => (
+                <li key={i}>
+                  {item.filename} - {item.status}
+                  {item.error ? `: ${item.error}` : ''}
+                  {item.items_count !== undefined ? ` (${item.items_count} позиций)` : ''}
+                </li>
+              ))}
+            </ul>
+          </div>
+        )}
       </div>
 
       <h3 style={{ marginTop: '40px', marginBottom: '16px' }}>Список заявок</h3>
@@ -144,6 +230,11 @@ export default function UserCabinet() {
               ))}
             </tbody>
           </table>
+          {nextCursor && (
+            <button onClick={loadMore} className="btn" style={{ marginTop: '12px' }}>
+              Показать ещё
+            </button>
+          )}
         </div>
       )}
     </div>
@@ -173,6 +264,17 @@ const styles: Record<string, React.CSSProperties> = {
     cursor: 'pointer',
     fontWeight: 500,
   },
+  batch: {
+    marginTop: '12px',
+    fontSize: '12px',
+    color: '#374151',
+  },
+  batchList: {
+    margin: 0,
+    paddingLeft: '18px',
+    maxHeight: '160px',
+    overflowY: 'auto',
+  },
 }
 
 function getStatusBadge(status: string): string {
@@ -1,5 +1,5 @@
-import axios from 'axios'
-import { Request, ParsingTask, ParsedURL } from '../types'
+import axios, { AxiosResponse } from 'axios'
+import { Request, ParsingTask, ParsedURL, Batch } from '../types'
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000/api/v1'
 
@@ -19,8 +19,60 @@ export const uploadDocument = (file: File) => {
   })
 }
 
-export const getRequests = (): Promise<Request[]> =>
-  api.get('/user/requests').then(r => r.data)
+// Несколько файлов и/или ZIP одним запросом; разбор идёт в фоне, прогресс - getBatch
+export const uploadDocuments = (files: File[]): Promise<Batch> => {
+  const formData = new FormData()
+  files.forEach(file => formData.append('files', file))
+  return api.post('/user/bulk-upload', formData, {
+    headers: { 'Content-Type': 'multipart/form-data' },
+  }).then(r => r.data)
+}
+
+export const getBatch = (id: number): Promise<Batch> =>
+  api.get(`/user/batches/${id}`).then(r => r.data)
+
+// Списки постраничные: следующая страница - cursor из nextCursor (null - страниц больше нет)
+export interface Page<T> {
+  items: T[]
+  nextCursor: string | null
+}
+
+export interface PageParams {
+  cursor?: string
+  limit?: number
+  order?: 'asc' | 'desc'
+  status?: string
+  source?: string
+}
+
+const toPage = <T>(r: AxiosResponse): Page<T> => ({
+  items: r.data as T[],
+  nextCursor: (r.headers['x-next-cursor'] as string | undefined) ?? null,
+})
+
+// Первая страница заново (поллинг), дозагруженные страницы сохраняются:
+// всё, что идёт в выдаче после последней записи свежей первой страницы
+export const mergeFirstPage = <T extends { created_at: string }>(
+  loaded: T[],
+  first: Page<T>,
+  descending: boolean,
+  idOf: (item: T) => number,
+): T[] => {
+  const last = first.items[first.items.length - 1]
+  if (!first.nextCursor || !last) return first.items
+  const ids = new Set(first.items.map(idOf))
+  const after = (item: T) => {
+    const cmp = item.created_at === last.created_at
+      ? idOf(item) - idOf(last)
+      : item.created_at < last.created_at ? -1 : 1
+    return descending ? cmp < 0 : cmp > 0
+  }
+  return [...first.items, ...loaded.filter(item => !ids.has(idOf(item)) && after(item))]
+}
+
+// Новые первыми
+export const getRequestsPage = (params: PageParams = {}): Promise<Page<Request>> =>
+  api.get('/user/requests', { params }).then(r => toPage<Request>(r))
 
 export const getRequestDetail = (id: number) =>
   api.get(`/user/requests/${id}`).then(r => r.data)
@@ -32,8 +84,9 @@ export const deleteRequest = (id: number) =>
   api.delete(`/user/requests/${id}`).then(r => r.data)
 
 // Moderator Cabinet
-export const getParsingTasks = (): Promise<ParsingTask[]> =>
-  api.get('/moderator/tasks').then(r => r.data)
+// Очередь - старые первыми
+export const getParsingTasksPage = (params: PageParams = {}): Promise<Page<ParsingTask>> =>
+  api.get('/moderator/tasks', { params }).then(r => toPage<ParsingTask>(r))
 
 export const getTaskDetail = (id: number) =>
   api.get(`/moderator/tasks/${id}`).then(r => r.data)
@@ -45,4 +45,23 @@ export interface Supplier {
   company_name: string
   inn: string
   rating: number
-}
\ No newline at end of file
+}
+
+// Пакетная загрузка (несколько файлов / ZIP): файл - отдельная заявка
+export interface BatchItem {
+  filename: string
+  request_id: number | null
+  status: 'queued' | 'running' | 'draft' | 'done' | 'failed' | 'rejected'
+  error?: string
+  items_count?: number
+  confidence?: number
+}
+
+export interface Batch {
+  id: number
+  status: 'running' | 'uploaded' | 'done'
+  items: BatchItem[]
+  total: number
+  counts: Record<string, number>
+  progress: number
+}